@@ -0,0 +1,66 @@
+import argparse
+import json
+import os
+import time
+
+from machine import RAM_TYPES, ENGINES, run_batch
+
+# Usage: python batch.py [options] [image ...]
+# Runs many guests at once, each on a machine of its own in a worker process.
+# Every image is a raw RV32 binary loaded at --address (the start of RAM by
+# default); with no images the config's own guest is run. Guests end by
+# writing the syscon poweroff/reboot values, a0 at that point is their exit
+# code. Prints one line per guest as it finishes and exits nonzero unless
+# every guest powered off with exit code 0.
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Run guests in parallel")
+    parser.add_argument("images", nargs="*", help="raw binaries to run")
+    parser.add_argument("-c", "--config", default="config", help="config module laying out the machine")
+    parser.add_argument("-e", "--engine", choices=ENGINES, default="translator")
+    parser.add_argument("-r", "--ram", choices=sorted(RAM_TYPES), help="RAM type, the config's by default")
+    parser.add_argument("--address", type=lambda value: int(value, 0), help="load address of the images")
+    parser.add_argument("-n", "--max-instructions", type=int, help="stop every guest after that many instructions")
+    parser.add_argument("--max-reboots", type=int, default=0, help="reboots allowed per guest")
+    parser.add_argument("--copies", type=int, default=1, help="run every image that many times")
+    parser.add_argument("-j", "--jobs", type=int, help="worker processes, all cores by default")
+    parser.add_argument("--output-dir", help="write the console output of every guest there")
+    parser.add_argument("--json", help="write the results to this file")
+    return parser.parse_args()
+
+def print_result(result):
+    name = os.path.basename(result["image"]) if result["image"] else "<config>"
+    if result["reason"] == "error" and "instructions" not in result:
+        print(f"{name:24} error: {result['error']}", flush=True)
+        return
+    line = (f"{name:24} {result['reason']:8} exit {result['exit_code']:<4} {result['instructions']:10} instructions"
+            f" {result['mips']:7.3f} MIPS")
+    if "error" in result:
+        line += f"  {result['error']}"
+    print(line, flush=True)
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    jobs = []
+    for image in arguments.images or [None]:
+        for copy in range(arguments.copies):
+            jobs.append({"image": image, "address": arguments.address, "config": arguments.config,
+                         "engine": arguments.engine, "ram": arguments.ram,
+                         "max_instructions": arguments.max_instructions, "max_reboots": arguments.max_reboots})
+    start_time = time.perf_counter()
+    results = run_batch(jobs, arguments.jobs, print_result)
+    took = time.perf_counter() - start_time
+    instructions = sum(result.get("instructions", 0) for result in results)
+    print(f"{len(results)} guests, {instructions} instructions in {took:.2f}s ({instructions / took / 1e6:.3f} MIPS total)")
+    if arguments.output_dir:
+        os.makedirs(arguments.output_dir, exist_ok=True)
+        for index, result in enumerate(results):
+            name = os.path.basename(result["image"]) if result["image"] else "config"
+            with open(os.path.join(arguments.output_dir, f"{index:04}-{name}.txt"), 'w') as file:
+                file.write(result["output"])
+    if arguments.json:
+        with open(arguments.json, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f"Results written to {arguments.json}")
+    failed = [result for result in results if result["reason"] != "poweroff" or result.get("exit_code") != 0]
+    exit(1 if failed else 0)
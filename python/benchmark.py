@@ -0,0 +1,86 @@
+import argparse
+import json
+
+from benchmarks import RAM_TYPES, ENGINES, WORKLOADS, run_suite, run_bulk, environment
+
+import config_linux as config
+
+# Usage: python benchmark.py [options]
+# Runs the synthetic RV32IMA workloads and the start of the linux/kernel.img
+# boot for a fixed amount of instructions on every chosen engine and RAM type,
+# each in a fresh process, and reports MIPS, startup time, peak RSS and (for
+# the interpreter) time per opcode. linux-idioms is the same boot with
+# utils/idioms.py taking over memset, memcpy and the like. --json writes the
+# results for comparing runs across commits, --compare prints the speed
+# relative to such a file.
+# --bulk MIB times the bus bulk transfers (load_bytes, copy_within, fill, read)
+# on every chosen RAM type instead, in GB/s and relative to a host memcpy.
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Emulator speed benchmarks")
+    parser.add_argument("-w", "--workloads", nargs="+", choices=WORKLOADS, default=list(WORKLOADS))
+    parser.add_argument("-e", "--engines", nargs="+", choices=ENGINES, default=["interpreter", "translator", "jit"])
+    parser.add_argument("-r", "--ram", nargs="+", choices=sorted(RAM_TYPES), default=[config.RAM_TYPE])
+    parser.add_argument("-n", "--instructions", type=int, default=200000, help="instructions per synthetic workload")
+    parser.add_argument("--linux-millions", type=float, default=0.5, help="million instructions of the linux boot")
+    parser.add_argument("--no-opcodes", action="store_true", help="skip the per-opcode timing pass")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="results file of an earlier run to compare against")
+    parser.add_argument("--bulk", type=int, metavar="MIB", help="benchmark bulk transfers of that many MiB instead")
+    return parser.parse_args()
+
+def key(result):
+    return result["workload"], result["engine"], result["ram"]
+
+def print_result(result, baseline):
+    name = f"{result['workload']:12} {result['engine']:12} {result['ram']:10}"
+    if "skipped" in result:
+        print(f"{name} skipped: {result['skipped']}")
+        return
+    line = (f"{name} {result['mips']:8.3f} MIPS  startup {result['startup_seconds']:6.2f}s"
+            f"  rss {result['peak_rss_kb'] / 1024:7.1f} MiB")
+    previous = baseline.get(key(result))
+    if previous is not None and "mips" in previous:
+        line += f"  {result['mips'] / previous['mips']:5.2f}x vs baseline"
+    print(line, flush=True)
+    for opcode, stats in list(result.get("opcodes", {}).items())[:5]:
+        print(f"{'':36} {opcode:10} {stats['count']:9} calls {stats['avg_us']:7.3f} us avg")
+
+def print_bulk(result):
+    print(f"{result['operation']:12} {result['ram']:10} {result['gb_per_second']:7.2f} GB/s"
+          f"  {result['vs_memcpy']:5.2f}x memcpy", flush=True)
+
+def bulk(arguments):
+    results = []
+    print(f"{'operation':12} {'ram':10}")
+    for ram_type in arguments.ram:
+        for result in run_bulk(ram_type, arguments.bulk << 20):
+            print_bulk(result)
+            results.append(result)
+    return results
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    if arguments.bulk:
+        results = bulk(arguments)
+        if arguments.json:
+            with open(arguments.json, 'w') as file:
+                json.dump({"environment": environment(), "bulk": results}, file, indent=2)
+            print(f"Results written to {arguments.json}")
+        exit(0)
+    baseline = {}
+    if arguments.compare:
+        with open(arguments.compare, 'r') as file:
+            baseline = {key(result): result for result in json.load(file)["results"]}
+    cases = []
+    for workload in arguments.workloads:
+        instructions = int(arguments.linux_millions * 1e6) if workload.startswith("linux") else arguments.instructions
+        for engine in arguments.engines:
+            for ram_type in arguments.ram:
+                cases.append((workload, engine, ram_type, instructions, not arguments.no_opcodes))
+    print(f"{'workload':12} {'engine':12} {'ram':10}")
+    results = run_suite(cases, lambda result: print_result(result, baseline))
+    if arguments.json:
+        with open(arguments.json, 'w') as file:
+            json.dump({"environment": environment(), "results": results}, file, indent=2)
+        print(f"Results written to {arguments.json}")
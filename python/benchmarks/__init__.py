@@ -0,0 +1,4 @@
+from .assembler import Assembler
+from .workloads import SYNTHETIC
+from .runner import RAM_TYPES, ENGINES, WORKLOADS, run_case, run_suite, environment
+from .bulk import BULK_OPERATIONS, run_bulk
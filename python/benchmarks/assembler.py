@@ -0,0 +1,127 @@
+import struct
+
+# Just enough of an RV32IMA assembler to write benchmark loops in Python.
+# Registers are plain numbers, branch and jump targets are label names.
+
+def encode_r(opcode, rd, funct3, rs1, rs2, funct7):
+    return (funct7 << 25) | (rs2 << 20) | (rs1 << 15) | (funct3 << 12) | (rd << 7) | opcode
+
+def encode_i(opcode, rd, funct3, rs1, imm):
+    return ((imm & 0xFFF) << 20) | (rs1 << 15) | (funct3 << 12) | (rd << 7) | opcode
+
+def encode_s(opcode, funct3, rs1, rs2, imm):
+    return (((imm >> 5) & 0x7F) << 25) | (rs2 << 20) | (rs1 << 15) | (funct3 << 12) | ((imm & 0x1F) << 7) | opcode
+
+def encode_b(opcode, funct3, rs1, rs2, imm):
+    return (((imm >> 12) & 0x1) << 31) | (((imm >> 5) & 0x3F) << 25) | (rs2 << 20) | (rs1 << 15) \
+        | (funct3 << 12) | (((imm >> 1) & 0xF) << 8) | (((imm >> 11) & 0x1) << 7) | opcode
+
+def encode_u(opcode, rd, imm):
+    return (imm & 0xFFFFF000) | (rd << 7) | opcode
+
+def encode_j(opcode, rd, imm):
+    return (((imm >> 20) & 0x1) << 31) | (((imm >> 1) & 0x3FF) << 21) | (((imm >> 11) & 0x1) << 20) \
+        | (((imm >> 12) & 0xFF) << 12) | (rd << 7) | opcode
+
+# mnemonic -> (funct3, funct7) for OP, funct3 for OP-IMM, LOAD, STORE and BRANCH
+R_TYPE = {
+    "add": (0, 0x00), "sub": (0, 0x20), "sll": (1, 0x00), "slt": (2, 0x00), "sltu": (3, 0x00),
+    "xor": (4, 0x00), "srl": (5, 0x00), "sra": (5, 0x20), "or_": (6, 0x00), "and_": (7, 0x00),
+    "mul": (0, 0x01), "mulh": (1, 0x01), "mulhsu": (2, 0x01), "mulhu": (3, 0x01),
+    "div": (4, 0x01), "divu": (5, 0x01), "rem": (6, 0x01), "remu": (7, 0x01),
+}
+I_TYPE = {"addi": 0, "slti": 2, "sltiu": 3, "xori": 4, "ori": 6, "andi": 7}
+SHIFTS = {"slli": (1, 0x00), "srli": (5, 0x00), "srai": (5, 0x20)}
+LOADS = {"lb": 0, "lh": 1, "lw": 2, "lbu": 4, "lhu": 5}
+STORES = {"sb": 0, "sh": 1, "sw": 2}
+BRANCHES = {"beq": 0, "bne": 1, "blt": 4, "bge": 5, "bltu": 6, "bgeu": 7}
+AMOS = {"amoadd_w": 0x00, "amoswap_w": 0x01, "lr_w": 0x02, "sc_w": 0x03,
+        "amoxor_w": 0x04, "amoor_w": 0x08, "amoand_w": 0x0C}
+CSRS = {"csrrw": 1, "csrrs": 2, "csrrc": 3, "csrrwi": 5, "csrrsi": 6, "csrrci": 7}
+PRIVILEGED = {"ecall": 0x000, "ebreak": 0x001, "mret": 0x302, "wfi": 0x105} # funct12
+
+class Assembler:
+    """Collects instructions starting at `origin`; assemble() resolves labels
+    and returns the little-endian image.
+
+        a = Assembler(0x80000000)
+        a.li(5, 100)
+        a.label("loop")
+        a.addi(5, 5, -1)
+        a.bne(5, 0, "loop")
+    """
+    def __init__(self, origin: int):
+        self.origin = origin
+        self.words = []
+        self.labels = {}
+        self.fixups = [] # (index, encoder, label)
+
+    @property
+    def here(self) -> int:
+        return self.origin + 4 * len(self.words)
+
+    def label(self, name: str) -> None:
+        self.labels[name] = self.here
+
+    def emit(self, word: int) -> None:
+        self.words.append(word & 0xFFFFFFFF)
+
+    def assemble(self) -> bytes:
+        for index, encoder, label in self.fixups:
+            if label not in self.labels:
+                raise ValueError(f"Undefined label {label}")
+            self.words[index] = encoder(self.labels[label] - (self.origin + 4 * index))
+        return struct.pack(f"<{len(self.words)}I", *self.words)
+
+    def _target(self, encoder, label) -> None:
+        self.fixups.append((len(self.words), encoder, label))
+        self.emit(0)
+
+    def __getattr__(self, name):
+        if name in R_TYPE:
+            funct3, funct7 = R_TYPE[name]
+            return lambda rd, rs1, rs2: self.emit(encode_r(0b0110011, rd, funct3, rs1, rs2, funct7))
+        if name in I_TYPE:
+            return lambda rd, rs1, imm: self.emit(encode_i(0b0010011, rd, I_TYPE[name], rs1, imm))
+        if name in SHIFTS:
+            funct3, funct7 = SHIFTS[name]
+            return lambda rd, rs1, shamt: self.emit(encode_i(0b0010011, rd, funct3, rs1, (funct7 << 5) | shamt))
+        if name in LOADS:
+            return lambda rd, offset, rs1: self.emit(encode_i(0b0000011, rd, LOADS[name], rs1, offset))
+        if name in STORES:
+            return lambda rs2, offset, rs1: self.emit(encode_s(0b0100011, STORES[name], rs1, rs2, offset))
+        if name in BRANCHES:
+            return lambda rs1, rs2, label: self._target(
+                lambda offset: encode_b(0b1100011, BRANCHES[name], rs1, rs2, offset), label)
+        if name in AMOS:
+            return lambda rd, rs2, rs1: self.emit(encode_r(0b0101111, rd, 0x2, rs1, rs2, AMOS[name] << 2))
+        if name in CSRS:
+            return lambda rd, csr, source: self.emit(encode_i(0b1110011, rd, CSRS[name], source, csr))
+        if name in PRIVILEGED:
+            return lambda: self.emit(encode_i(0b1110011, 0, 0, 0, PRIVILEGED[name]))
+        raise AttributeError(name)
+
+    def lui(self, rd, imm):
+        self.emit(encode_u(0b0110111, rd, imm))
+
+    def auipc(self, rd, imm):
+        self.emit(encode_u(0b0010111, rd, imm))
+
+    def jal(self, rd, label):
+        self._target(lambda offset: encode_j(0b1101111, rd, offset), label)
+
+    def jalr(self, rd, rs1, offset=0):
+        self.emit(encode_i(0b1100111, rd, 0, rs1, offset))
+
+    def j(self, label):
+        self.jal(0, label)
+
+    def li(self, rd, value):
+        value &= 0xFFFFFFFF
+        upper = (value + 0x800) & 0xFFFFF000
+        lower = (value - upper) & 0xFFF
+        if upper:
+            self.lui(rd, upper)
+            if lower: self.addi(rd, rd, lower)
+        else:
+            self.addi(rd, 0, lower)
@@ -0,0 +1,41 @@
+import time
+
+import numpy
+
+from machine import RAM_TYPES
+from devices.memory import AddressBus
+
+BULK_OPERATIONS = ("load_bytes", "copy_within", "fill", "read")
+RAM_BASE = 0x80000000
+
+def _best(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        took = time.perf_counter() - start_time
+        best = took if best is None else min(best, took)
+    return best
+
+def run_bulk(ram_type, size, repeat=5) -> list:
+    """Times the AddressBus bulk transfers on size bytes of a RAM of ram_type,
+    next to a host memcpy of the same size (a numpy copy between two arrays),
+    which is the ceiling they should get close to. The best of repeat runs
+    counts. Returns one record per operation, with GB/s."""
+    ram = RAM_TYPES[ram_type](2 * size)
+    bus = AddressBus([[RAM_BASE, RAM_BASE + 2 * size - 1, ram]])
+    data = numpy.random.default_rng(0).integers(0, 256, size, dtype=numpy.uint8)
+    target = numpy.empty_like(data)
+    baseline = _best(lambda: numpy.copyto(target, data), repeat)
+    timings = {
+        "load_bytes": lambda: bus.load_bytes(RAM_BASE, data),
+        "copy_within": lambda: bus.copy_within(RAM_BASE + size, RAM_BASE, size),
+        "fill": lambda: bus.fill(RAM_BASE, 0x5A, size),
+        "read": lambda: bus.read(RAM_BASE, size),
+    }
+    results = []
+    for operation in BULK_OPERATIONS:
+        took = _best(timings[operation], repeat)
+        results.append({"operation": operation, "ram": ram_type, "bytes": size,
+                        "gb_per_second": size / took / 1e9, "vs_memcpy": baseline / took})
+    return results
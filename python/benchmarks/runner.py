@@ -0,0 +1,106 @@
+import io
+import multiprocessing
+import platform
+import resource
+import subprocess
+import time
+
+from machine import Machine, RAM_TYPES, ENGINES
+from utils import idioms, logger as logr
+from utils.console import HostConsole
+
+import config_linux as config
+
+from .workloads import SYNTHETIC, CODE_BASE
+
+WORKLOADS = tuple(SYNTHETIC) + ("linux", "linux-idioms") # linux-idioms: with utils.idioms accelerating memset & co
+OPCODE_ENGINES = ("nocache", "interpreter") # engines where per-opcode timing means something
+
+class BenchmarkDone(Exception):
+    pass
+
+def build_machine(workload, engine, ram_type, timing=False):
+    logger = logr.Logger(0)
+    machine = Machine(config, ram_type, logger, HostConsole(output=io.BytesIO())) # guest output stays off the report
+    cpu = machine.cpu
+    cpu.disable_profiling()
+    if timing:
+        cpu.enable_profiling(timing=True, sample_interval=0)
+    machine.set_engine(engine)
+    if workload in ("linux", "linux-idioms"):
+        machine.load()
+        if workload == "linux-idioms":
+            idioms.install(cpu) # their estimated instructions count, so MIPS compare to plain linux
+    else:
+        machine.load_binary(SYNTHETIC[workload](), CODE_BASE)
+    logger.enabled = False
+    return cpu
+
+def run_until(cpu, instructions):
+    def done(cpu):
+        raise BenchmarkDone()
+    cpu.hooks.at_count(cpu.instret + instructions, done)
+    try:
+        cpu.run()
+    except BenchmarkDone:
+        pass
+
+def run_case(workload, engine, ram_type, instructions, opcodes=True) -> dict:
+    """Runs one benchmark in the current process and returns its result record.
+    Meant to be called in a fresh process, so the RSS and startup figures
+    belong to this case alone."""
+    result = {"workload": workload, "engine": engine, "ram": ram_type, "instructions": instructions}
+    start_time = time.perf_counter()
+    try:
+        cpu = build_machine(workload, engine, ram_type)
+    except ValueError as e: # e.g. the numba core without flat RAM
+        result["skipped"] = str(e)
+        return result
+    if cpu.jit is not None:
+        cpu.jit.run(0) # compile or load the numba core before timing
+    result["startup_seconds"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    run_until(cpu, instructions)
+    took = time.perf_counter() - start_time
+    result["seconds"] = took
+    result["executed"] = cpu.instret
+    result["mips"] = cpu.instret / took / 1e6
+
+    if opcodes and engine in OPCODE_ENGINES:
+        cpu = build_machine(workload, engine, ram_type, timing=True)
+        run_until(cpu, instructions)
+        result["opcodes"] = {
+            name: {"count": stats.count, "total_ms": stats.total * 1e3,
+                   "avg_us": stats.total / stats.count * 1e6, "p99_us": stats.percentile(0.99) * 1e6}
+            for name, stats in sorted(cpu.profiler.opcodes.items(), key=lambda item: -item[1].total)
+        }
+    result["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result
+
+def _run_case(arguments):
+    return run_case(*arguments)
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+def run_suite(cases, on_result=None) -> list:
+    """Runs every (workload, engine, ram_type, instructions, opcodes) case in a
+    process of its own, one at a time so they do not compete for the CPU."""
+    results = []
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        for result in pool.imap(_run_case, cases):
+            results.append(result)
+            if on_result is not None: on_result(result)
+    return results
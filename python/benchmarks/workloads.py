@@ -0,0 +1,118 @@
+from .assembler import Assembler
+
+# Synthetic workloads are endless loops loaded at CODE_BASE; the runner stops
+# them after a fixed amount of instructions. Data lives at DATA_BASE.
+CODE_BASE = 0x80000000
+DATA_BASE = 0x80100000
+DATA_SIZE = 0x10000
+
+MSCRATCH = 0x340
+
+def alu():
+    """Dependent integer arithmetic, shifts and multiplies."""
+    a = Assembler(CODE_BASE)
+    a.li(5, 0x12345678)
+    a.li(6, 7)
+    a.label("loop")
+    a.add(7, 5, 6)
+    a.xor(8, 7, 5)
+    a.slli(9, 8, 3)
+    a.sub(10, 9, 6)
+    a.or_(11, 10, 7)
+    a.and_(12, 11, 8)
+    a.srai(13, 12, 2)
+    a.sltu(14, 13, 5)
+    a.mul(15, 5, 6)
+    a.mulhu(16, 15, 7)
+    a.xori(17, 16, 0x55)
+    a.addi(5, 5, 1)
+    a.j("loop")
+    return a.assemble()
+
+def loadstore():
+    """Word, halfword and byte stores and loads streaming over DATA_SIZE bytes."""
+    a = Assembler(CODE_BASE)
+    a.li(7, 0xDEADBEEF)
+    a.label("restart")
+    a.li(5, DATA_BASE)
+    a.li(6, DATA_BASE + DATA_SIZE)
+    a.label("loop")
+    a.sw(7, 0, 5)
+    a.lw(8, 0, 5)
+    a.sh(8, 4, 5)
+    a.lhu(9, 4, 5)
+    a.sb(9, 6, 5)
+    a.lb(10, 6, 5)
+    a.lbu(11, 7, 5)
+    a.add(7, 7, 10)
+    a.addi(5, 5, 8)
+    a.blt(5, 6, "loop")
+    a.j("restart")
+    return a.assemble()
+
+def branch():
+    """Data-dependent branches driven by a linear congruential generator."""
+    a = Assembler(CODE_BASE)
+    a.li(5, 12345)       # state
+    a.li(6, 1103515245)  # multiplier
+    a.li(7, 12345)       # increment
+    a.label("loop")
+    a.mul(5, 5, 6)
+    a.add(5, 5, 7)
+    a.andi(8, 5, 0x100)
+    a.beq(8, 0, "even")
+    a.addi(9, 9, 1)
+    a.label("even")
+    a.andi(8, 5, 0x200)
+    a.bne(8, 0, "odd")
+    a.addi(10, 10, 1)
+    a.label("odd")
+    a.blt(5, 0, "negative")
+    a.addi(11, 11, 1)
+    a.label("negative")
+    a.bgeu(9, 10, "loop")
+    a.addi(12, 12, 1)
+    a.j("loop")
+    return a.assemble()
+
+def amo():
+    """Atomic read-modify-write and LR/SC increments on one word."""
+    a = Assembler(CODE_BASE)
+    a.li(5, DATA_BASE)
+    a.li(6, 1)
+    a.li(7, 0xF0F0F0F0)
+    a.label("loop")
+    a.amoadd_w(8, 6, 5)
+    a.amoswap_w(9, 8, 5)
+    a.amoxor_w(10, 7, 5)
+    a.amoor_w(11, 6, 5)
+    a.amoand_w(12, 7, 5)
+    a.label("retry")
+    a.lr_w(13, 0, 5)
+    a.addi(13, 13, 1)
+    a.sc_w(14, 13, 5)
+    a.bne(14, 0, "retry")
+    a.j("loop")
+    return a.assemble()
+
+def csr():
+    """Register and immediate CSR accesses on mscratch."""
+    a = Assembler(CODE_BASE)
+    a.li(5, 1)
+    a.label("loop")
+    a.csrrw(6, MSCRATCH, 5)
+    a.csrrs(7, MSCRATCH, 6)
+    a.csrrc(8, MSCRATCH, 7)
+    a.csrrwi(9, MSCRATCH, 21)
+    a.csrrci(10, MSCRATCH, 1)
+    a.addi(5, 5, 1)
+    a.j("loop")
+    return a.assemble()
+
+SYNTHETIC = {
+    "alu": alu,
+    "loadstore": loadstore,
+    "branch": branch,
+    "amo": amo,
+    "csr": csr,
+}
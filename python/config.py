@@ -3,13 +3,15 @@ TRACEOUT_AT_INO = 748620
 
 LOG_LEVEL = 6
 
+RAM_TYPE   = "DICT" # sparse, RAM_RANGE spans 2 GiB
 RAM_RANGE  = (0x80000000, 0xFFFFFFFF)
 UART_RANGE = (0x10000000, 0x10000008)
+CLINT_RANGE = (0x11000000, 0x1100FFFF)
+SYSCON_RANGE = (0x11100000, 0x11100FFF)
 
-cpu, bus = None, None
-def loader(logger, cpu_, bus_, uart_):
-    global cpu, bus
-    cpu, bus = cpu_, bus_
+CONSOLE_INPUT = None # UART input: None, "stdin" or "tcp:PORT" (see utils/console.py)
+
+def loader(logger, cpu, bus, uart):
     with open("program/code.img", 'rb') as file:
         code_bytes = file.read()
     def reverseGroup(inp,k):
@@ -24,16 +26,16 @@ def loader(logger, cpu_, bus_, uart_):
         return result
     code_bytes = bytes(reverseGroup(list(code_bytes), 4))
     cpu.registers["pc"] = 0x80000000
-    bus.write(0x80000000, code_bytes)
+    bus.map_image(0x80000000, code_bytes)
+    cpu.capture_reset_state()
 
-def pre_cpu_start(logger):
-    logger.enabled = True
+def pre_cpu_start(cpu):
+    cpu.logger.enabled = True
+    cpu.hooks.every(1, log_instruction)
 
-# prevregs = []
-def instruction_callback(logger, instruction_no):
-    # global prevregs
-    logger.log(7, "MAIN", f"Executing at {cpu.registers['pc']:08x}, Instruction no is {instruction_no}")
-    # regs = [x for x in cpu.get_registers_formatted() if x not in prevregs] + [""] * 4
+def log_instruction(cpu):
+    logger = cpu.logger
+    logger.log(7, "MAIN", f"Executing at {cpu.registers['pc']:08x}, Instruction no is {cpu.instret + 1}")
     regs = cpu.get_registers_formatted()
     for a,b,c,d in zip(regs[::4], regs[1::4], regs[2::4], regs[3::4]):
         logger.log(1, "MAIN", f"{a} {b} {c} {d}")
@@ -1,83 +1,115 @@
+import mmap
+
+from utils import idioms, snapshot
+from utils.symbols import SymbolIndex
+
 TRACEOUT_AT_INO = 99999999
 KILL_AT_INO = 99999999
 TRACEOUT_PRINT_REGISTERS = False
 DO_PRINT_CHANGED_SYMBOLS = False
 REPORT_STATUS_EACH_INO = 2500
+SNAPSHOT_AT_INO = None          # save a snapshot once this instruction number is reached...
+SNAPSHOT_AT_PC = None           # ...or once execution gets to this PC
+SNAPSHOT_FILE = "linux.rvsnap"
+RESTORE_SNAPSHOT = None         # snapshot file to resume from instead of booting from _start
+PROFILE_REPORT_EACH_INO = None  # print the hottest kernel functions every that many instructions
+PROFILE_REPORT_TOP = 15
+ACCELERATE_IDIOMS = False       # run memset, memcpy, memmove, strlen and the .bss clear natively (see utils/idioms.py)
+VERIFY_IDIOMS = False           # ...or only check the guest's own runs of them against native results
 
 LOG_LEVEL = 7
 
-RAM_TYPE   = "BYTEARRAY"
+RAM_TYPE   = "BUFFER"
 RAM_RANGE  = (0x80000000, 0x84000000)
 UART_RANGE = (0x10000000, 0x10000008)
+CLINT_RANGE = (0x11000000, 0x1100FFFF)
+SYSCON_RANGE = (0x11100000, 0x11100FFF)
 
-def parse_linker_map_file(file_content):
-    symbols = []
-    for line in file_content.splitlines():
-        parts = line.split()
-        if len(parts) == 3:
-            address, _, symbol = parts
-            symbols.append((int(address, 16), symbol))
-    symbols.sort(key=lambda x: x[0])
-    return symbols
+CONSOLE_INPUT = "stdin" # UART input: None, "stdin" or "tcp:PORT" (see utils/console.py)
 
-def get_symbol_name(address, symbols):
-    closest_symbol = 'Error parsing symbol'
-    for symbol_address, symbol_name in symbols:
-        if symbol_address <= address:
-            closest_symbol = symbol_name
-        else:
-            break
-
-    if closest_symbol == '_end':
-        closest_symbol = 'Address outside of the kernel'
-    else:
-        closest_symbol += "()"
-    return closest_symbol
+def symbol_text(symbol):
+    return f"{symbol.name}()" if symbol is not None else "Address outside of the kernel"
 
-cpu, bus, symbols = None, None, []
-def loader(logger, cpu_, bus_, uart_):
-    global cpu, bus, symbols
-    cpu, bus = cpu_, bus_
+def loader(logger, cpu, bus, uart):
     logger.log(3, "MAIN", "Loading map file...")
-    with open("linux/kernel.map", 'r') as file:
-        symbols = parse_linker_map_file(file.read())
-    logger.log(3, "MAIN", "Loading kernel image...")
+    cpu.symbols = SymbolIndex.from_map_file("linux/kernel.map")
+    if cpu.profiler is not None:
+        cpu.profiler.resolve = cpu.symbols.name
+    logger.log(3, "MAIN", "Mapping kernel image...")
     with open("linux/kernel.img", 'rb') as file:
-        linux_bytes = file.read()
-    logger.log(3, "MAIN", "Loading device tree...")
+        linux_bytes = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    logger.log(3, "MAIN", "Mapping device tree...")
     with open("linux/device_tree_binary.dtb", 'rb') as file:
-        devtree_bytes = file.read()
+        devtree_bytes = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
     cpu.integer_registers[11] = (0x80000000 + 64*1024*1024) - len(devtree_bytes) - 192
     cpu.registers["pc"] = 0x80000000
-    logger.log(3, "MAIN", "Writing kernel image to RAM...")
-    bus.write(0x80000000, linux_bytes)
-    logger.log(3, "MAIN", "Writing device tree to RAM...")
-    bus.write(cpu.integer_registers[11], devtree_bytes)
+    logger.log(3, "MAIN", "Mapping kernel image into RAM...")
+    bus.map_image(0x80000000, linux_bytes)
+    logger.log(3, "MAIN", "Mapping device tree into RAM...")
+    bus.map_image(cpu.integer_registers[11], devtree_bytes)
+    cpu.capture_reset_state() # what a guest reboot goes back to
+    if RESTORE_SNAPSHOT:
+        logger.log(3, "MAIN", f"Restoring snapshot {RESTORE_SNAPSHOT}...")
+        pages = snapshot.restore(RESTORE_SNAPSHOT, cpu, bus)
+        logger.log(3, "MAIN", f"Restored {pages} pages, resuming at {cpu.registers['pc']:08x}, instruction no {cpu.instret + 1}")
 
-def pre_cpu_start(logger):
-    logger.enabled = LOG_LEVEL >= 9
-
-_ps = ""
-def instruction_callback(logger, instruction_no):
-    global _ps
-    if KILL_AT_INO < instruction_no:
-        raise SystemExit(0)
-    symbol = get_symbol_name(cpu.registers['pc'], symbols)
-    if LOG_LEVEL < 9:
+def pre_cpu_start(cpu):
+    cpu.logger.enabled = LOG_LEVEL >= 9
+    hooks = cpu.hooks
+    hooks.at_count(KILL_AT_INO, kill)
+    if LOG_LEVEL >= 9:
+        hooks.every(1, log_position)
+    else:
+        hooks.at_count(TRACEOUT_AT_INO - 1, start_traceout)
+        hooks.every(REPORT_STATUS_EACH_INO, report_status)
         if DO_PRINT_CHANGED_SYMBOLS:
-            if _ps != symbol:
-                logger.enabled = True
-                logger.log(3, "MAIN", f"Executing at {cpu.registers['pc']:08x}, Instruction no is {instruction_no}, {symbol}")
-                logger.enabled = False
-                _ps = symbol
-        if instruction_no % REPORT_STATUS_EACH_INO == 1:
-            logger.enabled = False
-        if instruction_no >= TRACEOUT_AT_INO:
-            logger.enabled = True
-        if instruction_no % REPORT_STATUS_EACH_INO != 0 and not logger.enabled: return
-    logger.enabled = True
-    logger.log(3, "MAIN", f"Executing at {cpu.registers['pc']:08x}, Instruction no is {instruction_no}, {symbol}")
+            hooks.on_symbol_change(cpu.symbols, symbol_changed)
+    if SNAPSHOT_AT_INO is not None:
+        hooks.at_count(SNAPSHOT_AT_INO - 1, take_snapshot)
+    if SNAPSHOT_AT_PC is not None:
+        hooks.at_pc(SNAPSHOT_AT_PC, take_snapshot)
+    if PROFILE_REPORT_EACH_INO is not None and cpu.profiler is not None:
+        hooks.every(PROFILE_REPORT_EACH_INO, report_profile)
+    if ACCELERATE_IDIOMS or VERIFY_IDIOMS:
+        idioms.install(cpu, verify=VERIFY_IDIOMS)
+
+# CPU hooks, see devices/cpu/hooks.py. Instruction numbers count from 1 and
+# name the instruction about to execute.
+def kill(cpu):
+    cpu.request_exit("killed")
+
+def log_position(cpu, symbol=False):
+    logger = cpu.logger
+    if symbol is False:
+        symbol = cpu.symbols.lookup(cpu.registers['pc'])
+    logger.log(3, "MAIN", f"Executing at {cpu.registers['pc']:08x}, Instruction no is {cpu.instret + 1}, {symbol_text(symbol)}")
     if TRACEOUT_PRINT_REGISTERS:
         regs = cpu.get_registers_formatted()
         for a,b,c,d in zip(regs[::4], regs[1::4], regs[2::4], regs[3::4]):
             logger.log(1, "MAIN", f"{a} {b} {c} {d}")
+
+def start_traceout(cpu):
+    cpu.logger.enabled = True
+    cpu.hooks.remove(report_status)
+    cpu.hooks.every(1, log_position)
+
+def report_status(cpu, symbol=False):
+    enabled, cpu.logger.enabled = cpu.logger.enabled, True
+    log_position(cpu, symbol)
+    cpu.logger.enabled = enabled
+
+def symbol_changed(cpu, old, new):
+    report_status(cpu, new)
+
+def take_snapshot(cpu):
+    cpu.hooks.remove(take_snapshot) # only once, even if both SNAPSHOT_AT_INO and SNAPSHOT_AT_PC are set
+    pages = snapshot.save(SNAPSHOT_FILE, cpu, cpu.memory)
+    enabled, cpu.logger.enabled = cpu.logger.enabled, True
+    cpu.logger.log(3, "MAIN", f"Saved snapshot to {SNAPSHOT_FILE} ({pages} pages) at {cpu.registers['pc']:08x}, instruction no {cpu.instret + 1}")
+    cpu.logger.enabled = enabled
+
+def report_profile(cpu):
+    enabled, cpu.logger.enabled = cpu.logger.enabled, True
+    for line in cpu.profiler.flat_report(PROFILE_REPORT_TOP):
+        cpu.logger.log(3, "PROFILE", line)
+    cpu.logger.enabled = enabled
@@ -0,0 +1,121 @@
+import time
+
+# SiFive-compatible core local interruptor: software interrupt (msip) and the
+# machine timer (mtime, mtimecmp) of hart 0.
+MSIP     = 0x0000
+MTIMECMP = 0x4000
+MTIME    = 0xBFF8
+
+TIMEBASE_FREQUENCY = 1000000 # ticks per second, timebase-frequency in the device tree
+TIME_SOURCE = "instret"      # "instret": mtime follows retired instructions, "wallclock": host time
+INSTRUCTIONS_PER_TICK = 1    # instret time source: instructions per mtime tick
+WALLCLOCK_POLL_INTERVAL = 10000 # wallclock time source: instructions between deadline checks
+
+MIP_MSIP = 1 << 3
+MIP_MTIP = 1 << 7
+
+class CLINT:
+    """Raises the machine timer interrupt once mtime reaches mtimecmp.
+
+    With the instret time source mtime is a function of cpu.instret, so the
+    deadline is known in advance and registered as a count event on
+    cpu.hooks: the CPU is not slowed down by the timer at all. With the
+    wallclock source the deadline is polled every WALLCLOCK_POLL_INTERVAL
+    instructions. WFI skips time forward to the deadline (see skip_to_deadline)."""
+    def __init__(self, logger, cpu):
+        self.logger = logger
+        self.cpu = cpu
+        self.msip = 0
+        self.mtimecmp = 0xFFFFFFFFFFFFFFFF
+        self.offset = 0 # ticks added to the time source, by mtime writes and WFI
+        self.started = time.perf_counter()
+        cpu.timer = self
+        if TIME_SOURCE == "wallclock":
+            cpu.hooks.every(WALLCLOCK_POLL_INTERVAL, self.poll)
+        elif TIME_SOURCE != "instret":
+            raise ValueError(f"Unsupported CLINT time source: {TIME_SOURCE}")
+
+    def mtime(self) -> int:
+        if TIME_SOURCE == "instret":
+            ticks = self.cpu.instret // INSTRUCTIONS_PER_TICK
+        else:
+            ticks = int((time.perf_counter() - self.started) * TIMEBASE_FREQUENCY)
+        return (ticks + self.offset) & 0xFFFFFFFFFFFFFFFF
+
+    def set_mtime(self, value: int) -> None:
+        self.offset += value - self.mtime()
+        self.reschedule()
+
+    def skip_to_deadline(self) -> None:
+        """Makes the timer deadline the current time, for WFI. On the wallclock
+        source this sleeps until then."""
+        remaining = self.mtimecmp - self.mtime()
+        if remaining <= 0 or self.mtimecmp == 0xFFFFFFFFFFFFFFFF: return
+        if TIME_SOURCE == "instret":
+            self.offset += remaining
+        else:
+            time.sleep(remaining / TIMEBASE_FREQUENCY)
+        self.reschedule()
+
+    def reschedule(self) -> None:
+        cpu = self.cpu
+        pending = self.mtime() >= self.mtimecmp
+        cpu.set_interrupt_pending(MIP_MTIP, pending)
+        if TIME_SOURCE != "instret": return
+        cpu.hooks.remove(self.deadline)
+        if not pending and self.mtimecmp != 0xFFFFFFFFFFFFFFFF:
+            ticks = self.mtimecmp - self.offset
+            cpu.hooks.at_count(ticks * INSTRUCTIONS_PER_TICK, self.deadline)
+
+    def deadline(self, cpu) -> None:
+        if self.logger.enabled: self.logger.log(7, "CLINT", "Timer deadline %d reached", self.mtimecmp)
+        self.reschedule()
+
+    def poll(self, cpu) -> None:
+        if self.mtime() >= self.mtimecmp:
+            cpu.set_interrupt_pending(MIP_MTIP, True)
+
+    # AddressBus device interface
+    def _register(self, offset: int):
+        if MTIMECMP <= offset < MTIMECMP + 8: return MTIMECMP, self.mtimecmp
+        if MTIME <= offset < MTIME + 8:       return MTIME, self.mtime()
+        if MSIP <= offset < MSIP + 4:         return MSIP, self.msip
+        return None, 0
+
+    def read(self, offset: int, amount: int) -> bytes:
+        data = bytearray()
+        while len(data) < amount:
+            base, value = self._register(offset + len(data))
+            if base is None:
+                data.append(0)
+                continue
+            start = offset + len(data) - base
+            data += value.to_bytes(8, "little")[start:start + amount - len(data)]
+        return bytes(data[:amount])
+
+    def write(self, offset: int, data: bytes) -> None:
+        base, value = self._register(offset)
+        if base is None: return
+        raw = bytearray(value.to_bytes(8, "little"))
+        start = offset - base
+        raw[start:start + len(data)] = data
+        value = int.from_bytes(raw[:8], "little")
+        if base == MTIMECMP:
+            self.mtimecmp = value
+            if self.logger.enabled: self.logger.log(7, "CLINT", "mtimecmp = %d (mtime %d)", value, self.mtime())
+            self.reschedule()
+        elif base == MTIME:
+            self.set_mtime(value)
+        else:
+            self.msip = value & 1
+            self.cpu.set_interrupt_pending(MIP_MSIP, bool(self.msip))
+
+    # snapshots
+    def get_state(self) -> dict:
+        return {"msip": self.msip, "mtimecmp": self.mtimecmp, "mtime": self.mtime()}
+
+    def set_state(self, state) -> None:
+        self.msip = state["msip"]
+        self.mtimecmp = state["mtimecmp"]
+        self.cpu.set_interrupt_pending(MIP_MSIP, bool(self.msip))
+        self.set_mtime(state["mtime"])
@@ -1,11 +1,24 @@
 import time
+from array import array
 
-from .instructions import INSTRUCTIONS
+from .isa import lookup as lookup_instruction
+from .rvc import expansion_table
+from .decode_cache import DecodeCache, DecodedInstruction, PAGE_SHIFT, ZERO_SINK
+from .translator import BlockTranslator
+from .jit import JITCore, EXIT_FALLBACK
+from .hooks import Hooks
 from devices.memory import AddressBus
 
 from utils.logger import Logger
+from utils.profiler import Profiler
 
-PROFILING_MODE = True
+PROFILING_MODE = False         # time every interpreted instruction per opcode (two perf_counter calls each)
+PROFILE_SAMPLE_INTERVAL = 1000 # sample the guest PC every that many instructions, 0 to disable
+DECODE_CACHE_MODE = True
+TRANSLATION_MODE = False # run guest basic blocks as generated Python functions
+JIT_MODE = False         # run through the numba core, needs flat RAM
+JIT_BUDGET = 10000       # instructions per numba call
+JIT_MIN_BATCH = 64       # a numba batch shorter than this before a fallback has that many interpreted next
 
 MACHINE_MODE    = 0b11
 SUPERVISOR_MODE = 0b01
@@ -15,6 +28,10 @@ mask_mstatus_MIE  = 0x0008
 mask_mstatus_MPIE = 0x0080
 mask_mstatus_MPP  = 0x1800
 
+INTERRUPT = 0x80000000 # mcause interrupt bit
+INTERRUPT_PRIORITY = (11, 3, 7) # external, software, timer
+mask_mip_hardware = 0x888 # MEIP, MTIP, MSIP: set by devices, read-only to software
+
 class CPU:
     def __init__(self, memory: AddressBus, logger: Logger):
         self.logger = logger
@@ -50,26 +67,132 @@ class CPU:
             "mimpid": 0,
             "hvc0": 0
         }
-        self.integer_registers = [
-             0, 0, 0, 0, 0, 0, 0, 0,
-             0, 0, 0, 0, 0, 0, 0, 0,
-             0, 0, 0, 0, 0, 0, 0, 0,
-             0, 0, 0, 0, 0, 0, 0, 0,
-        ]
+        # x0-x31 plus the sink writes to x0 go to, so x0 stays 0 without a check.
+        # Fixed size: the numba core works on a view of it.
+        self.integer_registers = array('I', bytes(4 * (ZERO_SINK + 1)))
         self.memory = memory
+        self.instret = 0 # retired instructions
+        self.reserved = -1 # LR/SC reservation
         self.previous_privilege_mode = USER_MODE
         self.privilege_mode = MACHINE_MODE
         self.previous_interrupts_enable = False
         self.interrupts_enable = False
+        self.interrupt_check_scheduled = False
+        self.timer = None # CLINT, if there is one
+        self.console = None # utils.console.HostConsole taking hvc0 output
+        self.symbols = None # utils.symbols.SymbolIndex of the loaded guest, if the loader has one
+        self.idioms = None # utils.idioms.Idioms, if guest routines are accelerated
+        self.exit_reason = None # set by request_exit, returned by run
+        self.reset_state = None # (cpu state, device states) for reset
+
+        self.hooks = Hooks(self)
+        self.profiler = None
+        if PROFILING_MODE or PROFILE_SAMPLE_INTERVAL:
+            self.enable_profiling(PROFILING_MODE, PROFILE_SAMPLE_INTERVAL)
+
+        self.decode_cache_enabled = DECODE_CACHE_MODE
+        self.decode_cache = DecodeCache()
+        memory.code_listeners.append(self.decode_cache.invalidate)
+        self.translator = None
+        if TRANSLATION_MODE:
+            self.enable_translation()
+        self.jit = None
+        if JIT_MODE:
+            self.enable_jit()
+
+    def enable_profiling(self, timing=PROFILING_MODE, sample_interval=PROFILE_SAMPLE_INTERVAL):
+        if self.profiler is None:
+            self.profiler = Profiler(timing, sample_interval)
+            if sample_interval:
+                self.hooks.every(sample_interval, self.profiler.sample)
+
+    def disable_profiling(self):
+        if self.profiler is not None:
+            self.hooks.remove(self.profiler.sample)
+            self.profiler = None
+
+    def enable_jit(self):
+        if self.jit is None:
+            self.jit = JITCore(self)
+
+    def disable_jit(self):
+        self.jit = None
+
+    def enable_translation(self):
+        if self.translator is None:
+            self.translator = BlockTranslator(self)
+            self.memory.code_listeners.append(self.translator.invalidate)
 
-        if PROFILING_MODE:
-            self.profiling_data = {}
+    def disable_translation(self):
+        if self.translator is not None:
+            self.memory.code_listeners.remove(self.translator.invalidate)
+            self.translator = None
 
     def get_registers_formatted(self):
-        regs = [f"#{i:02d}: {reg:08x}, " for i,reg in enumerate(self.integer_registers)] + [f"{n:8}: {reg:08x}, " for n,reg in self.registers.items() if n != "pc"] + [f"mstatus : {self.csr_read(0x300):08x}"]
+        regs = [f"#{i:02d}: {reg:08x}, " for i,reg in enumerate(self.integer_registers[:32])] + [f"{n:8}: {reg:08x}, " for n,reg in self.registers.items() if n != "pc"] + [f"mstatus : {self.csr_read(0x300):08x}"]
         regs = regs + [" "] * 4
         return regs
 
+    def get_state(self):
+        return {
+            "integer_registers": list(self.integer_registers[:32]),
+            "registers": dict(self.registers),
+            "privilege_mode": self.privilege_mode,
+            "previous_privilege_mode": self.previous_privilege_mode,
+            "interrupts_enable": self.interrupts_enable,
+            "previous_interrupts_enable": self.previous_interrupts_enable,
+            "reserved": self.reserved,
+            "instret": self.instret,
+        }
+
+    def set_state(self, state):
+        self.integer_registers[:32] = array('I', state["integer_registers"])
+        self.registers.clear()
+        self.registers.update(state["registers"])
+        self.privilege_mode = state["privilege_mode"]
+        self.previous_privilege_mode = state["previous_privilege_mode"]
+        self.interrupts_enable = state["interrupts_enable"]
+        self.previous_interrupts_enable = state["previous_interrupts_enable"]
+        self.reserved = state["reserved"]
+        self.instret = state["instret"]
+        if self.profiler is not None:
+            self.profiler.rebase(self.instret)
+        self.decode_cache.clear()
+        if self.translator is not None:
+            self.translator.clear()
+        self.hooks.remove(CPU.check_interrupts)
+        self.interrupt_check_scheduled = False
+        self.schedule_interrupt_check()
+
+    def capture_reset_state(self):
+        """Remembers the current CPU and device state, right after loading, as
+        what reset() goes back to."""
+        devices = [device.get_state() if hasattr(device, "get_state") else None for start, end, device in self.memory.devices]
+        self.reset_state = (self.get_state(), devices)
+
+    def reset(self):
+        """Reboots the machine: RAM is reloaded from the images kept by the
+        address bus, CPU and devices go back to the captured reset state.
+        instret keeps counting, so hooks registered by instruction count stay
+        valid."""
+        if self.reset_state is None:
+            raise ValueError("No reset state captured, call capture_reset_state after loading")
+        state, devices = self.reset_state
+        self.memory.reload_images()
+        self.set_state(dict(state, instret=self.instret))
+        for (start, end, device), device_state in zip(self.memory.devices, devices):
+            if device_state is not None:
+                device.set_state(device_state)
+        self.exit_reason = None
+
+    def request_exit(self, reason):
+        """Makes run() return reason once the current instruction retired."""
+        self.exit_reason = reason
+        self.hooks.at_count(self.instret, CPU.exit_point)
+
+    def exit_point(self):
+        pass # only there to make the run loop look at exit_reason
+
     def csr_read(self, address):
         regname = self.register_ids.get(address, "NONE")
         if regname == "NONE": return 0
@@ -88,41 +211,107 @@ class CPU:
     def csr_write(self, address, data):
         regname = self.register_ids.get(address, "NONE")
         if regname == "NONE": return
-        if regname == "hvc0": print(chr(data), end='', flush=True)
+        if regname == "hvc0":
+            if self.console is not None: self.console.put(data & 0xFF)
+            else: print(chr(data), end='', flush=True)
         if self.hardwires.get(regname): return
         if regname == "mstatus":
-            changed_bits = self.csr_read(address) ^ data
-            if changed_bits: return
-            if changed_bits & mask_mstatus_MIE == mask_mstatus_MIE:
-                if data & mask_mstatus_MIE:
-                    self.interrupts_enable = True
-                    return
-                self.interrupts_enable = False
-            if changed_bits & mask_mstatus_MPIE == mask_mstatus_MPIE:
-                if data & mask_mstatus_MPIE:
-                    self.previous_interrupts_enable = True
-                    return
-                self.previous_interrupts_enable = False
-            if changed_bits & mask_mstatus_MPP == mask_mstatus_MPP:
-                self.previous_privilege_mode = ((data & mask_mstatus_MPP) >> 11) & 0b11
+            self.interrupts_enable = bool(data & mask_mstatus_MIE)
+            self.previous_interrupts_enable = bool(data & mask_mstatus_MPIE)
+            self.previous_privilege_mode = (data & mask_mstatus_MPP) >> 11
+            self.schedule_interrupt_check()
+        elif regname == "mip":
+            self.registers["mip"] = (data & ~mask_mip_hardware) | (self.registers.get("mip", 0) & mask_mip_hardware)
+            self.schedule_interrupt_check()
         else:
             self.registers[regname] = data
+            if regname == "mie": self.schedule_interrupt_check()
+
+    # Traps and interrupts. Pending interrupts are only looked at from a count
+    # event scheduled whenever mip, mie or mstatus change, so the run loop pays
+    # nothing for them in between.
+    def trap(self, cause, value=0):
+        """Enters the machine mode trap handler for cause (with the INTERRUPT bit
+        for interrupts); mepc is the current pc."""
+        registers = self.registers
+        pc = registers["pc"]
+        registers["mepc"] = pc
+        registers["mcause"] = cause
+        registers["mtval"] = value
+        self.previous_interrupts_enable = self.interrupts_enable
+        self.interrupts_enable = False
+        self.previous_privilege_mode = self.privilege_mode
+        self.privilege_mode = MACHINE_MODE
+        self.reserved = -1
+        mtvec = registers.get("mtvec", 0)
+        base = mtvec & ~0b11
+        if mtvec & 0b11 == 1 and cause & INTERRUPT:
+            base += 4 * (cause & ~INTERRUPT)
+        registers["pc"] = base & 0xFFFFFFFF
+        if self.logger.enabled: self.logger.log(6, "CPU", "Trap %08x (mtval %08x) at %08x -> %08x", cause, value, pc, registers["pc"])
+
+    def trap_return(self):
+        """MRET: back to mepc in the mode saved in MPP."""
+        self.registers["pc"] = self.registers.get("mepc", 0)
+        self.interrupts_enable = self.previous_interrupts_enable
+        self.previous_interrupts_enable = True
+        self.privilege_mode = self.previous_privilege_mode
+        self.previous_privilege_mode = USER_MODE
+        self.schedule_interrupt_check()
+
+    def set_interrupt_pending(self, mask, pending):
+        """Called by devices to raise (pending=True) or clear bits of mip."""
+        mip = self.registers.get("mip", 0)
+        self.registers["mip"] = mip | mask if pending else mip & ~mask
+        if pending and not mip & mask:
+            self.schedule_interrupt_check()
+
+    def schedule_interrupt_check(self):
+        if self.interrupt_check_scheduled: return
+        self.interrupt_check_scheduled = True
+        self.hooks.at_count(self.instret, CPU.check_interrupts)
+
+    def check_interrupts(self):
+        self.interrupt_check_scheduled = False
+        pending = self.registers.get("mip", 0) & self.registers.get("mie", 0)
+        if not pending: return
+        if not self.interrupts_enable and self.privilege_mode == MACHINE_MODE: return
+        for cause in INTERRUPT_PRIORITY:
+            if pending & (1 << cause):
+                self.trap(INTERRUPT | cause)
+                return
+
+    def wait_for_interrupt(self):
+        """WFI: with nothing pending, lets time pass up to the next timer deadline."""
+        if self.registers.get("mip", 0) & self.registers.get("mie", 0): return
+        if self.timer is not None:
+            self.timer.skip_to_deadline()
 
     def int_read(self, n):
         return self.integer_registers[n]
 
     def int_write(self, n, v):
-        self.integer_registers[n] = v & 0xFFFFFFFF
-
-    def get_instruction(self, instn):
-        if INSTRUCTIONS.get(instn):
-            instruction = INSTRUCTIONS[instn]
-            self.logger.log(8, "CPU", f"Instruction implemented: {instn:02x} / {instn:07b} / {instn} / {instruction.__name__}")
-            return instruction
-        raise NotImplementedError(f"Instruction not implemented: {instn:02x} / {instn:07b} / {instn}")
+        self.integer_registers[n or ZERO_SINK] = v & 0xFFFFFFFF
 
     def fetch_instruction(self):
-        fetched = int.from_bytes(self.memory.read(self.registers["pc"], 2), 'little')
+        pc = self.registers["pc"]
+        if self.decode_cache_enabled:
+            page = self.decode_cache.pages.get(pc >> PAGE_SHIFT)
+            if page is not None:
+                op = page.get(pc)
+                if op is not None:
+                    return op
+
+        op = self.decode(pc)
+        # instructions straddling a page boundary are not cached, as a write to the
+        # second page would not invalidate them
+        if self.decode_cache_enabled and (pc & 0xFFF) + op.length <= 0x1000:
+            self.decode_cache.insert(pc, op)
+            self.memory.mark_executed(pc)
+        return op
+
+    def decode(self, pc):
+        fetched = self.memory.read_u16(pc)
         inst_size = 16
 
         if fetched & 0b1111111 == 0b1111111:   # (80+16*nnn)-bit instruction
@@ -131,50 +320,111 @@ class CPU:
                 raise NotImplementedError(f"Instruction size not implemented: {fetched:04x} / {fetched:16b}")
             x = (fetched >> 7) & 0b11111
             inst_size = bits = 80+16*n
-            fetched = int.from_bytes(self.memory.read(self.registers["pc"], bits // 8), 'little')
+            fetched = int.from_bytes(self.memory.read(pc, bits // 8), 'little')
         elif fetched & 0b1111111 == 0b0111111: # 64 bit instruction
-            fetched = int.from_bytes(self.memory.read(self.registers["pc"], 8), 'little')
+            fetched = int.from_bytes(self.memory.read(pc, 8), 'little')
             inst_size = 64
         elif fetched & 0b111111 == 0b011111:   # 48 bit instruction
-            fetched = int.from_bytes(self.memory.read(self.registers["pc"], 6), 'little')
+            fetched = int.from_bytes(self.memory.read(pc, 6), 'little')
             inst_size = 48
         elif fetched & 0b11 == 0b11:           # 32 bit instruction
-            fetched = int.from_bytes(self.memory.read(self.registers["pc"], 4), 'little')
+            fetched = self.memory.read_u32(pc)
             inst_size = 32
         else:                                  # 16 bit instruction
             pass
 
-        self.logger.log(8, "CPU", f"############## fetched: {fetched:08x} at PC {self.registers['pc']:08x}")
-        if inst_size == 32:
-            instruction = fetched & 0b01111111
+        if self.logger.enabled: self.logger.log(8, "CPU", "############## fetched: %08x at PC %08x", fetched, pc)
+        if inst_size == 16:
+            word = expansion_table()[fetched]
+            if not word:
+                raise NotImplementedError(f"Compressed instruction not implemented: {fetched:04x} / {fetched:016b}")
+        elif inst_size == 32:
+            word = fetched
         else:
             raise NotImplementedError(f"Instruction format not implemented: {fetched:016x} / inst_s {inst_size}")
+        spec = lookup_instruction(word)
+        if spec is None:
+            raise NotImplementedError(f"Instruction not implemented: {word:08x} / opcode {word & 0x7F:07b} funct3 {(word >> 12) & 0x7} funct7 {word >> 25:#04x}")
+        if self.logger.enabled: self.logger.log(8, "CPU", "Instruction implemented: %s", spec.mnemonic)
+        return DecodedInstruction(spec, word, inst_size // 8)
 
-        inst = self.get_instruction(instruction)
-        inst.inst_size = inst_size
-        return inst, fetched
-
-    def run(self, instruction_cb):
+    def run(self, instruction_cb=None):
+        """Runs until the guest asks to stop (see request_exit), a hook raises or
+        an instruction cannot be fetched. Returns the exit reason, or -1 if the
+        run did not end gracefully. Events are registered on self.hooks.
+        instruction_cb, if given, is called before every step: one interpreted
+        instruction, translated block or numba batch."""
         graceful_exit = False
+        hooks = self.hooks
+        self.exit_reason = None
+        jit_resume = 0 # instret at which the numba core gets control back after a fallback
         while True:
-            instruction, fetched = self.fetch_instruction()
-            if not instruction: break
-            try:
-                instruction_cb()
-                start_time = time.perf_counter()
-                jumped_pc = instruction(fetched, self, self.memory, self.logger)
-                took = time.perf_counter() - start_time
-                self.integer_registers[0] = 0
-                for i in range(len(self.integer_registers)):
-                    self.integer_registers[i] = self.integer_registers[i] & 0xFFFFFFFF
-                if not jumped_pc:
-                    self.registers["pc"] += instruction.inst_size // 8
-                self.profiling_data[instruction.serialized] = self.profiling_data.get(instruction.serialized, [])
-                self.profiling_data[instruction.serialized].append(took)
-            except:
-                self.integer_registers[0] = 0
-                for i in range(len(self.integer_registers)):
-                    self.integer_registers[i] = self.integer_registers[i] & 0xFFFFFFFF
-                raise
+            while self.instret >= hooks.next_event: # callbacks may schedule events for right now
+                hooks.fire_counts()
+            if self.exit_reason is not None:
+                graceful_exit = True
+                break
+            pc = self.registers["pc"]
+            if pc in hooks.breakpoints and hooks.fire_breakpoint(pc):
+                continue # the callbacks may have moved pc or scheduled events
+            if not hooks.symbol_start <= pc < hooks.symbol_end:
+                hooks.fire_symbol_change(pc)
+            budget = hooks.next_event - self.instret
+            jit = self.jit if not (hooks.symbol_watchers or hooks.write_watchers) else None
+            if jit is not None and self.instret >= jit_resume:
+                if instruction_cb is not None: instruction_cb()
+                executed, reason = jit.run(min(JIT_BUDGET, budget), hooks.breakpoint_array)
+                self.instret += executed
+                if reason == EXIT_FALLBACK:
+                    # the instruction at pc is the interpreter's, and after a
+                    # short batch so are the next ones most likely: another
+                    # numba call would cost more than interpreting them
+                    jit_resume = self.instret + (1 if executed >= JIT_MIN_BATCH else JIT_MIN_BATCH)
+                continue
+            if self.translator is not None:
+                block = self.translator.lookup(pc)
+                if block is not None and block[1] <= budget:
+                    function = block[0]
+                    if instruction_cb is not None: instruction_cb()
+                    self.registers["pc"] = function(self, self.integer_registers, self.memory)
+                    continue
+            # on its own the interpreter runs straight up to the next event,
+            # otherwise it only covers what the faster engines leave to it
+            if self.translator is not None or instruction_cb is not None:
+                budget = 1
+            elif jit is not None:
+                budget = min(budget, jit_resume - self.instret)
+            if not self.interpret(budget, instruction_cb): break
         if not graceful_exit:
             return -1
+        return self.exit_reason
+
+    def interpret(self, count, instruction_cb=None) -> bool:
+        """Interprets up to count instructions, stopping early at a breakpoint or
+        a symbol change hook. Returns False if an instruction could not be fetched."""
+        hooks = self.hooks
+        breakpoints = hooks.breakpoints
+        registers = self.registers
+        profiler = self.profiler
+        timing = profiler is not None and profiler.timing
+        executed = 0
+        while executed < count:
+            if executed:
+                pc = registers["pc"]
+                if pc in breakpoints or not hooks.symbol_start <= pc < hooks.symbol_end: break
+                if self.instret >= hooks.next_event: break # scheduled by the last instruction
+            op = self.fetch_instruction()
+            if not op: return False
+            instruction = op.handler
+            if instruction_cb is not None: instruction_cb()
+            if timing:
+                start_time = time.perf_counter()
+                jumped_pc = instruction(op, self, self.memory, self.logger)
+                profiler.record(op.spec.mnemonic, time.perf_counter() - start_time)
+            else:
+                jumped_pc = instruction(op, self, self.memory, self.logger)
+            if not jumped_pc:
+                registers["pc"] += op.length
+            self.instret += 1
+            executed += 1
+        return True
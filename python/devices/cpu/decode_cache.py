@@ -0,0 +1,47 @@
+from .isa import IMMEDIATES
+
+PAGE_SHIFT = 12
+ZERO_SINK = 32 # register file index that takes writes to x0
+
+class DecodedInstruction:
+    __slots__ = ("spec", "handler", "raw", "length", "funct3", "funct7", "rd", "rs1", "rs2", "imm", "dst")
+
+    def __init__(self, spec, raw: int, length: int):
+        self.spec = spec # the isa.Instruction row
+        self.handler = spec.handler
+        self.raw = raw
+        self.length = length # in bytes
+        self.funct3 = (raw >> 12) & 0x7
+        self.funct7 = raw >> 25
+        self.rd = (raw >> 7) & 0x1F
+        self.rs1 = (raw >> 15) & 0x1F
+        self.rs2 = (raw >> 20) & 0x1F
+        self.imm = IMMEDIATES[spec.format](raw)
+        self.dst = self.rd or ZERO_SINK # where handlers write rd
+
+class DecodeCache:
+    """Per-page table of already decoded instructions, keyed by PC.
+
+    Pages are dropped as a whole whenever something writes into them, so
+    self-modifying code and freshly loaded code get decoded again."""
+    def __init__(self):
+        self.pages = {}
+
+    def lookup(self, pc: int):
+        page = self.pages.get(pc >> PAGE_SHIFT)
+        if page is None: return None
+        return page.get(pc)
+
+    def insert(self, pc: int, op: DecodedInstruction) -> None:
+        page = self.pages.get(pc >> PAGE_SHIFT)
+        if page is None:
+            page = self.pages[pc >> PAGE_SHIFT] = {}
+        page[pc] = op
+
+    def invalidate(self, address: int, length: int) -> None:
+        if not self.pages or length <= 0: return
+        for page in range(address >> PAGE_SHIFT, ((address + length - 1) >> PAGE_SHIFT) + 1):
+            self.pages.pop(page, None)
+
+    def clear(self) -> None:
+        self.pages.clear()
@@ -0,0 +1,135 @@
+import numpy
+
+NEVER = float("inf")
+ADDRESS_SPACE = 1 << 32
+
+class Hooks:
+    """Events CPU.run stops for. Callbacks are called as callback(cpu) unless
+    noted otherwise and may change CPU state or raise to end the run.
+
+        at_pc(pc, cb)               before the instruction at pc executes
+        at_count(instret, cb)       once `instret` instructions have retired
+        every(period, cb)           whenever instret reaches a multiple of period
+        on_symbol_change(index, cb) cb(cpu, old, new) when pc enters another
+                                    symbol of a utils.symbols.SymbolIndex
+        on_write(start, end, cb)    cb(cpu, address, length) before a write
+                                    touches [start, end] (inclusive)
+
+    Between events the run loop executes without calling back into Python
+    code. Count events are exact on every engine: translated blocks that
+    would run past the next one are left to the interpreter and the numba
+    core is given only the instructions up to it. Breakpoints also end
+    translated blocks and numba batches. Symbol changes are seen before every
+    interpreted instruction and at every block entry, and write hooks before
+    every store; the numba core does neither, so it is not used while a
+    symbol or write hook is registered."""
+    def __init__(self, cpu):
+        self.cpu = cpu
+        self.breakpoints = {}       # pc -> [callbacks]
+        self.breakpoint_array = numpy.zeros(0, dtype=numpy.int64) # same pcs, for the numba core
+        self.fired = None           # (pc, instret) of the last breakpoint hit, so resuming does not hit it again
+        self.counts = []            # [instret, callback, period or 0]
+        self.next_event = NEVER
+        self.symbols = None
+        self.symbol_watchers = []
+        self.symbol = None
+        self.symbol_start, self.symbol_end = 0, ADDRESS_SPACE # pc range that does not need a symbol lookup
+        self.write_watchers = []    # (start, end, callback)
+
+    # registration
+    def at_pc(self, pc: int, callback) -> None:
+        self.breakpoints.setdefault(pc, []).append(callback)
+        self._breakpoints_changed()
+
+    def at_count(self, instret: int, callback) -> None:
+        self.counts.append([instret, callback, 0])
+        self._reschedule()
+
+    def every(self, period: int, callback) -> None:
+        if period <= 0:
+            raise ValueError(f"Invalid hook period {period}")
+        self.counts.append([-(-self.cpu.instret // period) * period, callback, period])
+        self._reschedule()
+
+    def on_symbol_change(self, symbols, callback) -> None:
+        if self.symbols is not None and self.symbols is not symbols:
+            raise ValueError("Symbol change hooks have to share one SymbolIndex")
+        self.symbols = symbols
+        self.symbol_watchers.append(callback)
+        self.symbol = False # resolve on the next instruction
+        self.symbol_start, self.symbol_end = 0, 0
+
+    def on_write(self, start: int, end: int, callback) -> None:
+        if not self.write_watchers:
+            self.cpu.memory.write_listeners.append(self._write_listener)
+        self.write_watchers.append((start, end, callback))
+
+    def remove(self, callback) -> None:
+        """Unregisters callback from every event it was registered for."""
+        changed = False
+        for pc in list(self.breakpoints):
+            callbacks = [cb for cb in self.breakpoints[pc] if cb != callback]
+            if len(callbacks) == len(self.breakpoints[pc]): continue
+            changed = True
+            if callbacks: self.breakpoints[pc] = callbacks
+            else: del self.breakpoints[pc]
+        if changed: # don't throw translated blocks away for count, symbol and write events
+            self._breakpoints_changed()
+        self.counts = [event for event in self.counts if event[1] != callback]
+        self._reschedule()
+        if callback in self.symbol_watchers:
+            self.symbol_watchers.remove(callback)
+            if not self.symbol_watchers:
+                self.symbols, self.symbol = None, None
+                self.symbol_start, self.symbol_end = 0, ADDRESS_SPACE
+        watched = bool(self.write_watchers)
+        self.write_watchers = [watch for watch in self.write_watchers if watch[2] != callback]
+        if watched and not self.write_watchers:
+            self.cpu.memory.write_listeners.remove(self._write_listener)
+
+    def _breakpoints_changed(self) -> None:
+        self.breakpoint_array = numpy.array(sorted(self.breakpoints), dtype=numpy.int64)
+        if self.cpu.translator is not None:
+            self.cpu.translator.clear() # blocks must not run over a breakpoint
+
+    def _reschedule(self) -> None:
+        self.next_event = min((event[0] for event in self.counts), default=NEVER)
+
+    # called by CPU.run
+    def fire_counts(self) -> None:
+        cpu = self.cpu
+        for event in list(self.counts):
+            if event[0] > cpu.instret: continue
+            instret, callback, period = event
+            if period:
+                event[0] = (cpu.instret // period + 1) * period
+            else:
+                self.counts.remove(event)
+            callback(cpu)
+        self._reschedule()
+
+    def fire_breakpoint(self, pc: int) -> bool:
+        """Runs the callbacks for pc, unless they already ran for this very
+        instruction. Returns whether they did."""
+        cpu = self.cpu
+        if self.fired == (pc, cpu.instret): return False
+        self.fired = (pc, cpu.instret)
+        for callback in list(self.breakpoints[pc]):
+            callback(cpu)
+        return True
+
+    def fire_symbol_change(self, pc: int) -> None:
+        symbol = self.symbols.lookup(pc)
+        if symbol is not None and symbol.address <= pc < symbol.address + symbol.size:
+            self.symbol_start, self.symbol_end = symbol.address, symbol.address + symbol.size
+        else:
+            self.symbol_start, self.symbol_end = pc, pc + 1
+        if symbol is self.symbol: return
+        old, self.symbol = self.symbol, symbol
+        for callback in list(self.symbol_watchers):
+            callback(self.cpu, old or None, symbol)
+
+    def _write_listener(self, address: int, length: int) -> None:
+        for start, end, callback in self.write_watchers:
+            if address <= end and start < address + length:
+                callback(self.cpu, address, length)
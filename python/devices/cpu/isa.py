@@ -0,0 +1,197 @@
+from .instructions import HANDLERS
+from .rvc import expansion_table
+
+# Major opcodes
+LOAD     = 0b0000011
+MISC_MEM = 0b0001111
+OP_IMM   = 0b0010011
+AUIPC    = 0b0010111
+STORE    = 0b0100011
+AMO      = 0b0101111
+OP       = 0b0110011
+LUI      = 0b0110111
+BRANCH   = 0b1100011
+JALR     = 0b1100111
+JAL      = 0b1101111
+SYSTEM   = 0b1110011
+
+# Assembly syntax, used by disassemble
+R3   = "{rd}, {rs1}, {rs2}"
+RI   = "{rd}, {rs1}, {imm}"
+SH   = "{rd}, {rs1}, {shamt}"
+LD   = "{rd}, {imm}({rs1})"
+ST   = "{rs2}, {imm}({rs1})"
+BR   = "{rs1}, {rs2}, {target}"
+JL   = "{rd}, {target}"
+UP   = "{rd}, {upper}"
+AM   = "{rd}, {rs2}, ({rs1})"
+LR   = "{rd}, ({rs1})"
+CSR  = "{rd}, {csr}, {rs1}"
+CSRI = "{rd}, {csr}, {zimm}"
+NONE = ""
+
+# mnemonic, format, opcode, funct3, funct7, syntax
+# None matches any value of the field. For AMO the funct7 column holds funct5,
+# the aq/rl bits below it are ignored. For the privileged SYSTEM instructions
+# (funct3 0) it holds funct12, rd and rs1 have to be 0.
+ISA = (
+    ("lui",       'U', LUI,      None, None, UP),
+    ("auipc",     'U', AUIPC,    None, None, UP),
+    ("jal",       'J', JAL,      None, None, JL),
+    ("jalr",      'I', JALR,     None, None, LD),
+    ("beq",       'B', BRANCH,   0,    None, BR),
+    ("bne",       'B', BRANCH,   1,    None, BR),
+    ("blt",       'B', BRANCH,   4,    None, BR),
+    ("bge",       'B', BRANCH,   5,    None, BR),
+    ("bltu",      'B', BRANCH,   6,    None, BR),
+    ("bgeu",      'B', BRANCH,   7,    None, BR),
+    ("lb",        'I', LOAD,     0,    None, LD),
+    ("lh",        'I', LOAD,     1,    None, LD),
+    ("lw",        'I', LOAD,     2,    None, LD),
+    ("lbu",       'I', LOAD,     4,    None, LD),
+    ("lhu",       'I', LOAD,     5,    None, LD),
+    ("sb",        'S', STORE,    0,    None, ST),
+    ("sh",        'S', STORE,    1,    None, ST),
+    ("sw",        'S', STORE,    2,    None, ST),
+    ("addi",      'I', OP_IMM,   0,    None, RI),
+    ("slli",      'I', OP_IMM,   1,    None, SH),
+    ("slti",      'I', OP_IMM,   2,    None, RI),
+    ("sltiu",     'I', OP_IMM,   3,    None, RI),
+    ("xori",      'I', OP_IMM,   4,    None, RI),
+    ("srli",      'I', OP_IMM,   5,    0x00, SH),
+    ("srai",      'I', OP_IMM,   5,    0x20, SH),
+    ("ori",       'I', OP_IMM,   6,    None, RI),
+    ("andi",      'I', OP_IMM,   7,    None, RI),
+    ("add",       'R', OP,       0,    0x00, R3),
+    ("sub",       'R', OP,       0,    0x20, R3),
+    ("sll",       'R', OP,       1,    0x00, R3),
+    ("slt",       'R', OP,       2,    0x00, R3),
+    ("sltu",      'R', OP,       3,    0x00, R3),
+    ("xor",       'R', OP,       4,    0x00, R3),
+    ("srl",       'R', OP,       5,    0x00, R3),
+    ("sra",       'R', OP,       5,    0x20, R3),
+    ("or",        'R', OP,       6,    0x00, R3),
+    ("and",       'R', OP,       7,    0x00, R3),
+    ("mul",       'R', OP,       0,    0x01, R3),
+    ("mulh",      'R', OP,       1,    0x01, R3),
+    ("mulhu",     'R', OP,       3,    0x01, R3),
+    ("div",       'R', OP,       4,    0x01, R3),
+    ("divu",      'R', OP,       5,    0x01, R3),
+    ("rem",       'R', OP,       6,    0x01, R3),
+    ("remu",      'R', OP,       7,    0x01, R3),
+    ("fence",     'I', MISC_MEM, None, None, NONE),
+    ("ecall",     'I', SYSTEM,   0,    0x000, NONE),
+    ("ebreak",    'I', SYSTEM,   0,    0x001, NONE),
+    ("mret",      'I', SYSTEM,   0,    0x302, NONE),
+    ("wfi",       'I', SYSTEM,   0,    0x105, NONE),
+    ("csrrw",     'I', SYSTEM,   1,    None, CSR),
+    ("csrrs",     'I', SYSTEM,   2,    None, CSR),
+    ("csrrc",     'I', SYSTEM,   3,    None, CSR),
+    ("csrrwi",    'I', SYSTEM,   5,    None, CSRI),
+    ("csrrsi",    'I', SYSTEM,   6,    None, CSRI),
+    ("csrrci",    'I', SYSTEM,   7,    None, CSRI),
+    ("amoadd.w",  'R', AMO,      2,    0x00, AM),
+    ("amoswap.w", 'R', AMO,      2,    0x01, AM),
+    ("lr.w",      'R', AMO,      2,    0x02, LR),
+    ("sc.w",      'R', AMO,      2,    0x03, AM),
+    ("amoxor.w",  'R', AMO,      2,    0x04, AM),
+    ("amoor.w",   'R', AMO,      2,    0x08, AM),
+    ("amoand.w",  'R', AMO,      2,    0x0C, AM),
+)
+
+class Instruction:
+    """One row of ISA with the handler executing it."""
+    __slots__ = ("mnemonic", "format", "opcode", "funct3", "funct7", "syntax", "handler")
+
+    def __init__(self, mnemonic, format, opcode, funct3, funct7, syntax):
+        self.mnemonic = mnemonic
+        self.format = format
+        self.opcode = opcode
+        self.funct3 = funct3
+        self.funct7 = funct7
+        self.syntax = syntax
+        self.handler = HANDLERS[mnemonic]
+
+    def __repr__(self):
+        return f"<Instruction {self.mnemonic}>"
+
+# Dispatch key: opcode | funct3 << 7 | funct7 << 10
+KEY_BITS = 17
+
+def dispatch_key(raw: int) -> int:
+    return (raw & 0x7F) | ((raw >> 5) & 0x380) | ((raw >> 15) & 0x1FC00)
+
+def _build_dispatch():
+    dispatch = [None] * (1 << KEY_BITS)
+    privileged = {} # funct12 -> Instruction
+    mnemonics = {}
+    for row in ISA:
+        instruction = mnemonics[row[0]] = Instruction(*row)
+        if instruction.opcode == SYSTEM and instruction.funct3 == 0:
+            privileged[instruction.funct7] = instruction
+            continue
+        funct3s = range(8) if instruction.funct3 is None else (instruction.funct3,)
+        if instruction.funct7 is None:
+            funct7s = range(128)
+        elif instruction.opcode == AMO:
+            funct7s = range(instruction.funct7 << 2, (instruction.funct7 << 2) + 4)
+        else:
+            funct7s = (instruction.funct7,)
+        for funct3 in funct3s:
+            for funct7 in funct7s:
+                key = instruction.opcode | (funct3 << 7) | (funct7 << 10)
+                if dispatch[key] is not None:
+                    raise ValueError(f"{instruction.mnemonic} overlaps {dispatch[key].mnemonic} in the ISA table")
+                dispatch[key] = instruction
+    return dispatch, privileged, mnemonics
+
+DISPATCH, PRIVILEGED, MNEMONICS = _build_dispatch()
+
+def lookup(raw: int):
+    """The Instruction for a 32-bit instruction word, None if it is not implemented."""
+    if raw & 0xFFFFF == SYSTEM:
+        return PRIVILEGED.get(raw >> 20)
+    return DISPATCH[dispatch_key(raw)]
+
+# Sign-extended immediates per format
+def immediate_i(raw):
+    return ((raw >> 20) ^ 0x800) - 0x800
+
+def immediate_s(raw):
+    return ((((raw >> 25) << 5) | ((raw >> 7) & 0x1F)) ^ 0x800) - 0x800
+
+def immediate_b(raw):
+    value = ((raw >> 31) << 12) | (((raw >> 7) & 0x1) << 11) | (((raw >> 25) & 0x3F) << 5) | (((raw >> 8) & 0xF) << 1)
+    return (value ^ 0x1000) - 0x1000
+
+def immediate_j(raw):
+    value = ((raw >> 31) << 20) | (raw & 0xFF000) | (((raw >> 20) & 0x1) << 11) | (((raw >> 21) & 0x3FF) << 1)
+    return (value ^ 0x100000) - 0x100000
+
+def immediate_u(raw):
+    return raw & 0xFFFFF000
+
+def immediate_r(raw):
+    return 0
+
+IMMEDIATES = {'I': immediate_i, 'S': immediate_s, 'B': immediate_b, 'J': immediate_j, 'U': immediate_u, 'R': immediate_r}
+
+def disassemble(raw: int, pc=None) -> str:
+    """Assembly text for an instruction word; compressed instructions (low
+    halfword not ending in 0b11) show as their 32-bit expansion. Branch and
+    jump targets are absolute when pc is given, relative otherwise."""
+    if raw & 0b11 != 0b11:
+        half, raw = raw & 0xFFFF, expansion_table()[raw & 0xFFFF]
+        if not raw:
+            return f".half {half:#06x}"
+    instruction = lookup(raw)
+    if instruction is None:
+        return f".word {raw:#010x}"
+    imm = IMMEDIATES[instruction.format](raw)
+    rd, rs1, rs2 = (raw >> 7) & 0x1F, (raw >> 15) & 0x1F, (raw >> 20) & 0x1F
+    operands = instruction.syntax.format(
+        rd=f"x{rd}", rs1=f"x{rs1}", rs2=f"x{rs2}", imm=imm, shamt=imm & 0x1F,
+        target=f"{(pc + imm) & 0xFFFFFFFF:08x}" if pc is not None else f"pc{imm:+d}",
+        upper=f"{imm >> 12:#x}", csr=f"{imm & 0xFFF:#x}", zimm=rs1,
+    )
+    return f"{instruction.mnemonic} {operands}".rstrip()
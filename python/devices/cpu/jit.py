@@ -0,0 +1,288 @@
+from numba import njit
+import numpy
+
+from .decode_cache import PAGE_SHIFT
+from .rvc import expansion_table
+
+EXIT_BUDGET   = 0 # ran the requested amount of instructions
+EXIT_FALLBACK = 1 # the instruction at pc needs the Python interpreter (MMIO, CSR, unsupported)
+EXIT_BREAK    = 2 # reached one of the breakpoints
+
+MASK = 0xFFFFFFFF
+NO_BREAKPOINTS = numpy.zeros(0, dtype=numpy.int64)
+
+@njit(cache=True)
+def _signed(value):
+    return value - ((value & 0x80000000) << 1)
+
+@njit(cache=True)
+def _sign_extend(value, bits):
+    sign = 1 << (bits - 1)
+    return (value ^ sign) - sign
+
+@njit(cache=True)
+def _load(memory, offset, width):
+    value = numpy.int64(0)
+    for i in range(width):
+        value |= numpy.int64(memory[offset + i]) << (8 * i)
+    return value
+
+@njit(cache=True)
+def _store(memory, dirty, offset, width, value):
+    for i in range(width):
+        memory[offset + i] = numpy.uint8((value >> (8 * i)) & 0xFF)
+    dirty[offset >> PAGE_SHIFT] = 1
+    dirty[(offset + width - 1) >> PAGE_SHIFT] = 1
+
+@njit(cache=True)
+def execute(regs, memory, base, pc, budget, dirty, state, breakpoints, expansion):
+    """Runs up to `budget` RV32IMAC instructions straight out of the flat RAM
+    array, compressed ones through the rvc expansion table. Returns (pc,
+    executed, reason); on EXIT_FALLBACK and EXIT_BREAK the instruction at pc
+    has not been executed. Breakpoints are not checked for the first
+    instruction, so a run can resume from one. state[0] holds the LR/SC
+    reservation."""
+    size = memory.shape[0]
+    executed = 0
+    while executed < budget:
+        if executed:
+            for breakpoint in breakpoints:
+                if pc == breakpoint:
+                    return pc, executed, EXIT_BREAK
+        offset = pc - base
+        if offset < 0 or offset + 2 > size:
+            return pc, executed, EXIT_FALLBACK
+        inst = _load(memory, offset, 2)
+        if inst & 0b11 == 0b11:
+            if offset + 4 > size:
+                return pc, executed, EXIT_FALLBACK
+            inst = _load(memory, offset, 4)
+            length = 4
+        else:
+            inst = numpy.int64(expansion[inst])
+            if inst == 0:
+                return pc, executed, EXIT_FALLBACK
+            length = 2
+        opcode = inst & 0x7F
+        rd     = (inst >> 7) & 0x1F
+        funct3 = (inst >> 12) & 0x7
+        rs1    = (inst >> 15) & 0x1F
+        rs2    = (inst >> 20) & 0x1F
+        funct7 = inst >> 25
+        a = numpy.int64(regs[rs1])
+        b = numpy.int64(regs[rs2])
+        next_pc = pc + length
+        value = numpy.int64(0)
+        write = True
+
+        if opcode == 0b0010011: # ANY_INTGR_I
+            imm = _sign_extend(inst >> 20, 12)
+            if funct3 == 0:   # addi
+                value = a + imm
+            elif funct3 == 1: # slli
+                value = a << (imm & 0x1F)
+            elif funct3 == 2: # slti
+                value = 1 if _signed(a) < imm else 0
+            elif funct3 == 3: # sltiu
+                value = 1 if a < (imm & MASK) else 0
+            elif funct3 == 4: # xori
+                value = a ^ (imm & MASK)
+            elif funct3 == 5:
+                if imm >> 5 == 0x00:   # srli
+                    value = a >> (imm & 0x1F)
+                elif imm >> 5 == 0x20: # srai
+                    value = _signed(a) >> (imm & 0x1F)
+                else:
+                    return pc, executed, EXIT_FALLBACK
+            elif funct3 == 6: # ori
+                value = a | (imm & MASK)
+            else:             # andi
+                value = a & (imm & MASK)
+        elif opcode == 0b0110011: # ANY_INTGR
+            if funct7 == 0x00:
+                if funct3 == 0:   # add
+                    value = a + b
+                elif funct3 == 1: # sll
+                    value = a << (b & 0x1F)
+                elif funct3 == 2: # slt
+                    value = 1 if _signed(a) < _signed(b) else 0
+                elif funct3 == 3: # sltu
+                    value = 1 if a < b else 0
+                elif funct3 == 4: # xor
+                    value = a ^ b
+                elif funct3 == 5: # srl
+                    value = a >> (b & 0x1F)
+                elif funct3 == 6: # or
+                    value = a | b
+                else:             # and
+                    value = a & b
+            elif funct7 == 0x01:
+                # division and remainder stay with the interpreter
+                if funct3 == 0:   # mul
+                    value = numpy.int64((numpy.uint64(a) * numpy.uint64(b)) & numpy.uint64(MASK))
+                elif funct3 == 1: # mulh
+                    value = (_signed(a) * _signed(b)) >> 32
+                elif funct3 == 3: # mulhu
+                    value = numpy.int64((numpy.uint64(a) * numpy.uint64(b)) >> numpy.uint64(32))
+                else:
+                    return pc, executed, EXIT_FALLBACK
+            elif funct7 == 0x20:
+                if funct3 == 0:   # sub
+                    value = a - b
+                elif funct3 == 5: # sra
+                    value = _signed(a) >> (b & 0x1F)
+                else:
+                    return pc, executed, EXIT_FALLBACK
+            else:
+                return pc, executed, EXIT_FALLBACK
+        elif opcode == 0b0110111: # LUI
+            value = inst & 0xFFFFF000
+        elif opcode == 0b0010111: # AUIPC
+            value = pc + (inst & 0xFFFFF000)
+        elif opcode == 0b0000011: # LOAD
+            address = (a + _sign_extend(inst >> 20, 12)) & MASK
+            if funct3 == 0 or funct3 == 4:
+                width = 1
+            elif funct3 == 1 or funct3 == 5:
+                width = 2
+            elif funct3 == 2:
+                width = 4
+            else:
+                return pc, executed, EXIT_FALLBACK
+            loffset = address - base
+            if loffset < 0 or loffset + width > size:
+                return pc, executed, EXIT_FALLBACK
+            value = _load(memory, loffset, width)
+            if funct3 == 0:
+                value = _sign_extend(value, 8)
+            elif funct3 == 1:
+                value = _sign_extend(value, 16)
+        elif opcode == 0b0100011: # STORE
+            write = False
+            imm = _sign_extend(((inst >> 25) << 5) | ((inst >> 7) & 0x1F), 12)
+            address = (a + imm) & MASK
+            if funct3 > 2:
+                return pc, executed, EXIT_FALLBACK
+            width = 1 << funct3
+            soffset = address - base
+            if soffset < 0 or soffset + width > size:
+                return pc, executed, EXIT_FALLBACK
+            _store(memory, dirty, soffset, width, b)
+        elif opcode == 0b1100011: # BRANCH
+            write = False
+            imm = _sign_extend(((inst >> 31) << 12) | (((inst >> 7) & 0x1) << 11)
+                               | (((inst >> 25) & 0x3F) << 5) | (((inst >> 8) & 0xF) << 1), 13)
+            if funct3 == 0:   # beq
+                taken = a == b
+            elif funct3 == 1: # bne
+                taken = a != b
+            elif funct3 == 4: # blt
+                taken = _signed(a) < _signed(b)
+            elif funct3 == 5: # bge
+                taken = _signed(a) >= _signed(b)
+            elif funct3 == 6: # bltu
+                taken = a < b
+            elif funct3 == 7: # bgeu
+                taken = a >= b
+            else:
+                return pc, executed, EXIT_FALLBACK
+            if taken:
+                next_pc = pc + imm
+        elif opcode == 0b1101111: # JAL
+            imm = _sign_extend(((inst >> 31) << 20) | (inst & 0xFF000) | (((inst >> 20) & 0x1) << 11)
+                               | (((inst >> 21) & 0x3FF) << 1), 21)
+            value = pc + length
+            next_pc = pc + imm
+        elif opcode == 0b1100111: # JALR
+            value = pc + length
+            next_pc = a + _sign_extend(inst >> 20, 12)
+        elif opcode == 0b0101111: # ATOMIC
+            funct5 = funct7 >> 2
+            if funct3 != 0x02:
+                return pc, executed, EXIT_FALLBACK
+            aoffset = a - base
+            if aoffset < 0 or aoffset + 4 > size:
+                return pc, executed, EXIT_FALLBACK
+            if funct5 == 0x02:   # lr.w
+                value = _load(memory, aoffset, 4)
+                state[0] = a
+            elif funct5 == 0x03: # sc.w
+                if state[0] != a:
+                    value = 1
+                else:
+                    _store(memory, dirty, aoffset, 4, b)
+                    value = 0
+                state[0] = -1
+            else:
+                value = _load(memory, aoffset, 4)
+                if funct5 == 0x00:   # amoadd.w
+                    result = value + b
+                elif funct5 == 0x01: # amoswap.w
+                    result = b
+                elif funct5 == 0x04: # amoxor.w
+                    result = value ^ b
+                elif funct5 == 0x08: # amoor.w
+                    result = value | b
+                elif funct5 == 0x0C: # amoand.w
+                    result = value & b
+                else:
+                    return pc, executed, EXIT_FALLBACK
+                _store(memory, dirty, aoffset, 4, result)
+        elif opcode == 0b0001111: # FENCE
+            write = False
+        else:
+            # SYSTEM (CSR access) and anything unknown
+            return pc, executed, EXIT_FALLBACK
+
+        if write and rd != 0:
+            regs[rd] = value & MASK
+        pc = next_pc & MASK
+        executed += 1
+    return pc, executed, EXIT_BUDGET
+
+class JITCore:
+    """Numba-compiled backend for CPU.run.
+
+    Works on a uint32 view of cpu.integer_registers and executes directly out
+    of the flat RAM array (RAM_BYTEARRAY, or RAM_BUFFER without a copy).
+    Control returns to Python after the budget runs out, or at an instruction
+    the core leaves to the interpreter: MMIO, CSR ops, division and anything
+    unsupported."""
+    def __init__(self, cpu):
+        self.cpu = cpu
+        for start, end, device in cpu.memory.devices:
+            if hasattr(device, "ram"):                  # RAM_BYTEARRAY
+                self.base = start
+                self.device = device
+                self.memory = device.ram.memory
+                break
+            if isinstance(getattr(device, "memory", None), bytearray): # RAM_BUFFER
+                self.base = start
+                self.device = device
+                self.memory = numpy.frombuffer(device.memory, dtype=numpy.uint8)
+                break
+        else:
+            raise ValueError("JIT backend needs a RAM_BYTEARRAY or RAM_BUFFER on the address bus")
+        self.regs = numpy.frombuffer(cpu.integer_registers, dtype=numpy.uint32) # shared, no copies per run
+        self.dirty = numpy.zeros((len(self.memory) >> PAGE_SHIFT) + 1, dtype=numpy.uint8)
+        self.state = numpy.full(1, -1, dtype=numpy.int64)
+        self.expansion = numpy.frombuffer(expansion_table(), dtype=numpy.uint32)
+
+    def run(self, budget: int, breakpoints=NO_BREAKPOINTS):
+        cpu = self.cpu
+        self.state[0] = cpu.reserved
+        pc, executed, reason = execute(self.regs, self.memory, self.base, cpu.registers["pc"],
+                                       budget, self.dirty, self.state, breakpoints, self.expansion)
+        cpu.reserved = int(self.state[0])
+        cpu.registers["pc"] = int(pc)
+
+        # stores done by the core bypassed AddressBus.write and the RAM's page
+        # tracking, catch up on both now
+        pages = numpy.flatnonzero(self.dirty)
+        if len(pages):
+            for page in pages.tolist():
+                self.device.written(page << PAGE_SHIFT, 1 << PAGE_SHIFT)
+                for listener in cpu.memory.write_listeners:
+                    listener(self.base + (page << PAGE_SHIFT), 1 << PAGE_SHIFT)
+            self.dirty[pages] = 0
+        return int(executed), int(reason)
@@ -0,0 +1,128 @@
+from array import array
+
+# RV32C: every 16-bit encoding expands to the 32-bit instruction it stands
+# for, so the rest of the CPU only ever sees RV32IMA. The expansion table is
+# indexed by the raw halfword and holds 0 for reserved, illegal and floating
+# point encodings (0 is not a valid 32-bit instruction either).
+
+def _r(opcode, rd, funct3, rs1, rs2, funct7):
+    return (funct7 << 25) | (rs2 << 20) | (rs1 << 15) | (funct3 << 12) | (rd << 7) | opcode
+
+def _i(opcode, rd, funct3, rs1, imm):
+    return ((imm & 0xFFF) << 20) | (rs1 << 15) | (funct3 << 12) | (rd << 7) | opcode
+
+def _s(opcode, funct3, rs1, rs2, imm):
+    return (((imm >> 5) & 0x7F) << 25) | (rs2 << 20) | (rs1 << 15) | (funct3 << 12) | ((imm & 0x1F) << 7) | opcode
+
+def _b(funct3, rs1, rs2, imm):
+    return (((imm >> 12) & 0x1) << 31) | (((imm >> 5) & 0x3F) << 25) | (rs2 << 20) | (rs1 << 15) \
+        | (funct3 << 12) | (((imm >> 1) & 0xF) << 8) | (((imm >> 11) & 0x1) << 7) | 0b1100011
+
+def _j(rd, imm):
+    return (((imm >> 20) & 0x1) << 31) | (((imm >> 1) & 0x3FF) << 21) | (((imm >> 11) & 0x1) << 20) \
+        | (((imm >> 12) & 0xFF) << 12) | (rd << 7) | 0b1101111
+
+OP_IMM = 0b0010011
+OP     = 0b0110011
+LOAD   = 0b0000011
+STORE  = 0b0100011
+LUI    = 0b0110111
+JALR   = 0b1100111
+EBREAK = 0x00100073
+
+def _bit(value, position):
+    return (value >> position) & 1
+
+def _bits(value, high, low):
+    return (value >> low) & ((1 << (high - low + 1)) - 1)
+
+def _signed(value, bits):
+    sign = 1 << (bits - 1)
+    return (value ^ sign) - sign
+
+def _imm6(half):
+    return _signed((_bit(half, 12) << 5) | _bits(half, 6, 2), 6)
+
+def _jump_offset(half):
+    return _signed((_bit(half, 12) << 11) | (_bit(half, 11) << 4) | (_bits(half, 10, 9) << 8)
+                   | (_bit(half, 8) << 10) | (_bit(half, 7) << 6) | (_bit(half, 6) << 7)
+                   | (_bits(half, 5, 3) << 1) | (_bit(half, 2) << 5), 12)
+
+def _branch_offset(half):
+    return _signed((_bit(half, 12) << 8) | (_bits(half, 11, 10) << 3) | (_bits(half, 6, 5) << 6)
+                   | (_bits(half, 4, 3) << 1) | (_bit(half, 2) << 5), 9)
+
+def expand(half: int) -> int:
+    """The 32-bit equivalent of a compressed instruction, 0 if there is none."""
+    quadrant, funct3 = half & 0b11, half >> 13
+    rd = _bits(half, 11, 7)            # full register fields
+    rs2 = _bits(half, 6, 2)
+    rd_ = _bits(half, 4, 2) + 8        # x8-x15 register fields
+    rs1_ = _bits(half, 9, 7) + 8
+    if quadrant == 0:
+        if funct3 == 0: # c.addi4spn
+            imm = (_bits(half, 12, 11) << 4) | (_bits(half, 10, 7) << 6) | (_bit(half, 6) << 2) | (_bit(half, 5) << 3)
+            return _i(OP_IMM, rd_, 0, 2, imm) if imm else 0
+        offset = (_bits(half, 12, 10) << 3) | (_bit(half, 6) << 2) | (_bit(half, 5) << 6)
+        if funct3 == 2: # c.lw
+            return _i(LOAD, rd_, 2, rs1_, offset)
+        if funct3 == 6: # c.sw
+            return _s(STORE, 2, rs1_, rd_, offset)
+        return 0        # c.fld, c.flw, c.fsd, c.fsw and reserved
+    if quadrant == 1:
+        if funct3 == 0: # c.addi, c.nop
+            return _i(OP_IMM, rd, 0, rd, _imm6(half))
+        if funct3 == 1: # c.jal
+            return _j(1, _jump_offset(half))
+        if funct3 == 2: # c.li
+            return _i(OP_IMM, rd, 0, 0, _imm6(half))
+        if funct3 == 3:
+            if rd == 2: # c.addi16sp
+                imm = _signed((_bit(half, 12) << 9) | (_bit(half, 6) << 4) | (_bit(half, 5) << 6)
+                              | (_bits(half, 4, 3) << 7) | (_bit(half, 2) << 5), 10)
+                return _i(OP_IMM, 2, 0, 2, imm) if imm else 0
+            imm = _imm6(half) # c.lui
+            return ((imm << 12) & 0xFFFFF000) | (rd << 7) | LUI if imm else 0
+        if funct3 == 4:
+            funct2 = _bits(half, 11, 10)
+            if funct2 == 0 or funct2 == 1: # c.srli, c.srai
+                if _bit(half, 12): return 0 # shamt[5] is reserved on RV32
+                return _i(OP_IMM, rs1_, 5, rs1_, (funct2 << 10) | rs2)
+            if funct2 == 2: # c.andi
+                return _i(OP_IMM, rs1_, 7, rs1_, _imm6(half))
+            if _bit(half, 12): return 0 # c.subw, c.addw are RV64
+            funct3, funct7 = ((0, 0x20), (4, 0x00), (6, 0x00), (7, 0x00))[_bits(half, 6, 5)] # c.sub, c.xor, c.or, c.and
+            return _r(OP, rs1_, funct3, rs1_, rd_, funct7)
+        if funct3 == 5: # c.j
+            return _j(0, _jump_offset(half))
+        # c.beqz, c.bnez
+        return _b(funct3 - 6, rs1_, 0, _branch_offset(half))
+    if quadrant == 2:
+        if funct3 == 0: # c.slli
+            if _bit(half, 12): return 0
+            return _i(OP_IMM, rd, 1, rd, rs2)
+        if funct3 == 2: # c.lwsp
+            if rd == 0: return 0
+            return _i(LOAD, rd, 2, 2, (_bit(half, 12) << 5) | (_bits(half, 6, 4) << 2) | (_bits(half, 3, 2) << 6))
+        if funct3 == 4:
+            if not _bit(half, 12):
+                if rs2 == 0: # c.jr
+                    return _i(JALR, 0, 0, rd, 0) if rd else 0
+                return _r(OP, rd, 0, 0, rs2, 0) # c.mv
+            if rs2 == 0:
+                if rd == 0: return EBREAK # c.ebreak
+                return _i(JALR, 1, 0, rd, 0) # c.jalr
+            return _r(OP, rd, 0, rd, rs2, 0) # c.add
+        if funct3 == 6: # c.swsp
+            return _s(STORE, 2, 2, rs2, (_bits(half, 12, 9) << 2) | (_bits(half, 8, 7) << 6))
+        return 0        # c.fldsp, c.flwsp, c.fsdsp, c.fswsp
+    return 0            # not a compressed instruction
+
+_expansion = None
+
+def expansion_table() -> array:
+    """All 64K expansions, built on first use (takes about half a second)."""
+    global _expansion
+    if _expansion is None:
+        _expansion = array('I', map(expand, range(1 << 16)))
+    return _expansion
@@ -0,0 +1,292 @@
+from .decode_cache import PAGE_SHIFT
+
+MAX_BLOCK_LENGTH = 64
+
+LOAD   = 0b0000011
+STORE  = 0b0100011
+AMO    = 0b0101111
+SYSTEM = 0b1110011
+
+EXACT_INSTRET = (LOAD, STORE, AMO, SYSTEM) # cpu.instret is brought up to date before these
+MAY_SCHEDULE = (STORE, AMO, SYSTEM) # these may schedule an event for right then, the block checks after them
+
+MASK = 0xFFFFFFFF
+SIGN = 0x80000000
+
+def signed(expression):
+    return f"(({expression} ^ {SIGN:#x}) - {SIGN:#x})"
+
+class BlockTranslator:
+    """Translates guest basic blocks into specialized Python functions.
+
+    A block starts at any PC and runs until (and including) the first branch,
+    JAL or JALR, or until (and excluding) the first instruction the translator
+    does not know, such as division, ECALL or MRET. Register numbers and
+    immediates are inlined as constants. Every block is compiled into
+
+        def block(cpu, regs, memory): ... return next_pc
+
+    and cached by entry PC. Blocks advance cpu.instret themselves: before
+    every load, store, atomic and CSR op it is exact, as devices may look at
+    it (CLINT mtime), and after a store, atomic or CSR write that scheduled
+    an event for right then (an interrupt check) the block returns early.
+    Instructions the translator gives up on are left to the interpreter, so a
+    PC that cannot start a block maps to None.
+
+    Blocks end before breakpoints registered on cpu.hooks. Translated blocks
+    do not log per instruction and a fault inside a block leaves PC at the
+    entry of the block."""
+    def __init__(self, cpu):
+        self.cpu = cpu
+        self.blocks = {} # entry pc -> (function, length) or None
+        self.pages = {}  # page -> entry pcs of blocks covering that page
+
+    def lookup(self, pc: int):
+        block = self.blocks.get(pc, False)
+        if block is False:
+            block = self.blocks[pc] = self.translate(pc)
+        return block
+
+    def invalidate(self, address: int, length: int) -> None:
+        if not self.pages or length <= 0: return
+        for page in range(address >> PAGE_SHIFT, ((address + length - 1) >> PAGE_SHIFT) + 1):
+            entries = self.pages.pop(page, None)
+            if entries is None: continue
+            for entry in entries:
+                self.blocks.pop(entry, None)
+
+    def clear(self) -> None:
+        self.blocks.clear()
+        self.pages.clear()
+
+    def translate(self, pc: int):
+        lines = []
+        length = 0
+        address = pc
+        terminated = False
+        retired = 0 # instructions already added to cpu.instret
+        breakpoints = self.cpu.hooks.breakpoints
+        while length < MAX_BLOCK_LENGTH:
+            if length and address in breakpoints: break
+            try:
+                op = self.cpu.decode(address)
+            except (NotImplementedError, ValueError, MemoryError):
+                break
+            emitted = self.emit(op, address)
+            if emitted is None: break
+            code, terminated = emitted
+            opcode = op.spec.opcode
+            if terminated:
+                lines += retire(length + 1 - retired)
+            elif opcode in EXACT_INSTRET:
+                lines += retire(length - retired)
+                retired = length
+            lines.extend(code)
+            length += 1
+            address += op.length
+            if terminated: break
+            if opcode in MAY_SCHEDULE:
+                lines.append(f"if cpu.instret + 1 >= cpu.hooks.next_event: cpu.instret += 1; return {address & MASK:#x}")
+        if length == 0:
+            return None
+        if not terminated:
+            lines += retire(length - retired)
+            lines.append(f"return {address & MASK:#x}")
+
+        source = "def block(cpu, regs, memory):\n" + "".join(f"    {line}\n" for line in lines)
+        namespace = {}
+        exec(compile(source, f"<block {pc:08x}>", "exec"), namespace)
+        function = namespace["block"]
+        function.source = source
+
+        for page in range(pc >> PAGE_SHIFT, ((address - 1) >> PAGE_SHIFT) + 1):
+            self.pages.setdefault(page, []).append(pc)
+            self.cpu.memory.mark_executed(page << PAGE_SHIFT)
+        return function, length
+
+    def emit(self, op, pc: int):
+        """Returns (lines, terminates_block) for one instruction, or None if it
+        has to be left to the interpreter."""
+        opcode = op.spec.opcode
+        emitter = EMITTERS.get(opcode)
+        if emitter is None: return None
+        return emitter(op, pc)
+
+def retire(count):
+    if count == 0: return []
+    return [f"cpu.instret += {count}"]
+
+def assign(rd, expression):
+    if rd == 0: return []
+    return [f"regs[{rd}] = {expression}"]
+
+def emit_LUI(op, pc):
+    return assign(op.rd, f"{op.imm:#x}"), False
+
+def emit_AUIPC(op, pc):
+    return assign(op.rd, f"{(pc + op.imm) & MASK:#x}"), False
+
+def emit_FENCE(op, pc):
+    return [], False
+
+def emit_ANY_INTGR_I(op, pc):
+    rd, rs1, imm, ist = op.rd, op.rs1, op.imm, op.funct3
+    source = f"regs[{rs1}]"
+    if ist == 0: # addi
+        return assign(rd, f"({source} + {imm}) & {MASK:#x}"), False
+    if ist == 1: # slli
+        return assign(rd, f"({source} << {imm & 0x1F}) & {MASK:#x}"), False
+    if ist == 2: # slti
+        return assign(rd, f"1 if {signed(source)} < {imm} else 0"), False
+    if ist == 3: # sltiu
+        return assign(rd, f"1 if {source} < {imm & MASK:#x} else 0"), False
+    if ist == 4: # xori
+        return assign(rd, f"{source} ^ {imm & MASK:#x}"), False
+    if ist == 5:
+        if imm >> 5 == 0x00: # srli
+            return assign(rd, f"{source} >> {imm & 0x1F}"), False
+        if imm >> 5 == 0x20: # srai
+            return assign(rd, f"({signed(source)} >> {imm & 0x1F}) & {MASK:#x}"), False
+        return None
+    if ist == 6: # ori
+        return assign(rd, f"{source} | {imm & MASK:#x}"), False
+    if ist == 7: # andi
+        return assign(rd, f"{source} & {imm & MASK:#x}"), False
+    return None
+
+def emit_ANY_INTGR(op, pc):
+    rd, ist1, ist2 = op.rd, op.funct3, op.funct7
+    a, b = f"regs[{op.rs1}]", f"regs[{op.rs2}]"
+    if ist2 == 0x00:
+        expression = {
+            0: f"({a} + {b}) & {MASK:#x}",                     # add
+            1: f"({a} << ({b} & 0x1F)) & {MASK:#x}",           # sll
+            2: f"1 if {signed(a)} < {signed(b)} else 0",       # slt
+            3: f"1 if {a} < {b} else 0",                       # sltu
+            4: f"{a} ^ {b}",                                   # xor
+            5: f"{a} >> ({b} & 0x1F)",                         # srl
+            6: f"{a} | {b}",                                   # or
+            7: f"{a} & {b}",                                   # and
+        }[ist1]
+        return assign(rd, expression), False
+    if ist2 == 0x01:
+        # division and remainder stay with the interpreter
+        if ist1 == 0: # mul
+            return assign(rd, f"({a} * {b}) & {MASK:#x}"), False
+        if ist1 == 1: # mulh
+            return assign(rd, f"(({signed(a)} * {signed(b)}) >> 32) & {MASK:#x}"), False
+        if ist1 == 3: # mulhu
+            return assign(rd, f"({a} * {b}) >> 32"), False
+        return None
+    if ist2 == 0x20:
+        if ist1 == 0: # sub
+            return assign(rd, f"({a} - {b}) & {MASK:#x}"), False
+        if ist1 == 5: # sra
+            return assign(rd, f"({signed(a)} >> ({b} & 0x1F)) & {MASK:#x}"), False
+    return None
+
+def emit_LOAD(op, pc):
+    rd, ist = op.rd, op.funct3
+    widths = {0: 8, 1: 16, 2: 32, 4: 8, 5: 16}
+    if ist not in widths: return None
+    lines = [f"value = memory.read_u{widths[ist]}((regs[{op.rs1}] + {op.imm}) & {MASK:#x})"]
+    if ist == 0: # lb
+        lines += assign(rd, "value | 0xFFFFFF00 if value & 0x80 else value")
+    elif ist == 1: # lh
+        lines += assign(rd, "value | 0xFFFF0000 if value & 0x8000 else value")
+    else: # lw, lbu, lhu
+        lines += assign(rd, "value")
+    return lines, False
+
+def emit_STORE(op, pc):
+    widths = {0: 8, 1: 16, 2: 32}
+    if op.funct3 not in widths: return None
+    width = widths[op.funct3]
+    return [f"memory.write_u{width}((regs[{op.rs1}] + {op.imm}) & {MASK:#x}, regs[{op.rs2}] & {(1 << width) - 1:#x})"], False
+
+def emit_BRANCH(op, pc):
+    a, b = f"regs[{op.rs1}]", f"regs[{op.rs2}]"
+    conditions = {
+        0: f"{a} == {b}",                  # beq
+        1: f"{a} != {b}",                  # bne
+        4: f"{signed(a)} < {signed(b)}",   # blt
+        5: f"{signed(a)} >= {signed(b)}",  # bge
+        6: f"{a} < {b}",                   # bltu
+        7: f"{a} >= {b}",                  # bgeu
+    }
+    if op.funct3 not in conditions: return None
+    return [
+        f"if {conditions[op.funct3]}:",
+        f"    return {(pc + op.imm) & MASK:#x}",
+        f"return {(pc + op.length) & MASK:#x}",
+    ], True
+
+def emit_JAL(op, pc):
+    return assign(op.rd, f"{(pc + op.length) & MASK:#x}") + [f"return {(pc + op.imm) & MASK:#x}"], True
+
+def emit_JALR(op, pc):
+    return [f"target = (regs[{op.rs1}] + {op.imm}) & {MASK:#x}"] \
+        + assign(op.rd, f"{(pc + op.length) & MASK:#x}") + ["return target"], True
+
+# A extension, in the interpreter's order: rs1 and rs2 are read before rd is written.
+AMO_OPERATIONS = {
+    "amoadd.w":  f"(value + regs[{{rs2}}]) & {MASK:#x}",
+    "amoswap.w": "regs[{rs2}]",
+    "amoxor.w":  "value ^ regs[{rs2}]",
+    "amoor.w":   "value | regs[{rs2}]",
+    "amoand.w":  "value & regs[{rs2}]",
+}
+
+def emit_AMO(op, pc):
+    mnemonic = op.spec.mnemonic
+    lines = [f"address = regs[{op.rs1}]"]
+    if mnemonic == "lr.w":
+        lines.append("value = memory.read_u32(address)")
+        return lines + assign(op.rd, "value") + ["cpu.reserved = address"], False
+    if mnemonic == "sc.w":
+        lines += [
+            "stored = cpu.reserved == address",
+            f"if stored: memory.write_u32(address, regs[{op.rs2}])",
+            "cpu.reserved = -1",
+        ]
+        return lines + assign(op.rd, "0 if stored else 1"), False
+    operation = AMO_OPERATIONS.get(mnemonic)
+    if operation is None: return None
+    lines += [
+        "value = memory.read_u32(address)",
+        f"memory.write_u32(address, {operation.format(rs2=op.rs2)})",
+    ]
+    return lines + assign(op.rd, "value"), False
+
+# CSR ops never trap or jump; a write that changes interrupt state schedules
+# an interrupt check, which the block returns for (see MAY_SCHEDULE).
+CSR_OPERATIONS = {
+    1: "{source}",                # csrrw, csrrwi
+    2: "value | {source}",        # csrrs, csrrsi
+    3: "value & ~{source}",       # csrrc, csrrci
+}
+
+def emit_SYSTEM(op, pc):
+    operation = CSR_OPERATIONS.get(op.funct3 & 0b011)
+    if operation is None: return None # ECALL, EBREAK, MRET, WFI
+    source = str(op.rs1) if op.funct3 & 0b100 else f"regs[{op.rs1}]"
+    csr = op.imm & 0xFFF
+    return [
+        f"value = cpu.csr_read({csr:#x})",
+        f"cpu.csr_write({csr:#x}, {operation.format(source=source)})",
+    ] + assign(op.rd, "value"), False
+
+EMITTERS = {
+    0b0110111: emit_LUI,
+    0b0010111: emit_AUIPC,
+    0b0001111: emit_FENCE,
+    0b0010011: emit_ANY_INTGR_I,
+    0b0110011: emit_ANY_INTGR,
+    0b0000011: emit_LOAD,
+    0b0100011: emit_STORE,
+    0b1100011: emit_BRANCH,
+    0b1101111: emit_JAL,
+    0b1100111: emit_JALR,
+    AMO:       emit_AMO,
+    SYSTEM:    emit_SYSTEM,
+}
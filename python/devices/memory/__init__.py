@@ -1,2 +1,2 @@
-from .ram import RAM_DICT, RAM_BYTEARRAY
+from .ram import RAM_DICT, RAM_BYTEARRAY, RAM_BUFFER, RAM_PAGE_SIZE
 from .address_bus import AddressBus
@@ -1,35 +1,207 @@
+PAGE_SHIFT = 12
+PAGE_COUNT = 1 << (32 - PAGE_SHIFT)
+
 class AddressBus:
+    """Routes physical addresses to devices.
+
+    Every 4 KiB page of the 32-bit address space has an entry in self.pages
+    holding the devices that map part of it, as (start, end, device,
+    has_word_access) tuples. Almost always that is a single device, so routing
+    an access costs one list index no matter how many devices are attached.
+    Ranges are inclusive on both ends."""
     def __init__(self, devices: list):
-        self.devices = devices
+        self.devices = []
+        self.pages = [()] * PAGE_COUNT
+        self.write_listeners = [] # called as listener(address, length) before every write
+        self.code_listeners = []  # called as listener(address, length) when RAM marked executed is written
+        self.images = [] # (address, image) placed with map_image, the machine's initial memory
+        for start, end, device in devices:
+            self.add_device(start, end, device)
 
-    def read_single(self, address: int) -> int:
-        for start, end, device in self.devices:
-            if address < start or address > end: continue
-            return device.read(address - start, 1)[0] & 0xFF
+    def add_device(self, start: int, end: int, device) -> None:
+        if start < 0 or end >= 1 << 32 or start > end:
+            raise ValueError(f"Invalid device range {start:08x}-{end:08x}")
+        for other_start, other_end, other in self.devices:
+            if start <= other_end and other_start <= end:
+                raise ValueError(f"Device range {start:08x}-{end:08x} overlaps {other_start:08x}-{other_end:08x} ({type(other).__name__})")
+        self.devices.append([start, end, device])
+        if hasattr(device, "executed"): # RAM with page tracking
+            device.on_code_write = lambda offset, length: self._code_written(start + offset, length)
+        entry = (start, end, device, hasattr(device, "read_u32"))
+        single = (entry,)
+        for page in range(start >> PAGE_SHIFT, (end >> PAGE_SHIFT) + 1):
+            self.pages[page] = self.pages[page] + single if self.pages[page] else single
+
+    def device_map(self) -> list:
+        """[start, end, device class name] per device, for telling whether saved
+        state fits this bus."""
+        return [[start, end, type(device).__name__] for start, end, device in self.devices]
+
+    def find(self, address: int) -> tuple:
+        for entry in self.pages[address >> PAGE_SHIFT]:
+            if entry[0] <= address <= entry[1]: return entry
         raise ValueError(f"Address {address:08x} out of bounds")
+
+    def read_single(self, address: int) -> int:
+        start, end, device, _ = self.find(address)
+        return device.read(address - start, 1)[0] & 0xFF
     def write_single(self, address: int, data: int) -> None:
-        for start, end, device in self.devices:
-            if address < start or address > end: continue
-            return device.write(address - start, bytearray([data & 0xFF]))
-        raise ValueError(f"Address {address:08x} out of bounds")
+        start, end, device, _ = self.find(address)
+        return device.write(address - start, bytearray([data & 0xFF]))
 
     def read(self, address: int, amount: int) -> bytes:
-        if amount < 512:
-            data = []
-            for i in range(amount):
-                data.append(self.read_single(address+i))
-            return bytes(data)
-
-        for start, end, device in self.devices:
-            if address < start or address > end: continue
-            return device.read(address-start, amount)
+        start, end, device, _ = self.find(address)
+        if address + amount - 1 <= end:
+            return device.read(address - start, amount)
+        # spans several devices
+        data = bytearray()
+        while amount > 0:
+            start, end, device, _ = self.find(address)
+            chunk = min(amount, end - address + 1)
+            data += device.read(address - start, chunk)
+            address += chunk
+            amount -= chunk
+        return bytes(data)
 
     def write(self, address: int, data: bytes) -> None:
-        if len(data) < 512:
-            for i,b in enumerate(data):
-                self.write_single(address+i, b)
-            return
+        for listener in self.write_listeners:
+            listener(address, len(data))
+        self._write(address, data)
+
+    def _write(self, address: int, data: bytes) -> None:
+        start, end, device, _ = self.find(address)
+        if address + len(data) - 1 <= end:
+            return device.write(address - start, data)
+        # spans several devices
+        data = memoryview(data)
+        while len(data):
+            start, end, device, _ = self.find(address)
+            chunk = min(len(data), end - address + 1)
+            device.write(address - start, data[:chunk])
+            address += chunk
+            data = data[chunk:]
+
+    # Bulk transfers, for loaders and DMA-style devices. They take any buffer
+    # and hand every device it spans one slice of it; RAM copies a slice with
+    # a single memcpy/memset, MMIO devices get their plain write().
+    def load_bytes(self, address: int, data) -> None:
+        """Copies a buffer (bytes, bytearray, mmap, numpy array, ...) into
+        memory at address, without intermediate copies."""
+        data = memoryview(data).cast("B")
+        if len(data): self.write(address, data)
+
+    def copy_within(self, to_address: int, from_address: int, length: int) -> None:
+        """Copies length bytes of guest memory, overlapping ranges included
+        (memmove). Within one RAM device the copy never leaves its buffer."""
+        if length <= 0: return
+        for listener in self.write_listeners:
+            listener(to_address, length)
+        start, end, device, _ = self.find(from_address)
+        if (hasattr(device, "copy_within") and from_address + length - 1 <= end
+                and start <= to_address and to_address + length - 1 <= end):
+            return device.copy_within(to_address - start, from_address - start, length)
+        self._write(to_address, self.read(from_address, length)) # read all first, the ranges may overlap
+
+    def fill(self, address: int, value: int, length: int) -> None:
+        """Sets length bytes at address to value (memset)."""
+        if length <= 0: return
+        for listener in self.write_listeners:
+            listener(address, length)
+        while length > 0:
+            start, end, device, _ = self.find(address)
+            chunk = min(length, end - address + 1)
+            if hasattr(device, "fill"):
+                device.fill(address - start, value, chunk)
+            else:
+                device.write(address - start, bytes([value & 0xFF]) * chunk)
+            address += chunk
+            length -= chunk
+
+    def _code_written(self, address: int, length: int) -> None:
+        for listener in self.code_listeners:
+            listener(address, length)
+
+    def mark_executed(self, address: int) -> None:
+        """Notes that a code cache holds instructions from the page of address,
+        so the code_listeners hear about writes to it. Code outside of RAM is
+        not watched."""
+        for start, end, device, fast in self.pages[address >> PAGE_SHIFT]:
+            if start <= address <= end:
+                if hasattr(device, "mark_executed"): device.mark_executed(address - start)
+                return
+
+    def map_image(self, address: int, image) -> None:
+        """Places a read-only buffer, such as an mmap of an image file, into
+        memory. RAM that supports it shares pages with the buffer until they
+        are written to, so large images load without being copied."""
+        self.images.append((address, image))
+        start, end, device, _ = self.find(address)
+        if address + len(image) - 1 > end or not hasattr(device, "map_image"):
+            return self.load_bytes(address, image)
+        for listener in self.write_listeners:
+            listener(address, len(image))
+        return device.map_image(address - start, image)
+
+    def reload_images(self) -> None:
+        """Brings RAM back to how it was right after loading: zeroes plus the
+        images placed with map_image, which are still held here, so no file
+        is read again."""
         for start, end, device in self.devices:
-            if address < start or address > end: continue
-            return device.write(address-start, data)
+            if not hasattr(device, "map_image"): continue # only RAM
+            for listener in self.write_listeners:
+                listener(start, end - start + 1)
+            device.clear()
+        images, self.images = self.images, []
+        for address, image in images:
+            self.map_image(address, image)
+
+    # Word-sized accesses, used by the CPU for every guest load, store and fetch.
+    # They assume the access does not cross into another device. Devices without
+    # read_uN/write_uN fall back to their plain read/write.
+    def read_u8(self, address: int) -> int:
+        for start, end, device, fast in self.pages[address >> PAGE_SHIFT]:
+            if start <= address <= end:
+                if fast: return device.read_u8(address - start)
+                return device.read(address - start, 1)[0]
+        raise ValueError(f"Address {address:08x} out of bounds")
+
+    def read_u16(self, address: int) -> int:
+        for start, end, device, fast in self.pages[address >> PAGE_SHIFT]:
+            if start <= address <= end:
+                if fast: return device.read_u16(address - start)
+                return int.from_bytes(device.read(address - start, 2), 'little')
+        raise ValueError(f"Address {address:08x} out of bounds")
+
+    def read_u32(self, address: int) -> int:
+        for start, end, device, fast in self.pages[address >> PAGE_SHIFT]:
+            if start <= address <= end:
+                if fast: return device.read_u32(address - start)
+                return int.from_bytes(device.read(address - start, 4), 'little')
+        raise ValueError(f"Address {address:08x} out of bounds")
+
+    def write_u8(self, address: int, value: int) -> None:
+        for listener in self.write_listeners:
+            listener(address, 1)
+        for start, end, device, fast in self.pages[address >> PAGE_SHIFT]:
+            if start <= address <= end:
+                if fast: return device.write_u8(address - start, value)
+                return device.write(address - start, value.to_bytes(1, 'little'))
+        raise ValueError(f"Address {address:08x} out of bounds")
+
+    def write_u16(self, address: int, value: int) -> None:
+        for listener in self.write_listeners:
+            listener(address, 2)
+        for start, end, device, fast in self.pages[address >> PAGE_SHIFT]:
+            if start <= address <= end:
+                if fast: return device.write_u16(address - start, value)
+                return device.write(address - start, value.to_bytes(2, 'little'))
+        raise ValueError(f"Address {address:08x} out of bounds")
+
+    def write_u32(self, address: int, value: int) -> None:
+        for listener in self.write_listeners:
+            listener(address, 4)
+        for start, end, device, fast in self.pages[address >> PAGE_SHIFT]:
+            if start <= address <= end:
+                if fast: return device.write_u32(address - start, value)
+                return device.write(address - start, value.to_bytes(4, 'little'))
         raise ValueError(f"Address {address:08x} out of bounds")
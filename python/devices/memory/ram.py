@@ -1,18 +1,250 @@
+import struct
 from numba.experimental import jitclass
 from numba import types
 from numba import jit
 import numpy
 
-class RAM_DICT:
-    def __init__(self):
-        self.memory = {}
-        self.logger = logger
+_u16 = struct.Struct("<H")
+_u32 = struct.Struct("<I")
 
-    def read(self, from_addr: int) -> bytes:
-        raise NotImplementedError("TODO: implement!")
+RAM_PAGE_SHIFT = 12
+RAM_PAGE_SIZE  = 1 << RAM_PAGE_SHIFT
+RAM_PAGE_MASK  = RAM_PAGE_SIZE - 1
 
-    def write(self, to_addr: int, data: bytearray):
-        raise NotImplementedError("TODO: implement!")
+_ZERO_PAGE = memoryview(bytes(RAM_PAGE_SIZE))
+
+class PageTracking:
+    """Dirty and executed page bitmaps shared by the RAM types, one byte per
+    page.
+
+    dirty marks pages written (by any write path, map_image included) since
+    the last clear_dirty(). Pages it drops are remembered in touched, so
+    touched_pages() still lists everything written since clear(), which is
+    what snapshots and crash dumps need: every other page is all zeroes.
+
+    executed marks pages the CPU's code caches hold instructions of. A write
+    into such a page clears its bit and calls on_code_write(offset, length),
+    which the AddressBus routes to its code_listeners; writes to data pages
+    cost a byte store and a test."""
+    def _init_tracking(self, size: int) -> None:
+        pages = (size + RAM_PAGE_MASK) >> RAM_PAGE_SHIFT
+        self.dirty = bytearray(pages)
+        self.touched = bytearray(pages)
+        self.executed = bytearray(pages)
+        self.on_code_write = None
+
+    def written(self, offset: int, length: int) -> None:
+        """Bookkeeping for a write of length bytes at offset; writers that
+        bypass the RAM's own methods (the numba core) call it themselves."""
+        if length <= 0: return
+        first, end = offset >> RAM_PAGE_SHIFT, ((offset + length - 1) >> RAM_PAGE_SHIFT) + 1
+        self.dirty[first:end] = b"\1" * (end - first)
+        if self.executed.find(1, first, end) != -1:
+            self._code_written(first, end)
+
+    def _code_written(self, first: int, end: int) -> None:
+        self.executed[first:end] = bytes(end - first)
+        if self.on_code_write is not None:
+            self.on_code_write(first << RAM_PAGE_SHIFT, (end - first) << RAM_PAGE_SHIFT)
+
+    def _reset_tracking(self) -> None:
+        if self.executed.find(1) != -1:
+            self._code_written(0, len(self.executed))
+        self.dirty[:] = self.touched[:] = bytes(len(self.dirty))
+
+    def is_dirty(self, offset: int) -> bool:
+        return bool(self.dirty[offset >> RAM_PAGE_SHIFT])
+
+    def dirty_pages(self):
+        """Yields the offset of every dirty page, in address order."""
+        return _set_pages(self.dirty)
+
+    def dirty_ranges(self):
+        """Yields (offset, length) for every run of dirty pages."""
+        dirty = self.dirty
+        page = dirty.find(1)
+        while page != -1:
+            end = dirty.find(0, page)
+            if end == -1: end = len(dirty)
+            yield page << RAM_PAGE_SHIFT, (end - page) << RAM_PAGE_SHIFT
+            page = dirty.find(1, end)
+
+    def clear_dirty(self) -> None:
+        touched = numpy.frombuffer(self.touched, dtype=numpy.uint8)
+        touched |= numpy.frombuffer(self.dirty, dtype=numpy.uint8)
+        self.dirty[:] = bytes(len(self.dirty))
+
+    def touched_pages(self):
+        """Yields the offset of every page written since clear(), in address order."""
+        touched = numpy.frombuffer(self.touched, dtype=numpy.uint8) | numpy.frombuffer(self.dirty, dtype=numpy.uint8)
+        for page in numpy.flatnonzero(touched).tolist():
+            yield page << RAM_PAGE_SHIFT
+
+    def mark_executed(self, offset: int) -> None:
+        self.executed[offset >> RAM_PAGE_SHIFT] = 1
+
+    def is_executed(self, offset: int) -> bool:
+        return bool(self.executed[offset >> RAM_PAGE_SHIFT])
+
+    def executed_pages(self):
+        return _set_pages(self.executed)
+
+    def clear_executed(self) -> None:
+        """Forgets all code pages, the code caches are told to drop them."""
+        if self.executed.find(1) != -1:
+            self._code_written(0, len(self.executed))
+
+def _set_pages(bitmap):
+    page = bitmap.find(1)
+    while page != -1:
+        yield page << RAM_PAGE_SHIFT
+        page = bitmap.find(1, page + 1)
+
+# Sparse RAM: a dict of 4 KiB pages, allocated on the first write that puts
+# something other than zeroes into them. Unmapped pages read as zero, so a big
+# guest RAM costs only the memory that is actually touched.
+# Pages can also be read-only memoryviews into an image mapped by map_image;
+# those are copied into a private bytearray on their first write.
+class RAM_DICT(PageTracking):
+    def __init__(self, size: int):
+        self.size = size
+        self.memory = {} # page number -> bytearray(RAM_PAGE_SIZE) or read-only memoryview
+        self._init_tracking(size)
+
+    def clear(self):
+        self.memory.clear()
+        self._reset_tracking()
+
+    def pages(self):
+        """Yields (offset, page) for every page that can hold something other
+        than zeroes, in address order. Pages are views of the backing store."""
+        for number in sorted(self.memory):
+            yield number << RAM_PAGE_SHIFT, memoryview(self.memory[number])
+
+    def page(self, number: int) -> bytearray:
+        page = self.memory.get(number)
+        if page is None:
+            page = self.memory[number] = bytearray(RAM_PAGE_SIZE)
+        elif type(page) is memoryview:
+            page = self.memory[number] = bytearray(page)
+        return page
+
+    def map_image(self, to_addr: int, image):
+        if to_addr < 0 or to_addr + len(image) > self.size:
+            raise MemoryError("Invalid memory address or size")
+        if to_addr & RAM_PAGE_MASK:
+            return self.write(to_addr, image)
+        self.written(to_addr, len(image))
+        view = memoryview(image).cast("B").toreadonly()
+        whole = len(view) & ~RAM_PAGE_MASK
+        first = to_addr >> RAM_PAGE_SHIFT
+        for i in range(whole >> RAM_PAGE_SHIFT):
+            self.memory[first + i] = view[i << RAM_PAGE_SHIFT:(i + 1) << RAM_PAGE_SHIFT]
+        if whole < len(view):
+            self.write(to_addr + whole, view[whole:])
+
+    def read(self, from_addr: int, amount: int) -> bytes:
+        if from_addr < 0 or from_addr + amount > self.size:
+            raise MemoryError(f"Invalid memory address: {from_addr}")
+        data = bytearray(amount)
+        done = 0
+        while done < amount:
+            address = from_addr + done
+            offset = address & RAM_PAGE_MASK
+            chunk = min(amount - done, RAM_PAGE_SIZE - offset)
+            page = self.memory.get(address >> RAM_PAGE_SHIFT)
+            if page is not None:
+                data[done:done+chunk] = page[offset:offset+chunk]
+            done += chunk
+        return bytes(data)
+
+    def write(self, to_addr: int, data: bytes):
+        if to_addr < 0 or to_addr + len(data) > self.size:
+            raise MemoryError("Invalid memory address or size")
+        data = memoryview(data).cast("B")
+        self.written(to_addr, len(data))
+        done = 0
+        while done < len(data):
+            address = to_addr + done
+            offset = address & RAM_PAGE_MASK
+            chunk = min(len(data) - done, RAM_PAGE_SIZE - offset)
+            part = data[done:done+chunk]
+            number = address >> RAM_PAGE_SHIFT
+            if number in self.memory or part != _ZERO_PAGE[:chunk]:
+                self.page(number)[offset:offset+chunk] = part
+            done += chunk
+
+    def fill(self, to_addr: int, value: int, length: int):
+        if to_addr < 0 or to_addr + length > self.size:
+            raise MemoryError("Invalid memory address or size")
+        self.written(to_addr, length)
+        pattern = bytes([value & 0xFF]) * min(length, RAM_PAGE_SIZE)
+        done = 0
+        while done < length:
+            address = to_addr + done
+            offset = address & RAM_PAGE_MASK
+            chunk = min(length - done, RAM_PAGE_SIZE - offset)
+            number = address >> RAM_PAGE_SHIFT
+            if pattern[0] == 0 and chunk == RAM_PAGE_SIZE:
+                # kept rather than dropped: pages() must still list a page
+                # that an image may have held something else in
+                if number in self.memory: self.memory[number] = _ZERO_PAGE
+            elif number in self.memory or pattern[0]:
+                self.page(number)[offset:offset+chunk] = pattern[:chunk]
+            done += chunk
+
+    def copy_within(self, to_addr: int, from_addr: int, length: int):
+        # pages are separate buffers, go through a copy (which also makes overlap safe)
+        self.write(to_addr, self.read(from_addr, length))
+
+    def read_u8(self, from_addr: int) -> int:
+        if from_addr < 0 or from_addr >= self.size:
+            raise MemoryError(f"Invalid memory address: {from_addr}")
+        page = self.memory.get(from_addr >> RAM_PAGE_SHIFT)
+        if page is None: return 0
+        return page[from_addr & RAM_PAGE_MASK]
+
+    def read_u16(self, from_addr: int) -> int:
+        offset = from_addr & RAM_PAGE_MASK
+        if offset > RAM_PAGE_SIZE - 2 or from_addr < 0 or from_addr + 2 > self.size:
+            return int.from_bytes(self.read(from_addr, 2), 'little')
+        page = self.memory.get(from_addr >> RAM_PAGE_SHIFT)
+        if page is None: return 0
+        return _u16.unpack_from(page, offset)[0]
+
+    def read_u32(self, from_addr: int) -> int:
+        offset = from_addr & RAM_PAGE_MASK
+        if offset > RAM_PAGE_SIZE - 4 or from_addr < 0 or from_addr + 4 > self.size:
+            return int.from_bytes(self.read(from_addr, 4), 'little')
+        page = self.memory.get(from_addr >> RAM_PAGE_SHIFT)
+        if page is None: return 0
+        return _u32.unpack_from(page, offset)[0]
+
+    def write_u8(self, to_addr: int, value: int):
+        if to_addr < 0 or to_addr >= self.size:
+            raise MemoryError(f"Invalid memory address: {to_addr}")
+        number = to_addr >> RAM_PAGE_SHIFT
+        self.page(number)[to_addr & RAM_PAGE_MASK] = value
+        self.dirty[number] = 1
+        if self.executed[number]: self._code_written(number, number + 1)
+
+    def write_u16(self, to_addr: int, value: int):
+        offset = to_addr & RAM_PAGE_MASK
+        if offset > RAM_PAGE_SIZE - 2 or to_addr < 0 or to_addr + 2 > self.size:
+            return self.write(to_addr, value.to_bytes(2, 'little'))
+        number = to_addr >> RAM_PAGE_SHIFT
+        _u16.pack_into(self.page(number), offset, value)
+        self.dirty[number] = 1
+        if self.executed[number]: self._code_written(number, number + 1)
+
+    def write_u32(self, to_addr: int, value: int):
+        offset = to_addr & RAM_PAGE_MASK
+        if offset > RAM_PAGE_SIZE - 4 or to_addr < 0 or to_addr + 4 > self.size:
+            return self.write(to_addr, value.to_bytes(4, 'little'))
+        number = to_addr >> RAM_PAGE_SHIFT
+        _u32.pack_into(self.page(number), offset, value)
+        self.dirty[number] = 1
+        if self.executed[number]: self._code_written(number, number + 1)
 
 @jitclass([('size', types.int32), ('memory', types.uint8[:])])
 class RAM_BYTEARRAY_JIT:
@@ -37,12 +269,149 @@ class RAM_BYTEARRAY_JIT:
 
 
 # Used as an adapter to AddressBus as numba does not know what bytearray is...
-class RAM_BYTEARRAY:
+# Bulk accesses work on the jitclass' numpy array directly, numba is not
+# involved and no lists are built.
+class RAM_BYTEARRAY(PageTracking):
     def __init__(self, size: int):
+        self.size = size
         self.ram = RAM_BYTEARRAY_JIT(size)
+        self.memory = self.ram.memory # shares the jitclass' buffer
+        self._init_tracking(size)
 
     def write(self, to_addr: int, data: bytearray):
-        return self.ram.write(to_addr, list(data))
+        if to_addr < 0 or to_addr + len(data) > self.size:
+            raise MemoryError("Invalid memory address or size")
+        if not len(data): return
+        self.memory[to_addr:to_addr+len(data)] = numpy.frombuffer(data, dtype=numpy.uint8)
+        self.written(to_addr, len(data))
+
+    def fill(self, to_addr: int, value: int, length: int):
+        if to_addr < 0 or to_addr + length > self.size:
+            raise MemoryError("Invalid memory address or size")
+        self.memory[to_addr:to_addr+length] = value & 0xFF
+        self.written(to_addr, length)
+
+    def copy_within(self, to_addr: int, from_addr: int, length: int):
+        if min(to_addr, from_addr) < 0 or max(to_addr, from_addr) + length > self.size:
+            raise MemoryError("Invalid memory address or size")
+        self.memory[to_addr:to_addr+length] = self.memory[from_addr:from_addr+length] # numpy handles overlap
+        self.written(to_addr, length)
+
+    def clear(self):
+        self.memory[:] = 0
+        self._reset_tracking()
+
+    def pages(self):
+        """Yields (offset, page) for every page written since clear()."""
+        view = memoryview(self.memory)
+        for offset in self.touched_pages():
+            yield offset, view[offset:offset+RAM_PAGE_SIZE]
+
+    def map_image(self, to_addr: int, image):
+        return self.write(to_addr, image)
+
+    def read(self, from_addr: int, amount: int) -> bytes:
+        if from_addr < 0 or from_addr + amount > self.size:
+            raise MemoryError(f"Invalid memory address: {from_addr}")
+        return self.memory[from_addr:from_addr+amount].tobytes()
+
+# Plain bytearray RAM. Word accesses go straight to the buffer through struct,
+# bulk reads are a single slice and view() hands out zero-copy memoryviews.
+class RAM_BUFFER(PageTracking):
+    def __init__(self, size: int):
+        self.size = size
+        self.memory = bytearray(size)
+        self.view = memoryview(self.memory)
+        self.array = numpy.frombuffer(self.memory, dtype=numpy.uint8) # for fills and overlapping copies
+        self._init_tracking(size)
+
+    def write(self, to_addr: int, data: bytes):
+        if to_addr < 0 or to_addr + len(data) > self.size:
+            raise MemoryError("Invalid memory address or size")
+        if len(data) >= RAM_PAGE_SIZE: # bytearray slice stores from other buffers are far from memcpy speed
+            self.array[to_addr:to_addr+len(data)] = numpy.frombuffer(data, dtype=numpy.uint8)
+        else:
+            self.memory[to_addr:to_addr+len(data)] = data
+        self.written(to_addr, len(data))
+
+    def fill(self, to_addr: int, value: int, length: int):
+        if to_addr < 0 or to_addr + length > self.size:
+            raise MemoryError("Invalid memory address or size")
+        self.array[to_addr:to_addr+length] = value & 0xFF
+        self.written(to_addr, length)
+
+    def copy_within(self, to_addr: int, from_addr: int, length: int):
+        if min(to_addr, from_addr) < 0 or max(to_addr, from_addr) + length > self.size:
+            raise MemoryError("Invalid memory address or size")
+        self.array[to_addr:to_addr+length] = self.array[from_addr:from_addr+length] # numpy handles overlap
+        self.written(to_addr, length)
+
+    def clear(self):
+        self.array[:] = 0 # in place, the numba core holds a view of it
+        self._reset_tracking()
+
+    def pages(self):
+        """Yields (offset, page) for every page written since clear()."""
+        for offset in self.touched_pages():
+            yield offset, self.view[offset:offset+RAM_PAGE_SIZE]
+
+    def map_image(self, to_addr: int, image):
+        # a flat buffer cannot share pages, copy straight out of the mapping
+        return self.write(to_addr, image)
+
+    def read(self, from_addr: int, amount: int) -> bytes:
+        if from_addr < 0 or from_addr + amount > self.size:
+            raise MemoryError(f"Invalid memory address: {from_addr}")
+        return bytes(self.view[from_addr:from_addr+amount])
+
+    def view_of(self, from_addr: int, amount: int) -> memoryview:
+        if from_addr < 0 or from_addr + amount > self.size:
+            raise MemoryError(f"Invalid memory address: {from_addr}")
+        return self.view[from_addr:from_addr+amount]
+
+    def read_u8(self, from_addr: int) -> int:
+        try:
+            return self.memory[from_addr]
+        except IndexError:
+            raise MemoryError(f"Invalid memory address: {from_addr}")
+
+    def read_u16(self, from_addr: int) -> int:
+        try:
+            return _u16.unpack_from(self.memory, from_addr)[0]
+        except struct.error:
+            raise MemoryError(f"Invalid memory address: {from_addr}")
+
+    def read_u32(self, from_addr: int) -> int:
+        try:
+            return _u32.unpack_from(self.memory, from_addr)[0]
+        except struct.error:
+            raise MemoryError(f"Invalid memory address: {from_addr}")
+
+    def write_u8(self, to_addr: int, value: int):
+        try:
+            self.memory[to_addr] = value
+        except IndexError:
+            raise MemoryError(f"Invalid memory address: {to_addr}")
+        number = to_addr >> RAM_PAGE_SHIFT
+        self.dirty[number] = 1
+        if self.executed[number]: self._code_written(number, number + 1)
+
+    def write_u16(self, to_addr: int, value: int):
+        try:
+            _u16.pack_into(self.memory, to_addr, value)
+        except struct.error:
+            raise MemoryError(f"Invalid memory address: {to_addr}")
+        if to_addr & RAM_PAGE_MASK > RAM_PAGE_SIZE - 2: return self.written(to_addr, 2)
+        number = to_addr >> RAM_PAGE_SHIFT
+        self.dirty[number] = 1
+        if self.executed[number]: self._code_written(number, number + 1)
 
-    def read(self, from_addr: int, amount: int):
-        return bytearray(self.ram.read(from_addr, amount))
\ No newline at end of file
+    def write_u32(self, to_addr: int, value: int):
+        try:
+            _u32.pack_into(self.memory, to_addr, value)
+        except struct.error:
+            raise MemoryError(f"Invalid memory address: {to_addr}")
+        if to_addr & RAM_PAGE_MASK > RAM_PAGE_SIZE - 4: return self.written(to_addr, 4)
+        number = to_addr >> RAM_PAGE_SHIFT
+        self.dirty[number] = 1
+        if self.executed[number]: self._code_written(number, number + 1)
@@ -0,0 +1,29 @@
+# System controller the device tree's syscon-poweroff and syscon-reboot
+# nodes write to: a 32-bit register at offset 0 taking these values.
+POWEROFF = 0x5555
+REBOOT   = 0x7777
+
+class Syscon:
+    """Ends CPU.run when the guest powers off or reboots. run() then returns
+    "poweroff" or "reboot"; rebooting the machine (CPU.reset) is up to the
+    caller."""
+    def __init__(self, logger, cpu):
+        self.logger = logger
+        self.cpu = cpu
+        self.register = bytearray(4)
+
+    def read(self, offset: int, amount: int) -> bytes:
+        return bytes(self.register[offset + i] if offset + i < 4 else 0 for i in range(amount))
+
+    def write(self, offset: int, data: bytes) -> None:
+        if offset >= 4: return
+        self.register[offset:offset + len(data)] = data[:4 - offset]
+        value = int.from_bytes(self.register, "little")
+        if value == POWEROFF:
+            self.cpu.request_exit("poweroff")
+        elif value == REBOOT:
+            self.cpu.request_exit("reboot")
+        else:
+            return
+        self.register[:] = bytes(4)
+        if self.logger.enabled: self.logger.log(3, "SYSCON", "Guest requested %s at instruction no %d", self.cpu.exit_reason, self.cpu.instret + 1)
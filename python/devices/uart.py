@@ -1,14 +1,123 @@
+from collections import deque
+
+from utils.console import HostConsole
+
+# 16550 registers (reg-shift 0). DLAB in LCR switches offsets 0 and 1 to the divisor latch.
+RBR_THR_DLL = 0
+IER_DLM     = 1
+IIR_FCR     = 2
+LCR         = 3
+MCR         = 4
+LSR         = 5
+MSR         = 6
+SCR         = 7
+
+LCR_DLAB = 0x80
+IER_RDI  = 0x01 # received data available interrupt
+IER_THRI = 0x02 # transmitter holding register empty interrupt
+FCR_ENABLE   = 0x01
+FCR_CLEAR_RX = 0x02
+MCR_LOOP = 0x10
+LSR_DR   = 0x01 # data ready
+LSR_THRE = 0x20 # transmitter holding register empty
+LSR_TEMT = 0x40 # transmitter empty
+IIR_NO_INT = 0x01
+IIR_THRI   = 0x02
+IIR_RDI    = 0x04
+IIR_FIFO   = 0xC0 # FIFOs enabled
+
+FIFO_SIZE = 16
+
 class UART:
-    def __init__(self, logger):
+    """16550-compatible UART.
+
+    Transmitted bytes go straight to the HostConsole, which writes them to the
+    host in batches from its own thread; the transmitter therefore always
+    reads back as empty. Received bytes are taken from the console's input
+    queue into the RX FIFO whenever the guest looks at LSR or RBR. There is
+    no interrupt line: IIR reports what would be pending, which is what the
+    Linux 8250 driver polls in its no-IRQ mode."""
+    def __init__(self, logger, console=None):
         self.logger = logger
+        self.console = console if console is not None else HostConsole()
+        self.rx = deque()
+        self.ier = 0
+        self.lcr = 0
+        self.mcr = 0
+        self.scr = 0
+        self.fcr = 0
+        self.divisor = 0
+        self.thre_pending = False # THR empty interrupt, cleared by reading IIR
+
+    def _fill(self) -> None:
+        source = self.console.input
+        limit = FIFO_SIZE if self.fcr & FCR_ENABLE else 1
+        while source and len(self.rx) < limit:
+            self.rx.append(source.popleft())
+
+    def read_register(self, register: int) -> int:
+        if register == RBR_THR_DLL:
+            if self.lcr & LCR_DLAB: return self.divisor & 0xFF
+            self._fill()
+            return self.rx.popleft() if self.rx else 0
+        if register == IER_DLM:
+            if self.lcr & LCR_DLAB: return self.divisor >> 8
+            return self.ier
+        if register == IIR_FCR:
+            fifo = IIR_FIFO if self.fcr & FCR_ENABLE else 0
+            self._fill()
+            if self.rx and self.ier & IER_RDI:
+                return fifo | IIR_RDI
+            if self.thre_pending and self.ier & IER_THRI:
+                self.thre_pending = False
+                return fifo | IIR_THRI
+            return fifo | IIR_NO_INT
+        if register == LCR: return self.lcr
+        if register == MCR: return self.mcr
+        if register == LSR:
+            self._fill()
+            return LSR_THRE | LSR_TEMT | (LSR_DR if self.rx else 0)
+        if register == MSR: return 0xB0 if not self.mcr & MCR_LOOP else 0 # CTS, DSR, DCD
+        if register == SCR: return self.scr
+        return 0
+
+    def write_register(self, register: int, value: int) -> None:
+        if register == RBR_THR_DLL:
+            if self.lcr & LCR_DLAB:
+                self.divisor = (self.divisor & 0xFF00) | value
+            elif self.mcr & MCR_LOOP:
+                self.rx.append(value)
+            else:
+                self.console.put(value)
+            self.thre_pending = True
+        elif register == IER_DLM:
+            if self.lcr & LCR_DLAB:
+                self.divisor = (self.divisor & 0x00FF) | (value << 8)
+                return
+            if value & IER_THRI and not self.ier & IER_THRI:
+                self.thre_pending = True # the holding register is already empty
+            self.ier = value & 0x0F
+        elif register == IIR_FCR:
+            self.fcr = value & 0xC9
+            if value & FCR_CLEAR_RX: self.rx.clear()
+        elif register == LCR: self.lcr = value
+        elif register == MCR: self.mcr = value & 0x1F
+        elif register == SCR: self.scr = value
+
+    def read(self, from_addr: int, amount: int) -> bytes:
+        return bytes(self.read_register(from_addr + i) for i in range(amount))
+
+    def write(self, to_addr: int, data: bytes) -> None:
+        for i, byte in enumerate(data):
+            self.write_register(to_addr + i, byte)
 
-    def read(self, from_addr: int, amount: int) -> int:
-        if from_addr == 5:
-            return bytearray([0b01100000])
-        return bytearray([0])
+    # snapshots
+    def get_state(self) -> dict:
+        return {"ier": self.ier, "lcr": self.lcr, "mcr": self.mcr, "scr": self.scr, "fcr": self.fcr,
+                "divisor": self.divisor, "rx": list(self.rx)}
 
-    def write(self, to_addr: int, data: bytes):
-        if to_addr != 0:
-            return
-        for byte in data:
-        	print(chr(byte), end='')
\ No newline at end of file
+    def set_state(self, state) -> None:
+        self.ier, self.lcr, self.mcr = state["ier"], state["lcr"], state["mcr"]
+        self.scr, self.fcr, self.divisor = state["scr"], state["fcr"], state["divisor"]
+        self.rx = deque(state["rx"])
+        self.thre_pending = bool(self.ier & IER_THRI)
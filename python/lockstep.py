@@ -0,0 +1,58 @@
+import argparse
+import io
+import time
+
+from machine import RAM_TYPES, ENGINES, build_guest
+from utils.console import HostConsole
+from utils.lockstep import INTERVALS, Lockstep
+
+# Usage: python lockstep.py [options] [image]
+# Runs one guest on two engines side by side and compares registers, CSRs,
+# device state and RAM at every checkpoint (--every instruction, block or a
+# number of instructions). The first divergence is reported with the
+# instruction that caused it: when checkpoints are further apart, fresh
+# machines replay up to the last agreeing checkpoint and are stepped one
+# instruction at a time from there. Exits nonzero on a divergence.
+# The image is a raw RV32 binary; with no image the config's own guest runs.
+
+def interval(value):
+    if value in INTERVALS: return value
+    return int(value)
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Compare two engines in lockstep")
+    parser.add_argument("image", nargs="?", help="raw binary to run")
+    parser.add_argument("-c", "--config", default="config_linux", help="config module laying out the machine")
+    parser.add_argument("-e", "--engines", nargs=2, choices=ENGINES, default=["interpreter", "translator"],
+                        help="reference and candidate engine")
+    parser.add_argument("-r", "--ram", choices=sorted(RAM_TYPES), help="RAM type, the config's by default")
+    parser.add_argument("--address", type=lambda value: int(value, 0), help="load address of the image")
+    parser.add_argument("--every", type=interval, default=10000, help=f"{' or '.join(INTERVALS)} or a number of instructions")
+    parser.add_argument("-n", "--max-instructions", type=int, help="stop after that many instructions")
+    parser.add_argument("--no-locate", action="store_true", help="report divergences at checkpoint granularity")
+    parser.add_argument("--show-output", action="store_true", help="print the reference guest's console output")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    job = {"image": arguments.image, "address": arguments.address, "config": arguments.config, "ram": arguments.ram}
+    def build(engine):
+        # only the reference machine's console may reach the terminal, neither reads input
+        show = arguments.show_output and engine == arguments.engines[0]
+        return build_guest(dict(job, engine=engine), HostConsole() if show else HostConsole(output=io.BytesIO()))
+    lockstep = Lockstep(build, arguments.engines, arguments.every)
+    start_time = time.perf_counter()
+    divergence = lockstep.run(arguments.max_instructions)
+    took = time.perf_counter() - start_time
+    for machine in lockstep.machines:
+        machine.console.flush()
+    print(f"{lockstep.instret} instructions, {lockstep.checkpoints} checkpoints in {took:.2f}s"
+          f" ({lockstep.instret / took / 1e6:.3f} MIPS)")
+    if divergence is None:
+        reason = f", guest stopped: {lockstep.exit_reason}" if lockstep.exit_reason is not None else ""
+        print(f"{arguments.engines[0]} and {arguments.engines[1]} agree{reason}")
+        exit(0)
+    if not arguments.no_locate:
+        divergence = lockstep.locate(divergence)
+    print(divergence)
+    exit(1)
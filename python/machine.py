@@ -0,0 +1,152 @@
+import gc
+import importlib
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from devices.cpu import CPU
+from devices.memory import RAM_BYTEARRAY, RAM_BUFFER, RAM_DICT, AddressBus
+from devices.uart import UART
+from devices.clint import CLINT
+from devices.syscon import Syscon
+from utils import logger as logr
+from utils.console import HostConsole
+
+RAM_TYPES = {"BYTEARRAY": RAM_BYTEARRAY, "BUFFER": RAM_BUFFER, "DICT": RAM_DICT}
+ENGINES = ("nocache", "interpreter", "translator", "jit")
+
+class Machine:
+    """One emulated computer laid out by a config module (config.py,
+    config_linux.py): RAM, UART, CLINT and syscon on an AddressBus, and the
+    CPU. Everything lives on the instance, so machines share no state and
+    any number of them can exist in one process.
+
+        machine = Machine(config_linux)
+        machine.load()
+        reason = machine.run()"""
+    def __init__(self, config, ram_type=None, logger=None, console=None):
+        self.config = config
+        self.logger = logger if logger is not None else logr.Logger(config.LOG_LEVEL)
+        self.console = console if console is not None else HostConsole(config.CONSOLE_INPUT)
+        ram_type = ram_type or config.RAM_TYPE
+        if ram_type not in RAM_TYPES:
+            raise ValueError(f"Unsupported ram type: {ram_type}. Should be one of {sorted(RAM_TYPES)}")
+        self.ram = RAM_TYPES[ram_type](config.RAM_RANGE[1] - config.RAM_RANGE[0])
+        self.uart = UART(self.logger, self.console)
+        self.bus = AddressBus([
+            [config.UART_RANGE[0], config.UART_RANGE[1], self.uart],
+            [config.RAM_RANGE[0], config.RAM_RANGE[1], self.ram]
+        ])
+        self.cpu = CPU(self.bus, self.logger)
+        self.cpu.console = self.console
+        self.clint = CLINT(self.logger, self.cpu)
+        self.bus.add_device(config.CLINT_RANGE[0], config.CLINT_RANGE[1], self.clint)
+        self.syscon = Syscon(self.logger, self.cpu)
+        self.bus.add_device(config.SYSCON_RANGE[0], config.SYSCON_RANGE[1], self.syscon)
+
+    def set_engine(self, engine: str) -> None:
+        if engine not in ENGINES:
+            raise ValueError(f"Unsupported engine: {engine}. Should be one of {list(ENGINES)}")
+        cpu = self.cpu
+        cpu.decode_cache_enabled = engine != "nocache"
+        if engine == "translator":
+            cpu.enable_translation()
+        if engine == "jit":
+            cpu.enable_jit()
+
+    def load(self) -> None:
+        """Loads the guest the config module describes."""
+        self.config.loader(self.logger, self.cpu, self.bus, self.uart)
+
+    def load_binary(self, image, address=None) -> None:
+        """Places a raw RV32 binary at address (the start of RAM by default)
+        and starts execution there."""
+        if address is None:
+            address = self.config.RAM_RANGE[0]
+        self.bus.map_image(address, image)
+        self.cpu.registers["pc"] = address
+        self.cpu.capture_reset_state()
+
+    def run(self, max_reboots=None):
+        """Runs the guest, rebooting it whenever it asks to (at most
+        max_reboots times), and returns CPU.run's exit reason."""
+        reboots = 0
+        while True:
+            reason = self.cpu.run()
+            if reason != "reboot" or (max_reboots is not None and reboots >= max_reboots):
+                return reason
+            self.cpu.reset()
+            reboots += 1
+
+# Batch runs: every job gets a machine of its own in a worker process.
+
+def build_guest(job: dict, console=None) -> Machine:
+    """Builds the machine a job (see run_guest) describes and loads its guest,
+    with tracing and profiling off."""
+    config = importlib.import_module(job.get("config", "config"))
+    machine = Machine(config, job.get("ram"), logr.Logger(0), console)
+    machine.cpu.disable_profiling()
+    machine.set_engine(job.get("engine", "interpreter"))
+    if job.get("image") is None:
+        machine.load()
+    else:
+        with open(job["image"], "rb") as file:
+            machine.load_binary(file.read(), job.get("address"))
+    machine.logger.enabled = False
+    return machine
+
+def run_guest(job: dict) -> dict:
+    """Runs one guest and returns its result record. job holds
+        image             raw binary to load, or None for the config's own loader
+        address           where to load the image (start of RAM by default)
+        config            config module name, "config" by default
+        engine, ram       see ENGINES and RAM_TYPES
+        max_instructions  the guest is stopped with reason "limit" after that many
+        max_reboots       reboots allowed before the run counts as ended
+    The record has the exit reason ("poweroff", "reboot", "limit" or "error"),
+    a0 at exit as exit_code, the UART and hvc0 output and run statistics."""
+    result = {"image": job.get("image")}
+    output = io.BytesIO()
+    console = HostConsole(output=output)
+    start_time = time.perf_counter()
+    try:
+        machine = build_guest(job, console)
+        cpu = machine.cpu
+        if job.get("max_instructions"):
+            cpu.hooks.at_count(job["max_instructions"], lambda cpu: cpu.request_exit("limit"))
+        result["startup_seconds"] = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        try:
+            result["reason"] = machine.run(job.get("max_reboots", 0))
+        except Exception as e:
+            result["reason"] = "error"
+            result["error"] = f"{type(e).__name__}: {e}"
+        took = time.perf_counter() - start_time
+        result["exit_code"] = cpu.integer_registers[10]
+        result["pc"] = cpu.registers["pc"]
+        result["instructions"] = cpu.instret
+        result["seconds"] = took
+        result["mips"] = cpu.instret / took / 1e6 if took else 0.0
+    except Exception as e: # the machine could not even be built or loaded
+        result["reason"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+    console.close()
+    machine = cpu = None
+    gc.collect() # the CPU and its devices reference each other; free the RAM before the worker's next job
+    result["output"] = output.getvalue().decode("utf-8", errors="replace")
+    return result
+
+def run_batch(jobs, workers=None, on_result=None) -> list:
+    """Runs the jobs (see run_guest) on `workers` processes, all cores by
+    default. Results come back in job order; on_result is called with each
+    one as soon as it is done."""
+    results = [None] * len(jobs)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers or os.cpu_count(), mp_context=context) as pool:
+        futures = {pool.submit(run_guest, job): index for index, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            result = results[futures[future]] = future.result()
+            if on_result is not None: on_result(result)
+    return results
@@ -1,17 +1,17 @@
 import sys
 import os
-import zipfile
-from math import ceil
-from devices.cpu import CPU
-from devices.memory import RAM_BYTEARRAY, RAM_DICT, AddressBus
-from devices.uart import UART
-
-from utils import logger as logr
+import time
+from devices.cpu.isa import disassemble
+from machine import Machine
+from utils import crashdump
 
 import config_linux as config
 #import config
 
-logger = logr.Logger(config.LOG_LEVEL)
+CRASH_TRACE_RECORDS = 20000 # trace records from the end of the ring put into the crash dump
+CRASH_DUMP_CODEC = "deflate" # "deflate", "lzma" or "zstd" (needs the zstandard package)
+CRASH_OUTPUT = "crash/"
+PROFILE_OUTPUT = "profile/" # where profiler reports go after a clean exit
 
 def trace_exc(trace):
     traceback = ""
@@ -26,31 +26,38 @@ def format_exception(e):
     formatted = f"{traceback}\n{klass.__name__}: {objekt}"
     return formatted
 
-ram = None
-if config.RAM_TYPE == "BYTEARRAY":
-    ram = RAM_BYTEARRAY(config.RAM_RANGE[1] - config.RAM_RANGE[0])
-elif config.RAM_TYPE == "DICT":
-    ram = RAM_DICT()
-else:
-    print(f"Unsupported ram type: {config.RAM_TYPE}. Should be one of ['DICT', 'BYTEARRAY']")
+try:
+    machine = Machine(config)
+except ValueError as e:
+    print(e)
     exit(1)
-uart = UART(logger)
-bus = AddressBus([
-    [config.UART_RANGE[0], config.UART_RANGE[1], uart],
-    [config.RAM_RANGE[0], config.RAM_RANGE[1], ram]
-])
-cpu = CPU(bus, logger)
+cpu, bus, console, logger = machine.cpu, machine.bus, machine.console, machine.logger
 
-config.loader(logger, cpu, bus, uart)
-instruction_no = 0
+machine.load()
 try:
-    config.pre_cpu_start(logger)
-    def callback():
-        global instruction_no
-        instruction_no += 1
-        config.instruction_callback(logger, instruction_no)
-    print(cpu.run(callback))
+    config.pre_cpu_start(cpu)
+    while True:
+        reason = cpu.run() # "poweroff" and "reboot" come from the syscon device
+        console.flush()
+        enabled, logger.enabled = logger.enabled, True
+        logger.log(3, "MAIN", f"Guest {reason} after {cpu.instret} instructions" if reason != -1 else "CPU stopped")
+        logger.enabled = enabled
+        if reason != "reboot": break
+        cpu.reset() # RAM comes back from the cached images, no files are read
+    if cpu.idioms is not None:
+        enabled, logger.enabled = logger.enabled, True
+        for line in cpu.idioms.report():
+            logger.log(3, "IDIOMS", line)
+        if cpu.idioms.verify:
+            logger.log(3, "IDIOMS", f"{cpu.idioms.checked} calls verified")
+        logger.enabled = enabled
+    if cpu.profiler is not None:
+        os.makedirs(PROFILE_OUTPUT, exist_ok=True)
+        for filename in cpu.profiler.write(PROFILE_OUTPUT):
+            logger.log(3, "MAIN", f"Profile written to {filename}")
 except BaseException as e:
+    console.flush()
+    instruction_no = cpu.instret + 1
     logger.enabled = True
     logger.log(1, "CRASH_HANDLER", "-="*40+"-")
     logger.log(1, "CRASH_HANDLER", "EXCEPTION OCCURED!")
@@ -58,11 +65,18 @@ except BaseException as e:
     for a,b,c,d in zip(regs[::4], regs[1::4], regs[2::4], regs[3::4]):
         logger.log(1, "CRASH_HANDLER", f"{a} {b} {c} {d}")
     logger.log(1, "CRASH_HANDLER", f"PC: {cpu.registers['pc']:08x}")
+    try:
+        logger.log(1, "CRASH_HANDLER", f"Instruction: {disassemble(cpu.memory.read_u32(cpu.registers['pc']), cpu.registers['pc'])}")
+    except Exception:
+        logger.log(1, "CRASH_HANDLER", "Instruction: <unreadable>")
+    symbols = cpu.symbols
+    if symbols is not None:
+        logger.log(1, "CRASH_HANDLER", f"In: {symbols.describe(cpu.registers['pc'])}, ra: {symbols.describe(cpu.integer_registers[1])}")
     logger.log(1, "CRASH_HANDLER", f"I-No: {instruction_no}")
     logger.log(1, "CRASH_HANDLER", "")
-    if hasattr(cpu, "profiling_data"):
-        for inst,data in cpu.profiling_data.items():
-            logger.log(1, "CRASH_HANDLER", f"PROFILING: {inst}: avg {sum(data) / len(data) * 1000:.4f}, min {min(data) * 1000:.4f}ms, max {max(data) * 1000:.4f}ms, ncalls {len(data)}")
+    if cpu.profiler is not None:
+        for line in cpu.profiler.opcode_report():
+            logger.log(1, "CRASH_HANDLER", f"PROFILING: {line}")
 
     logger.log(1, "CRASH_HANDLER", f"I-No: {instruction_no}")
     exc = sys.exc_info()
@@ -71,57 +85,12 @@ except BaseException as e:
         logger.log(1, "CRASH_HANDLER", _)
     logger.log(1, "CRASH_HANDLER", "-="*40+"-")
     logger.log(1, "CRASH_HANDLER", "Generating crash dump...")
-    saveto = "crash/"
-    if not os.path.exists(saveto):
-        os.makedirs(saveto)
-    for filename in os.listdir(saveto):
-        file_path = os.path.join(saveto, filename)
-        try:
-            if os.path.isfile(file_path) or os.path.islink(file_path):
-                os.unlink(file_path)
-        except Exception as e:
-            print('Failed to delete %s. Reason: %s' % (file_path, e))
-    logger.log(1, "CRASH_HANDLER", f"Saving to {saveto}")
-    def find_continuous_sequences(lst):
-        sequences = []
-        current_sequence = None
-        for value in lst:
-            if not current_sequence or value >= current_sequence[-1] + 2:
-                current_sequence = [value]
-                sequences.append(current_sequence)
-            else:
-                current_sequence.append(value)
-        return sequences
-
-    with zipfile.ZipFile(f'{saveto}crashdump.zip', 'w') as dumpzip:
-        if config.RAM_TYPE == "DICT":
-            for region in find_continuous_sequences(sorted(list(ram.memory.keys()))):
-                start = min(region)
-                size = max(region) - start + 1
-                filename = f"{saveto}memory{start:08x}-{start+size:08x}.dmp"
-                logger.log(1, "CRASH_HANDLER", f"  Writing memory dump: start={start:08x}, size={size:08x}, file={filename}")
-                with open(filename, 'wb') as memdump:
-                    with dumpzip.open(filename, 'w') as memdumpzip:
-                        left = size
-                        got = 0
-                        while left > 0:
-                            logger.log(1, "CRASH_HANDLER", f"  Left to write: {left}...")
-                            memdump.write(bus.read(config.RAM_RANGE[0]+start+got, min(left, 1024*1024)))
-                            memdumpzip.write(bus.read(config.RAM_RANGE[0]+start+got, min(left, 1024*1024)))
-                            left -= 1024*1024
-                            got += 1024*1024
-        elif config.RAM_TYPE == "BYTEARRAY":
-            filename = f"{saveto}memory.dmp"
-            logger.log(1, "CRASH_HANDLER", f"  Writing memory dump: file={filename}")
-            with open(filename, 'wb') as memdump:
-                with dumpzip.open(filename, 'w') as memdumpzip:
-                    memdump.write(bus.read(config.RAM_RANGE[0], config.RAM_RANGE[1] - config.RAM_RANGE[0]))
-                    memdumpzip.write(bus.read(config.RAM_RANGE[0], config.RAM_RANGE[1] - config.RAM_RANGE[0]))
-        logger.log(1, "CRASH_HANDLER", "  All written!")
-        filename = f"{saveto}log.txt"
-        logger.log(1, "CRASH_HANDLER", f"Writing logged data to {filename}")
-        with open(filename, 'w', encoding='utf-8') as log:
-            with dumpzip.open(filename, 'w') as logzip:
-                log.write(logger.textlog)
-                logzip.write(logger.textlog.encode())
-
+    os.makedirs(CRASH_OUTPUT, exist_ok=True)
+    filename = f"{CRASH_OUTPUT}crashdump-{time.strftime('%Y%m%d-%H%M%S')}.rvdump"
+    logger.log(1, "CRASH_HANDLER", f"Saving to {filename}")
+    pages = crashdump.write(filename, cpu, bus, reason=tr, logger=logger,
+                            trace_records=CRASH_TRACE_RECORDS, codec=CRASH_DUMP_CODEC)
+    logger.log(1, "CRASH_HANDLER", f"  {pages} non-zero pages written, inspect with: python postmortem.py {filename}")
+    if cpu.profiler is not None:
+        for filename in cpu.profiler.write(CRASH_OUTPUT):
+            logger.log(1, "CRASH_HANDLER", f"Writing profile to {filename}")
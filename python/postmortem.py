@@ -0,0 +1,71 @@
+import argparse
+import code
+import importlib
+import os
+
+from devices.cpu.isa import disassemble
+from machine import Machine
+from utils import crashdump
+from utils.console import HostConsole
+from utils.symbols import SymbolIndex
+
+# Usage: python postmortem.py [options] crash/crashdump-....rvdump
+# Prints what a crash dump written by main.py holds: the reason, registers,
+# CSRs, the code at pc and the end of the trace ring. With -i the dump is
+# restored into a fresh machine laid out by the config and an interactive
+# console is opened with machine, cpu, bus and dump in scope, so the guest
+# can be inspected or stepped on from the crash (cpu.run() and so on).
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Inspect a crash dump")
+    parser.add_argument("dump", help="crash dump file")
+    parser.add_argument("-c", "--config", default="config_linux", help="config module of the crashed machine")
+    parser.add_argument("--map", default="linux/kernel.map", help="symbol map to resolve addresses with, if it exists")
+    parser.add_argument("-t", "--trace", type=int, default=40, help="trace records to print from the end of the ring")
+    parser.add_argument("--code", type=int, default=8, help="instructions to disassemble from pc on")
+    parser.add_argument("-i", "--interactive", action="store_true", help="restore the dump and open a console")
+    return parser.parse_args()
+
+def describe(address, symbols):
+    return f"{address:08x} {symbols.describe(address)}" if symbols is not None else f"{address:08x}"
+
+def print_dump(dump, symbols, trace, instructions):
+    header = dump.header
+    state = header["cpu"]
+    print(header["reason"])
+    print(f"Instruction no {state['instret'] + 1}, privilege mode {state['privilege_mode']}")
+    print(f"{sum(pages for address, pages in dump.page_map)} non-zero pages in {len(dump.page_map)} runs")
+    print()
+    registers = state["integer_registers"]
+    for i in range(0, 32, 4):
+        print("  ".join(f"x{j:<2} {registers[j]:08x}" for j in range(i, i + 4)))
+    print("  ".join(f"{name} {value:08x}" for name, value in header["csrs"].items() if value))
+    print(f"ra {describe(registers[1], symbols)}")
+    print()
+    pc = state["registers"]["pc"]
+    for _ in range(instructions):
+        raw = dump.read_u32(pc)
+        marker = "=>" if pc == state["registers"]["pc"] else "  "
+        print(f"{marker} {describe(pc, symbols)}: {disassemble(raw, pc)}")
+        pc += 4 if raw & 0b11 == 0b11 else 2
+    if trace and header["trace"]:
+        print()
+        dropped = f", {header['trace_dropped']} dropped before" if header["trace_dropped"] else ""
+        print(f"Last {min(trace, len(header['trace']))} of {len(header['trace'])} trace records{dropped}:")
+        for line in header["trace"][-trace:]:
+            print(line)
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    dump = crashdump.load(arguments.dump)
+    symbols = SymbolIndex.from_map_file(arguments.map) if os.path.exists(arguments.map) else None
+    print_dump(dump, symbols, arguments.trace, arguments.code)
+    if arguments.interactive:
+        config = importlib.import_module(arguments.config)
+        machine = Machine(config, console=HostConsole())
+        cpu, bus = machine.cpu, machine.bus
+        cpu.symbols = symbols
+        machine.logger.enabled = False # set it again from the console to trace
+        pages = dump.restore(cpu, bus)
+        code.interact(banner=f"Restored {pages} pages into a {config.__name__} machine at pc {cpu.registers['pc']:08x}",
+                      local={"machine": machine, "cpu": cpu, "bus": bus, "dump": dump, "symbols": symbols})
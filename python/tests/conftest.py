@@ -0,0 +1,38 @@
+import os
+import sys
+
+# the tests import the emulator the way its scripts do, from python/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+import types
+
+import config
+from machine import Machine
+from utils import logger as logr
+from utils.console import HostConsole
+
+RAM_BASE = 0x80000000
+
+# config.py's layout with 16 MiB of RAM instead of 2 GiB
+small_config = types.SimpleNamespace(**{name: getattr(config, name) for name in dir(config) if name.isupper()})
+small_config.RAM_RANGE = (RAM_BASE, RAM_BASE + (16 << 20))
+
+def quiet_machine(ram_type=None, engine="interpreter"):
+    """A machine with small RAM, no tracing and its console output kept off the terminal."""
+    machine = Machine(small_config, ram_type, logr.Logger(0), HostConsole(output=io.BytesIO()))
+    machine.cpu.disable_profiling()
+    machine.set_engine(engine)
+    machine.logger.enabled = False
+    return machine
+
+def run_until(machine, pc=None, instret=None):
+    """Runs machine until it gets to pc or has retired instret instructions,
+    whichever comes first, and returns the exit reason."""
+    cpu = machine.cpu
+    stop = lambda cpu: cpu.request_exit("test")
+    if pc is not None: cpu.hooks.at_pc(pc, stop)
+    if instret is not None: cpu.hooks.at_count(instret, stop)
+    reason = cpu.run()
+    cpu.hooks.remove(stop)
+    return reason
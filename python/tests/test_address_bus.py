@@ -0,0 +1,119 @@
+from array import array
+
+import pytest
+
+from devices.memory import AddressBus, RAM_BUFFER
+from machine import RAM_TYPES
+
+class Registers:
+    """An MMIO device with only read and write, recording the writes."""
+    def __init__(self, size):
+        self.memory = bytearray(size)
+        self.writes = []
+
+    def read(self, offset, amount):
+        return bytes(self.memory[offset:offset+amount])
+
+    def write(self, offset, data):
+        self.writes.append((offset, bytes(data)))
+        self.memory[offset:offset+len(data)] = data
+
+def test_overlaps_are_rejected():
+    bus = AddressBus([[0x1000, 0x1FFF, RAM_BUFFER(0x1000)]])
+    with pytest.raises(ValueError, match="overlaps 00001000-00001fff"):
+        bus.add_device(0x1800, 0x27FF, RAM_BUFFER(0x1000))
+    with pytest.raises(ValueError, match="overlaps"):
+        bus.add_device(0x0000, 0x1000, RAM_BUFFER(0x1001))
+    bus.add_device(0x2000, 0x2FFF, RAM_BUFFER(0x1000)) # adjacent is fine
+    assert len(bus.devices) == 2
+
+@pytest.mark.parametrize("start, end", [(-1, 0x10), (0x10, 0x0F), (0xFFFFF000, 1 << 32)])
+def test_invalid_ranges_are_rejected(start, end):
+    with pytest.raises(ValueError, match="Invalid device range"):
+        AddressBus([[start, end, Registers(0x1000)]])
+
+def test_page_map():
+    ram, low, high = RAM_BUFFER(0x2000), Registers(0x100), Registers(0x100)
+    bus = AddressBus([[0x80000000, 0x80001FFF, ram], [0x10000000, 0x100000FF, low], [0x10000100, 0x100001FF, high]])
+    assert [entry[2] for entry in bus.pages[0x80000]] == [ram]
+    assert [entry[2] for entry in bus.pages[0x80001]] == [ram]
+    assert [entry[2] for entry in bus.pages[0x10000]] == [low, high] # two devices share a page
+    assert bus.pages[0x80002] == () and bus.pages[0] == ()
+    assert bus.find(0x80001FFF)[2] is ram
+    assert bus.find(0x100000FF)[2] is low
+    assert bus.find(0x10000100)[2] is high
+    for address in (0x80002000, 0x10000200, 0x7FFFFFFF):
+        with pytest.raises(ValueError, match="out of bounds"):
+            bus.find(address)
+        with pytest.raises(ValueError, match="out of bounds"):
+            bus.read_u32(address)
+
+def test_word_access_without_word_methods():
+    device = Registers(0x100)
+    bus = AddressBus([[0x10000000, 0x100000FF, device]])
+    bus.write_u32(0x10000010, 0x11223344)
+    bus.write_u16(0x10000020, 0xBEEF)
+    bus.write_u8(0x10000030, 0x7F)
+    assert device.writes == [(0x10, b"\x44\x33\x22\x11"), (0x20, b"\xef\xbe"), (0x30, b"\x7f")]
+    assert bus.read_u32(0x10000010) == 0x11223344
+    assert bus.read_u16(0x10000020) == 0xBEEF
+    assert bus.read_u8(0x10000030) == 0x7F
+
+def test_access_across_devices():
+    ram, registers = RAM_BUFFER(0x1000), Registers(0x1000)
+    bus = AddressBus([[0x0000, 0x0FFF, ram], [0x1000, 0x1FFF, registers]])
+    bus.write(0x0FFE, b"abcd")
+    assert ram.read(0xFFE, 2) == b"ab"
+    assert registers.writes == [(0, b"cd")]
+    assert bus.read(0x0FFC, 8) == b"\0\0abcd\0\0"
+
+def ram_and_registers(ram_type):
+    """Three pages of RAM with an MMIO device right behind them, and a log of
+    what the write listeners were told."""
+    ram, registers = RAM_TYPES[ram_type](0x3000), Registers(0x100)
+    bus = AddressBus([[0x0000, 0x2FFF, ram], [0x3000, 0x30FF, registers]])
+    heard = []
+    bus.write_listeners.append(lambda address, length: heard.append((address, length)))
+    return bus, ram, registers, heard
+
+@pytest.mark.parametrize("ram_type", sorted(RAM_TYPES))
+def test_load_bytes(ram_type):
+    bus, ram, registers, heard = ram_and_registers(ram_type)
+    data = bytes(range(256)) * 17
+    bus.load_bytes(0x1F80, bytearray(data)) # across two pages and into the registers
+    bus.load_bytes(0x0100, array("I", [0x11223344, 0x55667788])) # any buffer, as bytes
+    bus.load_bytes(0x0200, b"") # nothing to do, nobody told
+    assert bus.read(0x1F80, len(data)) == data
+    assert ram.read(0x1F80, 0x1080) == data[:0x1080]
+    assert registers.writes == [(0, data[0x1080:])]
+    assert bus.read(0x0100, 8) == bytes.fromhex("4433221188776655")
+    assert heard == [(0x1F80, len(data)), (0x0100, 8)]
+
+@pytest.mark.parametrize("ram_type", sorted(RAM_TYPES))
+def test_copy_within(ram_type):
+    bus, ram, registers, heard = ram_and_registers(ram_type)
+    data = bytes(range(1, 256)) * 20
+    bus.load_bytes(0x0000, data)
+    bus.copy_within(0x0FF0, 0x0F00, 0x200) # overlapping, forwards, over a page boundary
+    assert ram.read(0x0FF0, 0x200) == data[0xF00:0x1100]
+    bus.copy_within(0x0010, 0x0020, 0x40) # overlapping, backwards
+    assert ram.read(0x0010, 0x40) == data[0x20:0x60]
+    assert ram.read(0x0000, 0x10) == data[:0x10]
+    bus.copy_within(0x2FF8, 0x0000, 0x10) # out of RAM into the registers
+    assert registers.writes == [(0, data[8:16])] and ram.read(0x2FF8, 8) == data[:8]
+    bus.copy_within(0x0400, 0x2FF8, 0x10) # and back
+    assert ram.read(0x0400, 0x10) == data[:0x10]
+    bus.copy_within(0x0500, 0x0400, 0) # nothing to do
+    assert heard[1:] == [(0x0FF0, 0x200), (0x0010, 0x40), (0x2FF8, 0x10), (0x0400, 0x10)]
+
+@pytest.mark.parametrize("ram_type", sorted(RAM_TYPES))
+def test_fill(ram_type):
+    bus, ram, registers, heard = ram_and_registers(ram_type)
+    bus.load_bytes(0x0000, b"\xff" * 0x3000)
+    bus.fill(0x0FFE, 0x1A5, 0x1004) # a page and a bit; only the low byte counts
+    assert ram.read(0x0FFC, 0x1008) == b"\xff\xff" + b"\xa5" * 0x1004 + b"\xff\xff"
+    bus.fill(0x2FFE, 0, 4) # the last of the RAM and the first of the registers
+    assert ram.read(0x2FFC, 4) == b"\xff\xff\0\0"
+    assert registers.writes == [(0, b"\0\0")]
+    bus.fill(0x0000, 0, 0)
+    assert heard[1:] == [(0x0FFE, 0x1004), (0x2FFE, 4)]
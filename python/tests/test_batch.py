@@ -0,0 +1,56 @@
+from benchmarks import Assembler
+from conftest import RAM_BASE as BASE, small_config
+from devices.syscon import POWEROFF
+from machine import run_batch, run_guest
+
+UART, SYSCON = small_config.UART_RANGE[0], small_config.SYSCON_RANGE[0]
+A0, T0, T1 = 10, 5, 6
+
+def hello(exit_code):
+    """Prints hi on the UART and powers off with a0 = exit_code."""
+    a = Assembler(BASE)
+    a.li(T0, UART)
+    for character in b"hi\n":
+        a.li(T1, character)
+        a.sb(T1, 0, T0)
+    a.li(A0, exit_code)
+    a.li(T0, SYSCON)
+    a.li(T1, POWEROFF)
+    a.sw(T1, 0, T0)
+    return a.assemble()
+
+def spin():
+    a = Assembler(BASE)
+    a.label("loop")
+    a.addi(A0, A0, 1)
+    a.j("loop")
+    return a.assemble()
+
+def test_run_batch(tmp_path):
+    images = {"hello": hello(3), "spin": spin(), "illegal": b"\xff\xff\xff\xff"}
+    for name, image in images.items():
+        (tmp_path / f"{name}.bin").write_bytes(image)
+    jobs = [
+        {"image": str(tmp_path / "hello.bin")},
+        {"image": str(tmp_path / "spin.bin"), "engine": "translator", "max_instructions": 5000},
+        {"image": str(tmp_path / "illegal.bin")},
+        {"image": str(tmp_path / "missing.bin")},
+        {"image": str(tmp_path / "hello.bin"), "engine": "nocache", "ram": "DICT"},
+    ]
+    seen = []
+    results = run_batch(jobs, workers=2, on_result=seen.append)
+    assert [result["image"] for result in results] == [job["image"] for job in jobs] # in job order
+    assert sorted(map(id, seen)) == sorted(map(id, results))
+    hello_result, spin_result, illegal, missing, again = results
+    assert (hello_result["reason"], hello_result["exit_code"], hello_result["output"]) == ("poweroff", 3, "hi\n")
+    assert hello_result["instructions"] == again["instructions"] == 12
+    assert (spin_result["reason"], spin_result["instructions"], spin_result["exit_code"]) == ("limit", 5000, 2500)
+    assert illegal["reason"] == "error" and illegal["error"].startswith("NotImplementedError")
+    assert missing["reason"] == "error" and missing["error"].startswith("FileNotFoundError")
+    assert "instructions" not in missing
+
+def test_run_guest_in_process(tmp_path):
+    (tmp_path / "hello.bin").write_bytes(hello(0))
+    result = run_guest({"image": str(tmp_path / "hello.bin")})
+    assert result["reason"] == "poweroff" and result["output"] == "hi\n"
+    assert result["mips"] > 0 and result["startup_seconds"] >= 0
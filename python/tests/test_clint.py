@@ -0,0 +1,75 @@
+import pytest
+
+from benchmarks import Assembler
+from conftest import RAM_BASE as BASE, quiet_machine, run_until, small_config
+from devices.clint import MTIMECMP, MTIME, MIP_MTIP
+
+CLINT = small_config.CLINT_RANGE[0]
+HANDLER = BASE + 0x100
+MSTATUS, MIE, MTVEC, MEPC, MCAUSE = 0x300, 0x304, 0x305, 0x341, 0x342
+A0, A1, A2, A3, T0, T1 = 10, 11, 12, 13, 5, 6
+
+def timer_guest(engine, deadline, wait):
+    """Enables the timer interrupt with mtimecmp at deadline, then counts up
+    a0 (or waits with WFI). The handler keeps mcause, mepc and mtime in a1-a3."""
+    a = Assembler(BASE)
+    a.li(T0, HANDLER)
+    a.csrrw(0, MTVEC, T0)
+    a.li(T0, MIP_MTIP)
+    a.csrrw(0, MIE, T0)
+    a.li(T1, CLINT + MTIMECMP)
+    a.li(T0, deadline)
+    a.sw(T0, 0, T1)
+    a.sw(0, 4, T1)
+    a.csrrsi(0, MSTATUS, 0x8) # MIE
+    a.label("loop")
+    if wait: a.wfi()
+    a.addi(A0, A0, 1)
+    a.j("loop")
+    while a.here < HANDLER:
+        a.addi(0, 0, 0)
+    a.csrrs(A1, MCAUSE, 0)
+    a.csrrs(A2, MEPC, 0)
+    a.li(T1, CLINT + MTIME)
+    a.lw(A3, 0, T1)
+    a.label("halt")
+    a.j("halt")
+    machine = quiet_machine("BUFFER", engine)
+    machine.load_binary(a.assemble(), BASE)
+    return machine, a.labels
+
+@pytest.mark.parametrize("engine", ["interpreter", "translator", "jit"])
+def test_mtimecmp_raises_the_timer_interrupt(engine):
+    machine, labels = timer_guest(engine, 500, wait=False)
+    assert run_until(machine, pc=labels["halt"], instret=10000) == "test"
+    x = machine.cpu.integer_registers
+    assert x[A1] == 0x80000007
+    # taken at instruction 500 exactly: ten to set up, 245 rounds of the loop
+    assert x[A0] == 245 and x[A2] == labels["loop"]
+    assert x[A3] == 504 # four instructions into the handler
+    assert machine.cpu.registers["mip"] & MIP_MTIP
+
+def test_no_interrupt_before_the_deadline():
+    machine, labels = timer_guest("interpreter", 500, wait=False)
+    run_until(machine, instret=499)
+    assert not machine.cpu.registers.get("mip", 0) & MIP_MTIP
+    assert machine.cpu.registers["pc"] < HANDLER
+
+@pytest.mark.parametrize("engine", ["interpreter", "translator"])
+def test_wfi_skips_to_the_deadline(engine):
+    machine, labels = timer_guest(engine, 10 ** 9, wait=True)
+    assert run_until(machine, pc=labels["halt"], instret=10000) == "test"
+    x = machine.cpu.integer_registers
+    assert machine.cpu.instret < 50 # not a billion instructions of waiting
+    assert x[A1] == 0x80000007 and x[A0] == 0
+    assert x[A3] >= 10 ** 9
+
+def test_mtimecmp_write_clears_the_interrupt():
+    machine, labels = timer_guest("interpreter", 100, wait=False)
+    run_until(machine, instret=50) # interrupts enabled, deadline ahead
+    machine.cpu.interrupts_enable = False
+    run_until(machine, instret=150)
+    assert machine.cpu.registers["mip"] & MIP_MTIP
+    machine.bus.write_u32(CLINT + MTIMECMP, 1000)
+    assert not machine.cpu.registers["mip"] & MIP_MTIP
+    assert machine.bus.read_u32(CLINT + MTIME) == 150
@@ -0,0 +1,54 @@
+import pytest
+
+from benchmarks.workloads import SYNTHETIC, CODE_BASE, DATA_BASE
+from conftest import quiet_machine
+from utils import crashdump
+
+def run_to(machine, instret):
+    machine.cpu.hooks.at_count(instret, lambda cpu: cpu.request_exit("test"))
+    assert machine.cpu.run() == "test"
+
+def crashed_machine():
+    machine = quiet_machine("BUFFER")
+    machine.load_binary(SYNTHETIC["loadstore"](), CODE_BASE)
+    run_to(machine, 20000)
+    return machine
+
+@pytest.mark.parametrize("codec", ["deflate", "lzma"])
+def test_round_trip(tmp_path, codec):
+    machine = crashed_machine()
+    cpu, bus = machine.cpu, machine.bus
+    path = tmp_path / "crash.rvdump"
+    pages = crashdump.write(path, cpu, bus, reason="test", codec=codec)
+    dump = crashdump.load(path)
+    assert len(dump.pages) == pages > 0
+    assert dump.header["reason"] == "test"
+    assert dump.header["cpu"]["integer_registers"] == list(cpu.integer_registers[:32])
+    assert dump.read(CODE_BASE, 64) == bus.read(CODE_BASE, 64)
+    assert dump.read_u32(DATA_BASE) == bus.read_u32(DATA_BASE)
+    assert dump.read(CODE_BASE + (8 << 20), 16) == bytes(16) # not stored, reads as zeroes
+
+    # a fresh machine with nothing loaded picks up where the dumped one was
+    restored = quiet_machine("BUFFER")
+    assert dump.restore(restored.cpu, restored.bus) == pages
+    assert restored.cpu.integer_registers[:32] == cpu.integer_registers[:32]
+    assert restored.cpu.registers["pc"] == cpu.registers["pc"]
+    assert restored.cpu.instret == cpu.instret
+    for each in (machine, restored):
+        run_to(each, 30000)
+    assert restored.cpu.integer_registers[:32] == cpu.integer_registers[:32]
+    assert restored.bus.read(DATA_BASE, 0x10000) == bus.read(DATA_BASE, 0x10000)
+
+def test_other_device_map(tmp_path):
+    machine = crashed_machine()
+    path = tmp_path / "crash.rvdump"
+    crashdump.write(path, machine.cpu, machine.bus)
+    other = quiet_machine("DICT")
+    with pytest.raises(ValueError, match="different device map"):
+        crashdump.load(path).restore(other.cpu, other.bus)
+
+def test_not_a_dump(tmp_path):
+    path = tmp_path / "snapshot.rvsnap"
+    path.write_bytes(b"something else")
+    with pytest.raises(ValueError, match="not a crash dump"):
+        crashdump.load(path)
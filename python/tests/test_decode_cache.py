@@ -0,0 +1,77 @@
+import pytest
+
+from benchmarks import Assembler
+from benchmarks.assembler import encode_i
+from conftest import RAM_BASE as BASE, quiet_machine, run_until
+from machine import RAM_TYPES
+
+A0, T0, T1, T2 = 10, 5, 6, 7
+ADDI_A0_100 = encode_i(0b0010011, A0, 0, A0, 100)
+
+PATCH = BASE + 0x40
+
+def self_modifying():
+    """Runs `addi a0, a0, 1` at PATCH once, overwrites it with
+    `addi a0, a0, 100` through a guest store and runs it again: a0 ends at
+    101, or at 2 if the old decoding survived."""
+    a = Assembler(BASE)
+    a.li(A0, 0)
+    a.li(T0, ADDI_A0_100)
+    a.li(T1, PATCH)
+    a.li(T2, 0)
+    while a.here < PATCH:
+        a.addi(0, 0, 0)
+    a.label("again")
+    a.addi(A0, A0, 1)
+    a.bne(T2, 0, "halt")
+    a.addi(T2, T2, 1)
+    a.sw(T0, 0, T1)
+    a.j("again")
+    a.label("halt")
+    a.j("halt")
+    return a.assemble(), a.labels
+
+@pytest.mark.parametrize("engine", ["interpreter", "translator"])
+@pytest.mark.parametrize("ram_type", sorted(RAM_TYPES))
+def test_guest_store_invalidates_code(ram_type, engine):
+    image, labels = self_modifying()
+    machine = quiet_machine(ram_type, engine)
+    machine.load_binary(image, BASE)
+    assert run_until(machine, pc=labels["halt"]) == "test"
+    assert machine.cpu.integer_registers[A0] == 101
+
+def test_cached_decoding_is_reused():
+    image, labels = self_modifying()
+    machine = quiet_machine("BUFFER")
+    machine.load_binary(image, BASE)
+    cpu = machine.cpu
+    cpu.registers["pc"] = PATCH
+    op = cpu.fetch_instruction()
+    assert cpu.fetch_instruction() is op
+    assert cpu.decode_cache.lookup(PATCH) is op
+
+def test_host_write_drops_only_its_page():
+    machine = quiet_machine("BUFFER")
+    machine.load_binary(bytes(4) * 0x800, BASE) # two pages of nothing
+    cpu, bus = machine.cpu, machine.bus
+    for pc in (BASE, BASE + 0x1000):
+        bus.write_u32(pc, ADDI_A0_100)
+        cpu.registers["pc"] = pc
+        cpu.fetch_instruction()
+    bus.write(BASE + 0x1800, b"\x13\0\0\0") # nop, elsewhere in the second page
+    assert cpu.decode_cache.lookup(BASE) is not None
+    assert cpu.decode_cache.lookup(BASE + 0x1000) is None
+    bus.load_bytes(BASE, encode_i(0b0010011, A0, 0, A0, -1).to_bytes(4, "little"))
+    cpu.registers["pc"] = BASE
+    assert cpu.fetch_instruction().imm == -1
+
+def test_page_straddling_instruction_is_not_cached():
+    # a write to the second page could not drop it from the first one's table
+    machine = quiet_machine("BUFFER")
+    machine.load_binary(ADDI_A0_100.to_bytes(4, "little"), BASE + 0xFFE)
+    cpu, bus = machine.cpu, machine.bus
+    cpu.registers["pc"] = BASE + 0xFFE
+    assert cpu.fetch_instruction().imm == 100
+    assert cpu.decode_cache.lookup(BASE + 0xFFE) is None
+    bus.write_u16(BASE + 0x1000, encode_i(0b0010011, A0, 0, A0, 7) >> 16)
+    assert cpu.fetch_instruction().imm == 7
@@ -0,0 +1,92 @@
+import pytest
+
+import devices.cpu as cpu_module
+from benchmarks import Assembler
+from conftest import RAM_BASE as BASE, quiet_machine, run_until
+
+A0, T0 = 10, 5
+DATA = BASE + 0x1000
+ENGINES = ["interpreter", "translator", "jit"]
+
+def counter(engine):
+    """Counts up a0 and stores it to DATA, three instructions a round after
+    two to set up."""
+    a = Assembler(BASE)
+    a.li(A0, 0)
+    a.li(T0, DATA)
+    a.label("loop")
+    a.addi(A0, A0, 1)
+    a.sw(A0, 0, T0)
+    a.j("loop")
+    machine = quiet_machine("BUFFER", engine)
+    machine.load_binary(a.assemble(), BASE)
+    return machine, a.labels["loop"]
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_counts_are_exact(engine):
+    machine, loop = counter(engine)
+    seen = []
+    hooks = machine.cpu.hooks
+    hooks.at_count(1000, lambda cpu: seen.append(("at", cpu.instret)))
+    hooks.at_count(10, lambda cpu: seen.append(("at", cpu.instret)))
+    hooks.every(300, lambda cpu: seen.append(("every", cpu.instret)))
+    run_until(machine, instret=1000)
+    assert seen == [("every", 0), ("at", 10), ("every", 300), ("every", 600), ("every", 900), ("at", 1000)]
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_breakpoints_fire_before_the_instruction(engine):
+    machine, loop = counter(engine)
+    seen = []
+    machine.cpu.hooks.at_pc(loop + 4, lambda cpu: seen.append((cpu.integer_registers[A0], cpu.memory.read_u32(DATA))))
+    run_until(machine, instret=2 + 3 * 4)
+    # a0 is already incremented, the store is still to come
+    assert seen == [(1, 0), (2, 1), (3, 2), (4, 3)]
+
+def test_same_count_in_registration_order():
+    machine, loop = counter("interpreter")
+    seen = []
+    for name in "abc":
+        machine.cpu.hooks.at_count(50, lambda cpu, name=name: seen.append(name))
+    run_until(machine, instret=60)
+    assert seen == ["a", "b", "c"]
+
+def test_callbacks_can_schedule_for_now():
+    machine, loop = counter("interpreter")
+    seen = []
+    hooks = machine.cpu.hooks
+    hooks.at_count(20, lambda cpu: hooks.at_count(cpu.instret, lambda cpu: seen.append(cpu.instret)))
+    run_until(machine, instret=30)
+    assert seen == [20]
+
+def test_removed_callbacks_stop():
+    machine, loop = counter("translator")
+    seen = []
+    callback = lambda cpu: seen.append(cpu.instret)
+    hooks = machine.cpu.hooks
+    hooks.every(10, callback)
+    hooks.at_pc(loop, callback)
+    hooks.at_count(50, lambda cpu: hooks.remove(callback))
+    run_until(machine, instret=100)
+    assert seen and max(seen) <= 50
+    assert hooks.breakpoints == {} and len(hooks.counts) == 0
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_write_hooks_fire_before_the_store(engine):
+    machine, loop = counter(engine)
+    seen = []
+    machine.cpu.hooks.on_write(DATA + 2, DATA + 2, lambda cpu, address, length:
+                               seen.append((address, length, cpu.memory.read_u32(DATA))))
+    machine.cpu.hooks.on_write(DATA + 4, DATA + 7, lambda cpu, address, length: seen.append("other"))
+    run_until(machine, instret=2 + 3 * 3) # li a0; lui t0; three rounds
+    assert seen == [(DATA, 4, 0), (DATA, 4, 1), (DATA, 4, 2)]
+
+def test_runs_in_batches_between_events(monkeypatch):
+    machine, loop = counter("jit")
+    jit = machine.cpu.jit
+    calls = []
+    run = jit.run
+    monkeypatch.setattr(jit, "run", lambda *arguments: calls.append(arguments[0]) or run(*arguments))
+    machine.cpu.hooks.at_count(25000, lambda cpu: None)
+    run_until(machine, instret=50000)
+    # the numba core is only stopped at the event and the budget
+    assert calls == [cpu_module.JIT_BUDGET] * 2 + [5000] + [cpu_module.JIT_BUDGET] * 2 + [5000]
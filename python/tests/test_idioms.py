@@ -0,0 +1,136 @@
+import pytest
+
+from benchmarks import Assembler
+from conftest import RAM_BASE as BASE, quiet_machine
+from utils import idioms
+from utils.symbols import SymbolIndex
+
+DATA, STRING, BSS, BSS_END, STACK = BASE + 0x10000, BASE + 0x11000, BASE + 0x20000, BASE + 0x21000, BASE + 0x40000
+TEXT = b"hello, world\0"
+RA, SP, A0, A1, A2, T0, T1, T2, S0 = 1, 2, 10, 11, 12, 5, 6, 7, 8
+MEMORY = bytes([0x5A]) * 100 + bytes(0x200 - 100) + bytes([0x5A]) * 100 + bytes(0x100 - 100) # DATA after the calls
+
+def program(memset_length=(A0, A2)):
+    """Clears .bss the way head.S does, then calls plain byte-loop memset,
+    memcpy and strlen and stops at halt with the length in s0."""
+    a = Assembler(BASE)
+    a.label("_start")
+    a.li(SP, STACK)
+    a.li(13, BSS)
+    a.li(14, BSS_END)
+    a.label("clear_bss")
+    a.sw(0, 0, 13)
+    a.addi(13, 13, 4)
+    a.bltu(13, 14, "clear_bss")
+    a.label("clear_bss_done")
+    a.li(A0, DATA)
+    a.li(A1, 0x5A)
+    a.li(A2, 100)
+    a.jal(RA, "memset")
+    a.li(A0, DATA + 0x200)
+    a.li(A1, DATA)
+    a.li(A2, 100)
+    a.jal(RA, "memcpy")
+    a.li(A0, STRING)
+    a.jal(RA, "strlen")
+    a.addi(S0, A0, 0)
+    a.label("halt")
+    a.j("halt")
+
+    a.label("memset")
+    a.addi(T0, A0, 0)
+    a.add(T1, *memset_length)
+    a.label("memset_loop")
+    a.beq(T0, T1, "memset_done")
+    a.sb(A1, 0, T0)
+    a.addi(T0, T0, 1)
+    a.j("memset_loop")
+    a.label("memset_done")
+    a.jalr(0, RA)
+
+    a.label("memcpy")
+    a.addi(T0, A0, 0)
+    a.add(T1, A0, A2)
+    a.label("memcpy_loop")
+    a.beq(T0, T1, "memcpy_done")
+    a.lbu(T2, 0, A1)
+    a.sb(T2, 0, T0)
+    a.addi(T0, T0, 1)
+    a.addi(A1, A1, 1)
+    a.j("memcpy_loop")
+    a.label("memcpy_done")
+    a.jalr(0, RA)
+
+    a.label("strlen")
+    a.addi(T0, A0, 0)
+    a.label("strlen_loop")
+    a.lbu(T1, 0, T0)
+    a.beq(T1, 0, "strlen_done")
+    a.addi(T0, T0, 1)
+    a.j("strlen_loop")
+    a.label("strlen_done")
+    a.sub(A0, T0, A0)
+    a.jalr(0, RA)
+    return a.assemble(), a.labels
+
+def guest(engine="interpreter", **variant):
+    image, labels = program(**variant)
+    machine = quiet_machine("BUFFER", engine)
+    machine.load_binary(image, BASE)
+    machine.bus.load_bytes(STRING, TEXT)
+    machine.bus.fill(BSS, 0xEE, BSS_END - BSS)
+    machine.cpu.registers["pc"] = BASE
+    machine.cpu.symbols = SymbolIndex([(address, "T", name) for name, address in labels.items()])
+    return machine, labels["halt"]
+
+def run(machine, halt):
+    machine.cpu.hooks.at_pc(halt, lambda cpu: cpu.request_exit("halt"))
+    assert machine.cpu.run() == "halt"
+    return machine
+
+def outcome(machine):
+    bus = machine.bus
+    return bus.read(DATA, 0x300), bus.read(BSS, BSS_END - BSS), machine.cpu.integer_registers[S0]
+
+def test_zero_loop_is_recognised():
+    machine, halt = guest()
+    accelerated = idioms.install(machine.cpu)
+    assert {name for name, routine, continue_at in accelerated.entries.values()} == \
+        {"memset", "memcpy", "strlen", "clear_bss"}
+    symbols = machine.cpu.symbols
+    assert accelerated._zero_loop(symbols.address_of("clear_bss"), symbols.address_of("clear_bss_done")) == (13, 14)
+
+def test_other_loop_is_left_alone():
+    machine, halt = guest()
+    start = machine.cpu.symbols.address_of("clear_bss")
+    step = machine.bus.read_u32(start + 4)
+    machine.bus.write_u32(start + 4, (step & 0xFFFFF) | (8 << 20)) # addi x13, x13, 8
+    accelerated = idioms.install(machine.cpu)
+    assert "clear_bss" not in {name for name, routine, continue_at in accelerated.entries.values()}
+
+@pytest.mark.parametrize("engine", ["interpreter", "translator"])
+def test_verify_agrees_with_the_guest(engine):
+    machine, halt = guest(engine)
+    accelerated = idioms.install(machine.cpu, verify=True)
+    run(machine, halt)
+    assert accelerated.checked == 4
+    assert outcome(machine) == outcome(run(*guest(engine)))
+
+def test_verify_catches_a_difference():
+    machine, halt = guest(memset_length=(A0, A1)) # sets a1 = 0x5A bytes instead of a2
+    idioms.install(machine.cpu, verify=True)
+    with pytest.raises(ValueError, match="Accelerated memset disagrees"):
+        run(machine, halt)
+
+@pytest.mark.parametrize("engine", ["interpreter", "translator"])
+def test_accelerated_run_matches(engine):
+    machine, halt = guest(engine)
+    accelerated = idioms.install(machine.cpu)
+    run(machine, halt)
+    reference = run(*guest(engine))
+    assert outcome(machine) == outcome(reference) == (
+        MEMORY, bytes(BSS_END - BSS), len(TEXT) - 1)
+    assert {name: stats[:3] for name, stats in accelerated.stats.items()} == {
+        "memset": [1, 100, 0], "memcpy": [1, 100, 0], "strlen": [1, len(TEXT), 0], "clear_bss": [1, BSS_END - BSS, 0]}
+    # the skipped instructions are estimated, not counted, but should be near
+    assert abs(machine.cpu.instret - reference.cpu.instret) < reference.cpu.instret // 2
@@ -0,0 +1,65 @@
+import pytest
+
+from devices.cpu import isa
+
+MNEMONICS = [row[0] for row in isa.ISA]
+
+def encode(mnemonic, rd=1, rs1=2, rs2=3):
+    """A word the table decodes as mnemonic: the row's fixed fields and the
+    given registers, the other fields 0."""
+    _, _, opcode, funct3, funct7, _ = next(row for row in isa.ISA if row[0] == mnemonic)
+    if opcode == isa.SYSTEM and funct3 == 0:
+        return (funct7 << 20) | opcode
+    if opcode == isa.AMO:
+        funct7 <<= 2 # aq and rl clear
+    return ((funct7 or 0) << 25) | (rs2 << 20) | (rs1 << 15) | ((funct3 or 0) << 12) | (rd << 7) | opcode
+
+def test_mnemonics_are_unique():
+    assert len(set(MNEMONICS)) == len(MNEMONICS)
+    assert set(isa.MNEMONICS) == set(MNEMONICS)
+
+@pytest.mark.parametrize("mnemonic", MNEMONICS)
+def test_lookup(mnemonic):
+    instruction = isa.lookup(encode(mnemonic))
+    assert instruction is isa.MNEMONICS[mnemonic]
+    assert instruction.handler is not None
+
+@pytest.mark.parametrize("mnemonic", MNEMONICS)
+def test_disassemble(mnemonic):
+    assert isa.disassemble(encode(mnemonic), 0x80000000).split(" ")[0] == mnemonic
+
+@pytest.mark.parametrize("word, text", [
+    (0x00150513, "addi x10, x10, 1"),
+    (0xFFF00513, "addi x10, x0, -1"),
+    (0x40B50533, "sub x10, x10, x11"),
+    (0x0005A503, "lw x10, 0(x11)"),
+    (0x00A5A223, "sw x10, 4(x11)"),
+    (0x00001537, "lui x10, 0x1"),
+    (0x41F55513, "srai x10, x10, 31"),
+    (0x00008067, "jalr x0, 0(x1)"),
+    (0x30529073, "csrrw x0, 0x305, x5"),
+    (0x3007D073, "csrrwi x0, 0x300, 15"),
+    (0x0C05A52F, "amoswap.w x10, x0, (x11)"),
+    (0x1005252F, "lr.w x10, (x10)"),
+    (0x30200073, "mret"),
+    (0x10500073, "wfi"),
+])
+def test_disassemble_operands(word, text):
+    assert isa.disassemble(word) == text
+
+def test_branch_targets():
+    assert isa.disassemble(0xFE050EE3, 0x80000010) == "beq x10, x0, 8000000c"
+    assert isa.disassemble(0xFE050EE3) == "beq x10, x0, pc-4"
+    assert isa.disassemble(0x0080006F, 0x80000000) == "jal x0, 80000008"
+
+@pytest.mark.parametrize("word", [
+    0xFFFFFFFF, # all ones
+    0x0000000B, # custom-0
+    0x001000F3, # ebreak with rd set
+    (0x05 << 27) | 0x0005A52F, # AMO funct5 0x05
+    (0x02 << 25) | 0x00B50533, # OP funct7 0x02
+    0x0005B503, # ld, RV64 only
+])
+def test_unimplemented(word):
+    assert isa.lookup(word) is None
+    assert isa.disassemble(word) == f".word {word:#010x}"
@@ -0,0 +1,38 @@
+from benchmarks.workloads import SYNTHETIC, CODE_BASE, DATA_BASE
+from conftest import quiet_machine
+
+def workload_machine(workload, engine):
+    machine = quiet_machine("BUFFER", engine)
+    machine.load_binary(SYNTHETIC[workload](), CODE_BASE)
+    return machine
+
+def run_to(machine, instret):
+    machine.cpu.hooks.at_count(instret, lambda cpu: cpu.request_exit("test"))
+    assert machine.cpu.run() == "test"
+
+def test_fallbacks_do_not_reenter_the_core_every_time():
+    # five of the seven instructions of the csr loop are left to the
+    # interpreter; calling into numba for the two others between them made
+    # the jit slower than interpreting everything
+    machine = workload_machine("csr", "jit")
+    jit = machine.cpu.jit
+    calls = []
+    run = jit.run
+    jit.run = lambda *arguments: calls.append(None) or run(*arguments)
+    run_to(machine, 20000)
+    assert len(calls) < 20000 // 32
+    reference = workload_machine("csr", "interpreter")
+    run_to(reference, 20000)
+    assert machine.cpu.integer_registers[:32] == reference.cpu.integer_registers[:32]
+
+def test_write_hooks_see_exact_stores():
+    seen = {}
+    for engine in ("interpreter", "jit"):
+        machine = workload_machine("loadstore", engine)
+        writes = seen[engine] = []
+        machine.cpu.hooks.on_write(DATA_BASE + 0x100, DATA_BASE + 0x103,
+                                   lambda cpu, address, length: writes.append((address, length, cpu.instret)))
+        run_to(machine, 50000)
+    assert seen["jit"] == seen["interpreter"]
+    assert seen["jit"] and all(DATA_BASE + 0xFD <= address <= DATA_BASE + 0x103 and length <= 4
+                               for address, length, instret in seen["jit"])
@@ -0,0 +1,26 @@
+import pytest
+
+from benchmarks.workloads import SYNTHETIC, CODE_BASE
+from conftest import quiet_machine
+from utils.lockstep import Lockstep
+
+def builder(workload):
+    def build(engine):
+        machine = quiet_machine("BUFFER", engine) # the jit needs flat RAM
+        machine.load_binary(SYNTHETIC[workload](), CODE_BASE)
+        return machine
+    return build
+
+@pytest.mark.parametrize("engine", ["translator", "jit"])
+@pytest.mark.parametrize("workload", sorted(SYNTHETIC))
+def test_engines_agree(workload, engine):
+    lockstep = Lockstep(builder(workload), ["interpreter", engine], interval=1000)
+    divergence = lockstep.run(20000)
+    assert divergence is None, str(divergence)
+    assert lockstep.instret >= 20000
+
+@pytest.mark.parametrize("workload", ["amo", "csr"])
+def test_translator_agrees_every_block(workload):
+    lockstep = Lockstep(builder(workload), ["translator", "interpreter"], interval="block")
+    divergence = lockstep.run(5000)
+    assert divergence is None, str(divergence)
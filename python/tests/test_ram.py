@@ -0,0 +1,108 @@
+import pytest
+
+from devices.memory import AddressBus, RAM_DICT, RAM_PAGE_SIZE
+from machine import RAM_TYPES
+
+def test_sparse_reads():
+    ram = RAM_DICT(1 << 30) # a GiB costs nothing until written
+    assert ram.memory == {}
+    assert ram.read(0x12345, 16) == bytes(16)
+    assert ram.read(RAM_PAGE_SIZE - 8, 16) == bytes(16)
+    assert (ram.read_u8(5), ram.read_u16(RAM_PAGE_SIZE - 1), ram.read_u32(RAM_PAGE_SIZE - 2)) == (0, 0, 0)
+    assert ram.memory == {}
+
+def test_pages_are_allocated_on_first_non_zero_write():
+    ram = RAM_DICT(1 << 20)
+    ram.write(0x100, bytes(64))
+    ram.fill(0x2000, 0, RAM_PAGE_SIZE)
+    assert ram.memory == {} # zeroes need no page
+    ram.write(RAM_PAGE_SIZE - 2, b"\1\2\3\4")
+    assert sorted(ram.memory) == [0, 1]
+    assert ram.read_u32(RAM_PAGE_SIZE - 2) == 0x04030201
+    ram.write_u8(0x5003, 0xAA)
+    assert sorted(ram.memory) == [0, 1, 5]
+    assert ram.read(0x5000, 4) == b"\0\0\0\xaa"
+    assert all(len(page) == RAM_PAGE_SIZE for page in ram.memory.values())
+
+def test_mapped_image_is_copied_on_write():
+    image = bytes(range(256)) * 48 # three pages
+    ram = RAM_DICT(1 << 20)
+    ram.map_image(0x4000, image)
+    assert sorted(ram.memory) == [4, 5, 6]
+    assert all(type(page) is memoryview and page.readonly for page in ram.memory.values())
+    assert ram.read(0x4000, len(image)) == image
+    ram.write_u32(0x5010, 0xDEADBEEF)
+    assert type(ram.memory[5]) is bytearray # only the written page got its own copy
+    assert type(ram.memory[4]) is memoryview and type(ram.memory[6]) is memoryview
+    assert ram.read_u32(0x5010) == 0xDEADBEEF
+    assert image[0x1010:0x1014] == bytes([0x10, 0x11, 0x12, 0x13]) # the image is left alone
+    ram.clear()
+    assert ram.memory == {} and ram.read(0x4000, 16) == bytes(16)
+
+def test_unaligned_image_is_written():
+    ram = RAM_DICT(1 << 20)
+    ram.map_image(0x10, b"\xff" * RAM_PAGE_SIZE)
+    assert all(type(page) is bytearray for page in ram.memory.values())
+    assert ram.read(0x0, 0x12) == bytes(0x10) + b"\xff\xff"
+    assert ram.read(RAM_PAGE_SIZE, 0x12) == b"\xff" * 0x10 + b"\0\0"
+
+@pytest.mark.parametrize("access", [
+    lambda ram: ram.read(RAM_PAGE_SIZE * 4 - 2, 4),
+    lambda ram: ram.write(RAM_PAGE_SIZE * 4, b"\1"),
+    lambda ram: ram.read_u8(RAM_PAGE_SIZE * 4),
+    lambda ram: ram.write_u32(-4, 1),
+])
+def test_out_of_range(access):
+    with pytest.raises(MemoryError):
+        access(RAM_DICT(RAM_PAGE_SIZE * 4))
+
+def tracked(ram_type):
+    ram = RAM_TYPES[ram_type](RAM_PAGE_SIZE * 16)
+    return ram, AddressBus([[0x80000000, 0x80000000 + ram.size - 1, ram]])
+
+@pytest.mark.parametrize("ram_type", sorted(RAM_TYPES))
+def test_dirty_pages(ram_type):
+    ram, bus = tracked(ram_type)
+    assert list(ram.dirty_pages()) == []
+    bus.write_u32(0x80000010, 1)
+    bus.write_u8(0x80003000, 1)
+    bus.write(0x80004FFE, b"\1\2\3\4") # two pages
+    bus.fill(0x80008000, 0, RAM_PAGE_SIZE) # zeroes count as written too
+    bus.copy_within(0x8000A000, 0x80000000, 16)
+    assert list(ram.dirty_pages()) == [page * RAM_PAGE_SIZE for page in (0, 3, 4, 5, 8, 10)]
+    assert list(ram.dirty_ranges()) == [(0, RAM_PAGE_SIZE), (0x3000, 3 * RAM_PAGE_SIZE),
+                                        (0x8000, RAM_PAGE_SIZE), (0xA000, RAM_PAGE_SIZE)]
+    assert ram.is_dirty(0x4FFF) and not ram.is_dirty(0x1000)
+
+    ram.clear_dirty()
+    assert list(ram.dirty_pages()) == []
+    bus.write_u16(0x8000F000, 1)
+    assert list(ram.dirty_pages()) == [0xF000]
+    # touched keeps everything written since clear(), whatever clear_dirty did
+    assert list(ram.touched_pages()) == [page * RAM_PAGE_SIZE for page in (0, 3, 4, 5, 8, 10, 15)]
+    ram.clear()
+    assert list(ram.dirty_pages()) == list(ram.touched_pages()) == []
+
+@pytest.mark.parametrize("ram_type", sorted(RAM_TYPES))
+def test_map_image_marks_pages(ram_type):
+    ram, bus = tracked(ram_type)
+    bus.map_image(0x80002000, bytes(range(256)) * 20) # a page and a quarter
+    assert list(ram.dirty_pages()) == [0x2000, 0x3000]
+
+@pytest.mark.parametrize("ram_type", sorted(RAM_TYPES))
+def test_writes_to_executed_pages_reach_the_code_listeners(ram_type):
+    ram, bus = tracked(ram_type)
+    heard = []
+    bus.code_listeners.append(lambda address, length: heard.append((address, length)))
+    bus.mark_executed(0x80001234)
+    bus.mark_executed(0x80002000)
+    assert list(ram.executed_pages()) == [0x1000, 0x2000]
+    assert ram.is_executed(0x1FFF) and not ram.is_executed(0x3000)
+    bus.write_u32(0x80003000, 1) # a data page: nothing to hear
+    bus.write_u32(0x80001000, 1)
+    bus.fill(0x80001FF0, 0, 0x20) # the pages of the whole write are reported
+    assert heard == [(0x80001000, RAM_PAGE_SIZE), (0x80001000, 2 * RAM_PAGE_SIZE)]
+    assert list(ram.executed_pages()) == [] # each page is told once, until it is marked again
+    bus.mark_executed(0x80005000)
+    ram.clear_executed()
+    assert heard[-1] == (0x80000000, ram.size) and list(ram.executed_pages()) == []
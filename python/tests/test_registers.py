@@ -0,0 +1,57 @@
+from array import array
+
+import pytest
+
+from benchmarks import Assembler
+from conftest import RAM_BASE as BASE, quiet_machine, run_until
+from machine import ENGINES
+
+A0, A1, A2, A3, A4, A5 = 10, 11, 12, 13, 14, 15
+
+def run_program(engine, emit):
+    a = Assembler(BASE)
+    emit(a)
+    a.label("halt")
+    a.j("halt")
+    machine = quiet_machine("BUFFER", engine)
+    machine.load_binary(a.assemble(), BASE)
+    assert run_until(machine, pc=a.labels["halt"]) == "test"
+    return machine.cpu
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_x0_stays_zero(engine):
+    def emit(a):
+        a.addi(0, 0, 5)
+        a.lui(0, 0x12345000)
+        a.li(A0, BASE)
+        a.lw(0, 0, A0)
+        a.add(0, A0, A0)
+        a.mul(0, A0, A0)
+        a.jal(0, "next")
+        a.label("next")
+        a.addi(A1, 0, 7) # reads x0
+    cpu = run_program(engine, emit)
+    assert cpu.integer_registers[0] == 0
+    assert cpu.integer_registers[A1] == 7
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_results_wrap_to_32_bits(engine):
+    def emit(a):
+        a.li(A0, 0xFFFFFFFF)
+        a.addi(A1, A0, 1)
+        a.sub(A2, 0, A0)
+        a.li(A3, 0x10000)
+        a.mul(A3, A3, A3)
+        a.slli(A4, A0, 31)
+        a.addi(A5, 0, -1)
+    cpu = run_program(engine, emit)
+    x = cpu.integer_registers
+    assert (x[A1], x[A2], x[A3], x[A4], x[A5]) == (0, 1, 0, 0x80000000, 0xFFFFFFFF)
+
+def test_register_file():
+    cpu = quiet_machine().cpu
+    assert isinstance(cpu.integer_registers, array) and cpu.integer_registers.typecode == 'I'
+    cpu.int_write(0, 5)
+    cpu.int_write(A0, -1)
+    cpu.int_write(A1, 1 << 32 | 3)
+    assert (cpu.int_read(0), cpu.int_read(A0), cpu.int_read(A1)) == (0, 0xFFFFFFFF, 3)
@@ -0,0 +1,64 @@
+import pytest
+
+from devices.cpu import rvc
+from devices.cpu.isa import disassemble
+
+# (halfword, 32-bit expansion) pairs as the GNU assembler encodes them
+VECTORS = [
+    (0x0001, 0x00000013, "c.nop"),
+    (0x0505, 0x00150513, "c.addi a0, 1"),
+    (0x1141, 0xFF010113, "c.addi sp, -16"),
+    (0x557D, 0xFFF00513, "c.li a0, -1"),
+    (0x6505, 0x00001537, "c.lui a0, 1"),
+    (0x7179, 0xFD010113, "c.addi16sp sp, -48"),
+    (0x1800, 0x03010413, "c.addi4spn s0, sp, 48"),
+    (0x4188, 0x0005A503, "c.lw a0, 0(a1)"),
+    (0xC188, 0x00A5A023, "c.sw a0, 0(a1)"),
+    (0x40B2, 0x00C12083, "c.lwsp ra, 12(sp)"),
+    (0xC606, 0x00112623, "c.swsp ra, 12(sp)"),
+    (0x852E, 0x00B00533, "c.mv a0, a1"),
+    (0x952E, 0x00B50533, "c.add a0, a1"),
+    (0x8C05, 0x40940433, "c.sub s0, s1"),
+    (0x8D6D, 0x00B57533, "c.and a0, a1"),
+    (0x8005, 0x00145413, "c.srli s0, 1"),
+    (0x050A, 0x00251513, "c.slli a0, 2"),
+    (0x8082, 0x00008067, "c.jr ra"),
+    (0x9502, 0x000500E7, "c.jalr a0"),
+    (0xA001, 0x0000006F, "c.j 0"),
+    (0xBFFD, 0xFFFFF06F, "c.j -2"),
+    (0x2001, 0x000000EF, "c.jal 0"),
+    (0xC101, 0x00050063, "c.beqz a0, 0"),
+    (0x9002, 0x00100073, "c.ebreak"),
+]
+
+# encodings with no RV32IMA equivalent
+ILLEGAL = [
+    (0x0000, "all zeroes"),
+    (0x0010, "c.addi4spn with a zero immediate"),
+    (0x6501, "c.lui with a zero immediate"),
+    (0x6101, "c.addi16sp with a zero immediate"),
+    (0x1502, "c.slli with shamt[5] set"),
+    (0x4002, "c.lwsp to x0"),
+    (0x8002, "c.jr x0"),
+    (0x2000, "c.fld"),
+    (0x9D05, "c.subw"),
+]
+
+@pytest.mark.parametrize("half, word, text", VECTORS, ids=[text for _, _, text in VECTORS])
+def test_expand(half, word, text):
+    assert rvc.expand(half) == word
+
+@pytest.mark.parametrize("half, why", ILLEGAL, ids=[why for _, why in ILLEGAL])
+def test_expand_illegal(half, why):
+    assert rvc.expand(half) == 0
+
+def test_table_matches_expand():
+    table = rvc.expansion_table()
+    assert len(table) == 1 << 16
+    for half, word, _ in VECTORS:
+        assert table[half] == word
+    assert all(table[half] == 0 for half in range(0b11, 1 << 16, 4)) # quadrant 3 is 32-bit
+
+def test_disassemble_compressed():
+    assert disassemble(0x8082) == "jalr x0, 0(x1)"
+    assert disassemble(0x0000) == ".half 0x0000"
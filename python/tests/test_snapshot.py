@@ -0,0 +1,53 @@
+import pytest
+
+from conftest import RAM_BASE as BASE, quiet_machine
+from machine import RAM_TYPES
+from utils import snapshot
+
+IMAGE = bytes(range(256)) * 64 # 16 KiB, no zero pages
+
+def loaded_machine(ram_type):
+    machine = quiet_machine(ram_type)
+    machine.load_binary(IMAGE, BASE)
+    return machine
+
+@pytest.mark.parametrize("ram_type", sorted(RAM_TYPES))
+def test_zero_filled_image_page_survives_round_trip(tmp_path, ram_type):
+    machine = loaded_machine(ram_type)
+    machine.bus.fill(BASE + 0x1000, 0, 4096)
+    path = tmp_path / "zeroed.rvsnap"
+    assert snapshot.save(path, machine.cpu, machine.bus) == 1
+    restored = loaded_machine(ram_type)
+    snapshot.restore(path, restored.cpu, restored.bus)
+    assert restored.bus.read(BASE + 0x1000, 4096) == bytes(4096)
+    assert restored.bus.read(BASE, 8) == IMAGE[:8]
+
+def test_freed_image_page_is_saved(tmp_path):
+    # a RAM that drops a page it no longer needs still reads it as zeroes,
+    # the snapshot has to store that against the image underneath
+    machine = loaded_machine("DICT")
+    machine.ram.written(0x2000, 4096)
+    del machine.ram.memory[2]
+    path = tmp_path / "freed.rvsnap"
+    assert snapshot.save(path, machine.cpu, machine.bus) == 1
+    restored = loaded_machine("DICT")
+    snapshot.restore(path, restored.cpu, restored.bus)
+    assert restored.bus.read(BASE + 0x2000, 4096) == bytes(4096)
+
+@pytest.mark.parametrize("ram_type", sorted(RAM_TYPES))
+def test_round_trip(tmp_path, ram_type):
+    machine = loaded_machine(ram_type)
+    bus, cpu = machine.bus, machine.cpu
+    bus.write_u32(BASE + 0x10, 0xDEADBEEF)
+    bus.load_bytes(BASE + 0x7FF8, b"spans two pages")
+    bus.write_u32(BASE + 0x100000, 0x12345678)
+    cpu.integer_registers[5] = 0xCAFE
+    cpu.registers["pc"] = BASE + 0x40
+    path = tmp_path / "machine.rvsnap"
+    assert snapshot.save(path, cpu, bus) == 4
+    restored = loaded_machine(ram_type)
+    assert snapshot.restore(path, restored.cpu, restored.bus) == 4
+    assert restored.bus.read(0x80000000, 0x101000) == bus.read(0x80000000, 0x101000)
+    assert restored.cpu.integer_registers == cpu.integer_registers
+    assert restored.cpu.registers["pc"] == cpu.registers["pc"]
+    assert restored.cpu.instret == cpu.instret
@@ -0,0 +1,56 @@
+import pytest
+
+from benchmarks import Assembler
+from conftest import RAM_BASE as BASE, quiet_machine, small_config
+from devices.syscon import POWEROFF, REBOOT
+
+SYSCON = small_config.SYSCON_RANGE[0]
+COUNTER = BASE + 0x1000
+LENGTH = 8 # instructions up to and including the syscon store
+T0, T1 = 5, 6
+
+def guest(engine, value, store="sw"):
+    """Bumps the word at COUNTER, then writes value to the syscon."""
+    a = Assembler(BASE)
+    a.li(T0, COUNTER)
+    a.lw(T1, 0, T0)
+    a.addi(T1, T1, 1)
+    a.sw(T1, 0, T0)
+    a.li(T0, SYSCON)
+    a.li(T1, value)
+    getattr(a, store)(T1, 0, T0)
+    a.label("halt")
+    a.j("halt")
+    machine = quiet_machine("BUFFER", engine)
+    machine.load_binary(a.assemble(), BASE)
+    machine.cpu.hooks.at_count(10000, lambda cpu: cpu.request_exit("limit"))
+    return machine
+
+@pytest.mark.parametrize("engine", ["interpreter", "translator", "jit"])
+@pytest.mark.parametrize("store", ["sw", "sh"])
+def test_poweroff(engine, store):
+    machine = guest(engine, POWEROFF, store)
+    assert machine.run() == "poweroff"
+    assert machine.cpu.instret == LENGTH # the store is the last instruction to retire
+    assert machine.syscon.read(0, 4) == bytes(4)
+
+def test_other_values_are_ignored():
+    machine = guest("interpreter", 0x1234)
+    assert machine.run() == "limit"
+
+def test_reboot():
+    machine = guest("interpreter", REBOOT)
+    boots = []
+    machine.cpu.hooks.at_pc(BASE, lambda cpu: boots.append(cpu.instret))
+    assert machine.cpu.run() == "reboot" # CPU.run leaves the reboot to its caller
+    assert machine.bus.read_u32(COUNTER) == 1
+    machine.cpu.reset()
+    assert machine.run(max_reboots=1) == "reboot"
+    assert boots == [0, LENGTH, 2 * LENGTH]
+    assert machine.cpu.instret == 3 * LENGTH # instret keeps counting over reboots
+    assert machine.bus.read_u32(COUNTER) == 1 # RAM went back to the image every time
+
+def test_reboot_without_limit_goes_on():
+    machine = guest("interpreter", REBOOT)
+    assert machine.run() == "limit"
+    assert machine.bus.read_u32(COUNTER) == 1
@@ -0,0 +1,133 @@
+import atexit
+import os
+import select
+import socket
+import sys
+import threading
+import time
+from collections import deque
+
+FLUSH_INTERVAL = 0.02 # seconds the writer thread lets output pile up before writing it
+READ_SIZE = 4096
+
+class HostConsole:
+    """Host side of the guest consoles (UART, hvc0).
+
+    Guest output is appended to a buffer and written to `output` in batches by
+    a background thread, so console-heavy guests do not pay a syscall per
+    character. Input is read by another thread from `source`:
+
+        None        no input
+        "stdin"     standard input, in cbreak mode if it is a terminal
+        "tcp:PORT"  the first client connecting to 127.0.0.1:PORT; output is
+                    sent to that client as well
+
+    and queued in `self.input` (a deque of byte values) for the UART to take."""
+    def __init__(self, source=None, output=None):
+        self.output = output if output is not None else sys.stdout.buffer
+        self.buffer = bytearray()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.closed = False
+        self.input = deque()
+        self.client = None
+        self.terminal = None # (fd, saved termios attributes) while stdin is in cbreak mode
+        self.writer = threading.Thread(target=self._write_loop, name="console-writer", daemon=True)
+        self.writer.start()
+        if source == "stdin":
+            self._open_stdin()
+        elif isinstance(source, str) and source.startswith("tcp:"):
+            self._open_socket(int(source[4:]))
+        elif source is not None:
+            raise ValueError(f"Unsupported console input: {source}")
+        atexit.register(self.close)
+
+    # output
+    def put(self, byte: int) -> None:
+        with self.lock:
+            self.buffer.append(byte)
+        if not self.wakeup.is_set():
+            self.wakeup.set()
+
+    def write(self, data: bytes) -> None:
+        with self.lock:
+            self.buffer += data
+        if not self.wakeup.is_set():
+            self.wakeup.set()
+
+    def flush(self) -> None:
+        """Writes out everything buffered so far, on the calling thread."""
+        with self.lock:
+            data, self.buffer = self.buffer, bytearray()
+        if data:
+            self._emit(data)
+
+    def _emit(self, data) -> None:
+        try:
+            self.output.write(data)
+            self.output.flush()
+        except (OSError, ValueError):
+            pass # the host closed its side, nothing sensible to do with the output
+        client = self.client
+        if client is not None:
+            try:
+                client.sendall(data)
+            except OSError:
+                self.client = None
+
+    def _write_loop(self) -> None:
+        while not self.closed:
+            self.wakeup.wait()
+            if self.closed: break
+            self.wakeup.clear()
+            time.sleep(FLUSH_INTERVAL) # let more output accumulate
+            self.flush()
+
+    def close(self) -> None:
+        if self.closed: return
+        self.closed = True
+        self.wakeup.set()
+        self.flush()
+        if self.terminal is not None:
+            import termios
+            fd, attributes = self.terminal
+            termios.tcsetattr(fd, termios.TCSADRAIN, attributes)
+            self.terminal = None
+
+    # input
+    def _open_stdin(self) -> None:
+        fd = sys.stdin.fileno()
+        if os.isatty(fd):
+            import termios, tty
+            self.terminal = (fd, termios.tcgetattr(fd))
+            tty.setcbreak(fd) # keystrokes go to the guest unbuffered and unechoed, ^C still works
+        threading.Thread(target=self._read_fd, args=(fd,), name="console-stdin", daemon=True).start()
+
+    def _read_fd(self, fd: int) -> None:
+        while not self.closed:
+            ready, _, _ = select.select([fd], [], [], 0.5)
+            if not ready: continue
+            data = os.read(fd, READ_SIZE)
+            if not data: return # EOF
+            self.input.extend(data)
+
+    def _open_socket(self, port: int) -> None:
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(("127.0.0.1", port))
+        server.listen(1)
+        threading.Thread(target=self._serve, args=(server,), name="console-socket", daemon=True).start()
+
+    def _serve(self, server) -> None:
+        while not self.closed:
+            client, _ = server.accept()
+            self.client = client
+            while True:
+                try:
+                    data = client.recv(READ_SIZE)
+                except OSError:
+                    data = b""
+                if not data: break
+                self.input.extend(data)
+            self.client = None
+            client.close()
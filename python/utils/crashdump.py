@@ -0,0 +1,208 @@
+import json
+import lzma
+import queue
+import struct
+import threading
+import zlib
+
+from devices.memory import RAM_PAGE_SIZE
+
+# Crash dump file layout: CRASHDUMP_MAGIC, u8 length + name of the codec, then
+# one compressed stream holding
+#   u32 header length, JSON header (reason, CPU state, CSRs, device state,
+#                      device map, trace ring)
+#   u32 address, u32 length, data   for every RAM page that is not all zeroes
+#   u32 0, u32 0                    end marker
+#   u32 page map length, JSON page map ([address, pages] runs of stored pages)
+# Unlike snapshots the pages are absolute, a dump restores into any machine
+# with the same device map, loaded or not.
+
+CRASHDUMP_MAGIC = b"RVDUMP1\n"
+CODECS = ("deflate", "lzma", "zstd")
+CHUNK_SIZE = 1 << 20 # bytes of page records handed to the compressor at once
+QUEUE_DEPTH = 4 # chunks waiting for the compressor, bounds the memory a dump takes
+
+_record = struct.Struct("<II")
+_length = struct.Struct("<I")
+_ZERO_PAGE = bytes(RAM_PAGE_SIZE)
+
+def _compressor(codec, level):
+    if codec == "deflate":
+        return zlib.compressobj(6 if level is None else level)
+    if codec == "lzma":
+        return lzma.LZMACompressor(preset=1 if level is None else level)
+    if codec == "zstd":
+        return _zstandard().ZstdCompressor(level=3 if level is None else level).compressobj()
+    raise ValueError(f"Unsupported crash dump codec: {codec}. Should be one of {list(CODECS)}")
+
+def _decompressor(codec):
+    if codec == "deflate": return zlib.decompressobj()
+    if codec == "lzma": return lzma.LZMADecompressor()
+    if codec == "zstd": return _zstandard().ZstdDecompressor().decompressobj()
+    raise ValueError(f"Unsupported crash dump codec: {codec}")
+
+def _zstandard():
+    try:
+        import zstandard
+    except ModuleNotFoundError:
+        raise ValueError("zstd crash dumps need the zstandard package") from None
+    return zstandard
+
+def _ram(bus):
+    return [(start, device) for start, end, device in bus.devices if hasattr(device, "pages")]
+
+class _CompressingWriter:
+    """Compresses and writes the chunks given to write() on a thread of its
+    own, so reading RAM and compressing it overlap."""
+    def __init__(self, file, codec, level):
+        self.file = file
+        self.compressor = _compressor(codec, level)
+        self.chunks = queue.Queue(QUEUE_DEPTH)
+        self.error = None
+        self.thread = threading.Thread(target=self._loop, name="crashdump-writer", daemon=True)
+        self.thread.start()
+
+    def _loop(self):
+        try:
+            while True:
+                chunk = self.chunks.get()
+                if chunk is None: break
+                self.file.write(self.compressor.compress(chunk))
+            self.file.write(self.compressor.flush())
+        except BaseException as e:
+            self.error = e
+            while self.chunks.get() is not None: pass # keep write() from blocking
+
+    def write(self, chunk) -> None:
+        self.chunks.put(bytes(chunk))
+
+    def close(self) -> None:
+        self.chunks.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+def write(path, cpu, bus, reason="", logger=None, trace_records=None, codec="deflate", level=None) -> int:
+    """Writes a crash dump of the machine to path: CPU and device state, the
+    last trace_records records of the logger's trace ring (all of them by
+    default) and every RAM page that is not all zeroes. Returns the amount of
+    pages stored."""
+    header = {
+        "reason": reason,
+        "cpu": cpu.get_state(),
+        "csrs": {name: cpu.csr_read(address) for address, name in cpu.register_ids.items()},
+        "devices": {str(i): device.get_state() for i, (start, end, device) in enumerate(bus.devices)
+                    if hasattr(device, "get_state")},
+        "device_map": bus.device_map(),
+        "trace": logger.tail(trace_records) if logger is not None else [],
+        "trace_dropped": logger.dropped if logger is not None else 0,
+    }
+    header = json.dumps(header).encode()
+    page_map = []
+    pages = 0
+    with open(path, "wb") as file:
+        file.write(CRASHDUMP_MAGIC)
+        file.write(bytes([len(codec)]) + codec.encode())
+        writer = _CompressingWriter(file, codec, level)
+        try:
+            writer.write(_length.pack(len(header)) + header)
+            chunk = bytearray()
+            for start, device in _ram(bus):
+                for offset, page in device.pages():
+                    data = page.tobytes() # copying first makes the zero test a memcmp
+                    if data == (_ZERO_PAGE if len(data) == RAM_PAGE_SIZE else bytes(len(data))): continue
+                    address = start + offset
+                    chunk += _record.pack(address, len(data))
+                    chunk += data
+                    if page_map and page_map[-1][0] + page_map[-1][1] * RAM_PAGE_SIZE == address:
+                        page_map[-1][1] += 1
+                    else:
+                        page_map.append([address, 1])
+                    pages += 1
+                    if len(chunk) >= CHUNK_SIZE:
+                        writer.write(chunk)
+                        chunk = bytearray()
+            chunk += _record.pack(0, 0)
+            page_map = json.dumps(page_map).encode()
+            writer.write(chunk + _length.pack(len(page_map)) + page_map)
+        finally:
+            writer.close()
+    return pages
+
+class _DecompressingReader:
+    def __init__(self, file, codec):
+        self.file = file
+        self.decompressor = _decompressor(codec)
+        self.buffer = b""
+        self.position = 0
+
+    def read(self, amount: int) -> bytes:
+        while len(self.buffer) - self.position < amount:
+            data = self.file.read(CHUNK_SIZE)
+            if not data:
+                raise ValueError("Crash dump is truncated")
+            self.buffer = self.buffer[self.position:] + self.decompressor.decompress(data)
+            self.position = 0
+        data = self.buffer[self.position:self.position+amount]
+        self.position += amount
+        return data
+
+class CrashDump:
+    """A crash dump read back by load(): the JSON header as self.header, the
+    stored pages as {address: bytes} in self.pages, the page map as
+    self.page_map."""
+    def __init__(self, header, pages, page_map):
+        self.header = header
+        self.pages = pages
+        self.page_map = page_map
+
+    def read(self, address: int, amount: int) -> bytes:
+        """Guest memory as it was at the crash, zeroes outside the stored pages."""
+        data = bytearray(amount)
+        done = 0
+        while done < amount:
+            offset = (address + done) % RAM_PAGE_SIZE
+            chunk = min(amount - done, RAM_PAGE_SIZE - offset)
+            page = self.pages.get(address + done - offset)
+            if page is not None:
+                data[done:done+chunk] = page[offset:offset+chunk].ljust(chunk, b"\0")
+            done += chunk
+        return bytes(data)
+
+    def read_u32(self, address: int) -> int:
+        return int.from_bytes(self.read(address, 4), 'little')
+
+    def restore(self, cpu, bus) -> int:
+        """Puts the dumped state into a live machine with the same device map:
+        RAM is cleared and refilled from the dump, CPU and devices get their
+        dumped state. Returns the amount of pages restored."""
+        if self.header["device_map"] != bus.device_map():
+            raise ValueError(f"Crash dump was taken with a different device map: {self.header['device_map']}")
+        for start, device in _ram(bus):
+            for listener in bus.write_listeners:
+                listener(start, device.size)
+            device.clear()
+        for address, page in self.pages.items():
+            bus.load_bytes(address, page)
+        cpu.set_state(self.header["cpu"])
+        for i, state in self.header["devices"].items():
+            bus.devices[int(i)][2].set_state(state)
+        return len(self.pages)
+
+def load(path) -> CrashDump:
+    """Reads a crash dump written by write()."""
+    with open(path, "rb") as file:
+        if file.read(len(CRASHDUMP_MAGIC)) != CRASHDUMP_MAGIC:
+            raise ValueError(f"{path} is not a crash dump")
+        codec = file.read(file.read(1)[0]).decode()
+        stream = _DecompressingReader(file, codec)
+        (length,) = _length.unpack(stream.read(_length.size))
+        header = json.loads(stream.read(length))
+        pages = {}
+        while True:
+            address, size = _record.unpack(stream.read(_record.size))
+            if size == 0: break
+            pages[address] = stream.read(size)
+        (length,) = _length.unpack(stream.read(_length.size))
+        page_map = json.loads(stream.read(length))
+    return CrashDump(header, pages, page_map)
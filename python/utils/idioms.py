@@ -0,0 +1,237 @@
+from devices.cpu.isa import lookup, IMMEDIATES
+
+# Accelerated guest routines: breakpoints at the entry of the guest's memset,
+# memcpy, memmove and strlen (found through its symbol index) do the work
+# on the bus' bulk transfers and return straight to ra, as the calling
+# convention has it: a0 holds the result, callee-saved registers are left
+# alone and caller-saved ones are not touched at all. The word loop that
+# clears .bss in head.S (clear_bss up to clear_bss_done) is recognised by
+# its instructions and run as one fill.
+#
+# Routines are only taken over when every byte they touch is RAM; otherwise,
+# and for overlapping memcpy, the guest's own code runs. An accelerated call
+# adds an estimate of the instructions the guest would have retired for it
+# to instret (COSTS), so hooks at counts and the CLINT timer keep roughly
+# the pace of an unaccelerated run.
+#
+# With verify the guest's code always runs: at the entry the expected result
+# is worked out, at the return it is compared with what the guest did, and
+# a ValueError ends the run on any difference.
+
+ROUTINES = ("memset", "memcpy", "memmove", "strlen")
+ZERO_LOOP = ("clear_bss", "clear_bss_done")
+STRLEN_CHUNK = 64 # bytes strlen looks at first, doubled every time up to a page
+
+# (instructions per call, instructions per byte) the guest's own routines
+# retire, fitted to the calls of a Linux boot in verify mode; the .bss loop
+# is exact at three instructions a word
+COSTS = {"memset": (27, 0.27), "memcpy": (51, 0.52), "memmove": (20, 1.25), "strlen": (6, 4), "clear_bss": (0, 0.75)}
+
+RA, SP, A0, A1, A2 = 1, 2, 10, 11, 12
+CALLEE_SAVED = (SP, 3, 4, 8, 9) + tuple(range(18, 28)) # sp, gp, tp, s0-s11
+
+def _fields(word):
+    """(mnemonic, rd, rs1, rs2, immediate) of a 32-bit instruction word, all
+    None if it is compressed or not implemented."""
+    instruction = lookup(word) if word & 0b11 == 0b11 else None
+    if instruction is None: return (None,) * 5
+    return (instruction.mnemonic, (word >> 7) & 0x1F, (word >> 15) & 0x1F, (word >> 20) & 0x1F,
+            IMMEDIATES[instruction.format](word))
+
+class Idioms:
+    """The accelerated routines of one CPU, see install(). stats holds
+    [calls, bytes, left to the guest, instructions added to instret] per
+    routine."""
+    def __init__(self, cpu, verify=False, names=None):
+        self.cpu = cpu
+        self.bus = cpu.memory
+        self.verify = verify
+        self.entries = {} # entry pc -> (name, routine, pc to continue at or None for ra)
+        self.stats = {}
+        self.checked = 0 # calls verified
+        self.pending = set() # (entry pc, sp) of calls being verified
+        self.waiting = {} # (return pc, sp) -> the call being verified that returns there
+        self.return_pcs = set() # return addresses watched by _returned
+        symbols = cpu.symbols
+        routines = {"memset": self._memset, "memcpy": self._memcpy, "memmove": self._memmove, "strlen": self._strlen}
+        if names is None:
+            # the numba core runs these routines faster than it can stop and
+            # hand them to Python, only the one long loop is worth taking over
+            names = ZERO_LOOP[:1] if cpu.jit is not None else ROUTINES + ZERO_LOOP[:1]
+        for name in ROUTINES:
+            if name not in names: continue
+            address = symbols.address_of(name)
+            if address is not None:
+                self._add(address, name, routines[name], None)
+        start, done = (symbols.address_of(name) for name in ZERO_LOOP)
+        if ZERO_LOOP[0] in names and start is not None and done is not None:
+            registers = self._zero_loop(start, done)
+            if registers is not None:
+                self._add(start, ZERO_LOOP[0], lambda x, apply: self._clear(x, apply, *registers, done), done)
+
+    def _add(self, pc, name, routine, continue_at):
+        self.entries[pc] = (name, routine, continue_at)
+        self.stats[name] = [0, 0, 0, 0]
+        self.cpu.hooks.at_pc(pc, self._enter)
+
+    def remove(self) -> None:
+        self.cpu.hooks.remove(self._enter)
+        self.cpu.hooks.remove(self._returned)
+        self.entries.clear()
+        self.pending.clear()
+        self.waiting.clear()
+        self.return_pcs.clear()
+
+    def report(self) -> list:
+        return [f"{name:10} {calls:8} calls {size:12} bytes {declined:6} left to the guest {skipped:10} instructions skipped"
+                for name, (calls, size, declined, skipped) in self.stats.items()]
+
+    def _zero_loop(self, start, done):
+        """(pointer, end) registers if the code at start is
+            sw x0, 0(pointer); addi pointer, pointer, 4; blt(u) pointer, end, start
+        and done follows right after it."""
+        if done != start + 12: return None
+        try:
+            store, step, branch = (_fields(self.bus.read_u32(start + 4 * i)) for i in range(3))
+        except (ValueError, MemoryError):
+            return None
+        if store[0] != "sw" or store[3] != 0 or store[4] != 0: return None
+        pointer = store[2]
+        if step != ("addi", pointer, pointer, step[3], 4): return None
+        if branch[0] not in ("blt", "bltu") or branch[2] != pointer or branch[4] != -8: return None
+        return pointer, branch[3]
+
+    # Each routine looks at the argument registers x and returns None to
+    # leave the call to the guest, or (results, expected, size): the
+    # registers it sets, the (address, bytes) it leaves in memory if any and
+    # the bytes it handled. apply is False when verifying, memory is then
+    # left alone.
+    def _ram_end(self, address):
+        """Last address of the RAM holding address, None if it is not RAM."""
+        try:
+            start, end, device, _ = self.bus.find(address)
+        except ValueError:
+            return None
+        return end if hasattr(device, "fill") else None
+
+    def _in_ram(self, address, length):
+        if length == 0: return True
+        end = self._ram_end(address)
+        return end is not None and address + length - 1 <= end
+
+    def _memset(self, x, apply):
+        destination, value, length = x[A0], x[A1] & 0xFF, x[A2]
+        if not self._in_ram(destination, length): return None
+        if apply:
+            self.bus.fill(destination, value, length)
+            return {A0: destination}, None, length
+        return {A0: destination}, (destination, bytes([value]) * length), length
+
+    def _memmove(self, x, apply):
+        destination, source, length = x[A0], x[A1], x[A2]
+        if not (self._in_ram(destination, length) and self._in_ram(source, length)): return None
+        if apply:
+            self.bus.copy_within(destination, source, length)
+            return {A0: destination}, None, length
+        return {A0: destination}, (destination, self.bus.read(source, length)), length
+
+    def _memcpy(self, x, apply):
+        destination, source, length = x[A0], x[A1], x[A2]
+        if destination != source and destination < source + length and source < destination + length:
+            return None # overlapping, what the guest's memcpy does then is its own business
+        return self._memmove(x, apply)
+
+    def _strlen(self, x, apply):
+        string = x[A0]
+        length, chunk = 0, STRLEN_CHUNK
+        while True:
+            end = self._ram_end(string + length)
+            if end is None: return None
+            data = self.bus.read(string + length, min(chunk, end - (string + length) + 1))
+            found = data.find(0)
+            if found != -1:
+                return {A0: length + found}, None, length + found + 1
+            length += len(data)
+            chunk = min(chunk * 2, 4096)
+
+    def _clear(self, x, apply, pointer, end, done):
+        start = x[pointer]
+        length = max(-(-(x[end] - start) // 4), 1) * 4 # the loop stores once before it compares
+        if not self._in_ram(start, length): return None
+        if apply:
+            self.bus.fill(start, 0, length)
+            return {pointer: start + length}, None, length
+        return {pointer: start + length}, (start, bytes(length)), length
+
+    def _enter(self, cpu):
+        x = cpu.integer_registers
+        pc = cpu.registers["pc"]
+        if (pc, x[SP]) in self.pending: return # the .bss loop coming round again
+        name, routine, continue_at = self.entries[pc]
+        stats = self.stats[name]
+        plan = routine(x, not self.verify)
+        if plan is None:
+            stats[2] += 1
+            return
+        results, expected, size = plan
+        stats[0] += 1
+        stats[1] += size
+        next_pc = continue_at if continue_at is not None else x[RA] & ~1
+        if self.verify:
+            return self._expect(name, pc, next_pc, results, expected)
+        for register, value in results.items():
+            x[register] = value
+        cpu.registers["pc"] = next_pc
+        per_call, per_byte = COSTS[name]
+        skipped = int(per_call + per_byte * size)
+        cpu.instret += skipped
+        stats[3] += skipped
+
+    def _expect(self, name, pc, next_pc, results, expected):
+        """Checks the guest's own run of a routine once it gets to next_pc
+        with the stack pointer it was called with."""
+        x = self.cpu.integer_registers
+        saved = {register: x[register] for register in CALLEE_SAVED}
+        self.pending.add((pc, saved[SP]))
+        self.waiting[(next_pc, saved[SP])] = (pc, name, results, expected, saved)
+        if next_pc not in self.return_pcs:
+            # kept for good: every breakpoint change throws the translated blocks away
+            self.return_pcs.add(next_pc)
+            self.cpu.hooks.at_pc(next_pc, self._returned)
+
+    def _returned(self, cpu):
+        call = self.waiting.pop((cpu.registers["pc"], cpu.integer_registers[SP]), None)
+        if call is None: return # not a return of a call being verified
+        pc, name, results, expected, saved = call
+        self.pending.discard((pc, saved[SP]))
+        self._check(name, results, expected, saved)
+
+    def _check(self, name, results, expected, saved):
+        x = self.cpu.integer_registers
+        differences = []
+        for register, value in results.items():
+            if x[register] != value:
+                differences.append(f"x{register} is {x[register]:08x}, expected {value:08x}")
+        for register, value in saved.items():
+            if x[register] != value:
+                differences.append(f"x{register} is {x[register]:08x}, was {value:08x} at the call")
+        if expected is not None:
+            address, data = expected
+            actual = self.bus.read(address, len(data))
+            if actual != data:
+                offset = next(i for i in range(len(data)) if actual[i] != data[i])
+                differences.append(f"memory at {address + offset:08x} is {actual[offset:offset+8].hex(' ')},"
+                                   f" expected {data[offset:offset+8].hex(' ')}")
+        self.checked += 1
+        if differences:
+            raise ValueError(f"Accelerated {name} disagrees with the guest: {'; '.join(differences)}")
+
+def install(cpu, verify=False, names=None) -> Idioms:
+    """Accelerates the routines of cpu.symbols' guest on cpu, see above:
+    names picks them from ROUTINES and ZERO_LOOP[0], by default all of them,
+    or only the .bss loop when cpu uses the numba core.
+    The Idioms are kept as cpu.idioms."""
+    if cpu.symbols is None:
+        raise ValueError("Accelerated routines need the guest's symbols (cpu.symbols)")
+    cpu.idioms = Idioms(cpu, verify, names)
+    return cpu.idioms
@@ -0,0 +1,224 @@
+import hashlib
+
+from devices.cpu.isa import disassemble
+from devices.memory import RAM_PAGE_SIZE
+
+# Lockstep differential testing: two machines running the same guest on
+# different engines are stopped at the same instruction counts and compared.
+# Memory is compared through PageDigest, which rehashes only the pages the RAM
+# marked dirty since the last checkpoint, so checking every few thousand
+# instructions costs little more than running both machines.
+
+INTERVALS = ("instruction", "block") # or a number of instructions
+
+class PageDigest:
+    """Hash of a machine's RAM, kept up to date by rehashing the pages the
+    RAM marks dirty; every update clears the dirty bitmaps. value is the sum
+    of the hashes of all pages that are not all zeroes, so it does not depend
+    on the RAM type."""
+    def __init__(self, bus):
+        self.ram = [(start, device) for start, end, device in bus.devices if hasattr(device, "dirty_pages")]
+        self.hashes = {} # page address -> hash, non-zero pages only
+        self.value = 0
+        for start, device in self.ram:
+            for offset, page in device.pages():
+                self._rehash(start + offset, page.tobytes())
+            device.clear_dirty()
+
+    def _rehash(self, address: int, data: bytes) -> None:
+        new = 0
+        if data.strip(b"\0"):
+            digest = hashlib.blake2b(data, digest_size=8, salt=address.to_bytes(8, 'little'))
+            new = int.from_bytes(digest.digest(), 'little')
+        self.value = (self.value - self.hashes.pop(address, 0) + new) & 0xFFFFFFFFFFFFFFFF
+        if new: self.hashes[address] = new
+
+    def page(self, address: int) -> bytes:
+        for start, device in self.ram:
+            if start <= address < start + device.size:
+                offset = address - start
+                return device.read(offset, min(RAM_PAGE_SIZE, device.size - offset))
+        return b""
+
+    def update(self) -> set:
+        """Rehashes the pages written since the last update, returns them."""
+        written = set()
+        for start, device in self.ram:
+            for offset in device.dirty_pages():
+                written.add(start + offset)
+                self._rehash(start + offset, self.page(start + offset))
+            device.clear_dirty()
+        return written
+
+class Divergence:
+    """Where two machines stopped agreeing. instret is the instruction count
+    at which the difference was seen, last_good the last count at which they
+    still agreed; when the two are one apart, pc and instruction name the
+    instruction that went wrong."""
+    def __init__(self, names, instret, last_good, pc, instruction, differences):
+        self.names = names
+        self.instret = instret
+        self.last_good = last_good
+        self.pc = pc
+        self.instruction = instruction
+        self.differences = differences # (what, reference value, candidate value)
+
+    def __str__(self):
+        lines = [f"{self.names[0]} and {self.names[1]} diverge at instruction no {self.instret}"
+                 f" (last agreed at {self.last_good})"]
+        if self.instret - self.last_good == 1:
+            lines.append(f"  {self.pc:08x}: {self.instruction}")
+        else:
+            lines.append(f"  somewhere after {self.pc:08x}: {self.instruction}")
+        for what, reference, candidate in self.differences:
+            lines.append(f"  {what}: {reference} vs {candidate}")
+        return "\n".join(lines)
+
+def _hex(value):
+    return f"{value:08x}" if isinstance(value, int) else repr(value)
+
+def _fetch(cpu, pc):
+    try:
+        return cpu.memory.read_u32(pc)
+    except Exception:
+        return None
+
+def _describe(cpu, pc, raw):
+    text = disassemble(raw, pc) if raw is not None else "<unreadable>"
+    if cpu.symbols is not None:
+        text += f"  ({cpu.symbols.describe(pc)})"
+    return text
+
+def _stop(cpu):
+    cpu.request_exit("lockstep")
+
+def _summary(machine):
+    return machine.cpu.get_state(), [device.get_state() for start, end, device in machine.bus.devices
+                                     if hasattr(device, "get_state")]
+
+def _state(machine):
+    """_summary flattened into one dict, for naming what differs."""
+    cpu = machine.cpu
+    state = cpu.get_state()
+    registers = state.pop("integer_registers")
+    state.update({f"x{i}": value for i, value in enumerate(registers)})
+    state.update(state.pop("registers"))
+    for i, (start, end, device) in enumerate(machine.bus.devices):
+        if hasattr(device, "get_state"):
+            state.update({f"{type(device).__name__}.{key}": value for key, value in device.get_state().items()})
+    return state
+
+class Lockstep:
+    """Runs the machine build(engine) makes for each of the two engines side
+    by side. interval is where they are compared: "instruction" after every
+    instruction, "block" after every step of the reference engine (a
+    translated block, a numba batch or one interpreted instruction), or a
+    number of instructions. build must be deterministic: given the same
+    engine and instruction count, the guest must be in the same state."""
+    def __init__(self, build, engines, interval=10000):
+        if interval not in INTERVALS and not (isinstance(interval, int) and interval > 0):
+            raise ValueError(f"Unsupported interval: {interval}. Should be one of {list(INTERVALS)} or a positive number")
+        self.build = build
+        self.engines = engines
+        self.interval = interval
+        self.machines = [build(engine) for engine in engines]
+        self.digests = [PageDigest(machine.bus) for machine in self.machines]
+        self.checkpoints = 0
+        self.exit_reason = None
+
+    @property
+    def instret(self) -> int:
+        return self.machines[0].cpu.instret
+
+    def _run_to(self, machine, instret):
+        cpu = machine.cpu
+        if cpu.instret >= instret: return None
+        cpu.hooks.at_count(instret, _stop)
+        reason = cpu.run()
+        if reason != "lockstep":
+            cpu.hooks.remove(_stop) # the guest stopped first
+        return reason
+
+    def _step_reference(self):
+        cpu = self.machines[0].cpu
+        if self.interval == "block":
+            reason = cpu.run(lambda: cpu.request_exit("lockstep"))
+        else:
+            step = 1 if self.interval == "instruction" else self.interval
+            reason = self._run_to(self.machines[0], cpu.instret + step)
+        return reason
+
+    def compare(self):
+        """Differences between the two machines right now, as (what,
+        reference value, candidate value)."""
+        reference, candidate = self.machines
+        differences = []
+        if reference.cpu.instret != candidate.cpu.instret:
+            differences.append(("instret", reference.cpu.instret, candidate.cpu.instret))
+        if _summary(reference) != _summary(candidate):
+            state, other = _state(reference), _state(candidate)
+            for key in state.keys() | other.keys():
+                if state.get(key) != other.get(key):
+                    differences.append((key, _hex(state.get(key)), _hex(other.get(key))))
+        written = set()
+        for digest in self.digests:
+            written |= digest.update()
+        if self.digests[0].value != self.digests[1].value:
+            for address in sorted(written):
+                a, b = self.digests[0].hashes.get(address), self.digests[1].hashes.get(address)
+                if a == b: continue
+                data, other_data = self.digests[0].page(address), self.digests[1].page(address)
+                offset = next(i for i in range(len(data)) if data[i] != other_data[i])
+                differences.append((f"memory at {address + offset:08x}",
+                                    data[offset:offset+8].hex(" "), other_data[offset:offset+8].hex(" ")))
+                break
+            else:
+                differences.append(("memory digest", f"{self.digests[0].value:016x}", f"{self.digests[1].value:016x}"))
+        return sorted(differences, key=lambda difference: difference[0] != "instret")
+
+    def step(self):
+        """Advances both machines to the next checkpoint and compares them.
+        Returns a Divergence, or None. self.exit_reason is set once the
+        reference machine stops on its own."""
+        reference, candidate = self.machines
+        last_good, pc = reference.cpu.instret, reference.cpu.registers["pc"]
+        raw = _fetch(reference.cpu, pc) # disassembled only if it comes to a report
+        reason = self._step_reference()
+        other_reason = self._run_to(candidate, reference.cpu.instret)
+        self.checkpoints += 1
+        differences = self.compare()
+        if reason != "lockstep":
+            self.exit_reason = reason
+            if reason != other_reason:
+                differences.insert(0, ("exit", reason, other_reason))
+        if differences:
+            return Divergence(self.engines, reference.cpu.instret, last_good, pc,
+                              _describe(reference.cpu, pc, raw), differences)
+        return None
+
+    def run(self, max_instructions=None):
+        """Steps until the machines diverge, the guest stops or max_instructions
+        have run. Returns the Divergence, or None."""
+        while self.exit_reason is None:
+            if max_instructions is not None and self.instret >= max_instructions: break
+            divergence = self.step()
+            if divergence is not None:
+                return divergence
+        return None
+
+    def locate(self, divergence):
+        """Pins a divergence seen at a checkpoint down to the first instruction
+        that went wrong: fresh machines run to the last checkpoint at which the
+        old ones agreed, then go on one instruction at a time."""
+        if divergence.instret - divergence.last_good <= 1:
+            return divergence
+        narrow = Lockstep(self.build, self.engines, "instruction")
+        for machine in narrow.machines:
+            narrow._run_to(machine, divergence.last_good)
+        if narrow.compare():
+            return divergence # the rebuilt machines do not replay the same way
+        while narrow.instret < divergence.instret and narrow.exit_reason is None:
+            found = narrow.step()
+            if found is not None:
+                return found
+        return divergence
@@ -1,11 +1,83 @@
+import struct
+from collections import deque
+
+TRACE_CAPACITY = 1 << 16 # records kept in the ring
+TRACE_MAGIC = b"RVTRACE1"
+
+_trace_record = struct.Struct("<BHI") # level, len(who), len(text)
+
+def format_message(record) -> str:
+	message, args = record[2], record[3]
+	return message % args if args else message
+
+def format_record(record) -> str:
+	return f"[L{record[0]} / {record[1]}] {format_message(record)}"
+
 class Logger:
-	def __init__(self, level):
-		self.textlog = ""
+	"""Level-gated tracer.
+
+	While enabled, log() appends (level, who, message, args) to a bounded ring
+	and prints records at or below self.level. `message % args` is only built
+	when a record is printed or exported. Hot trace points check
+	`logger.enabled` before calling log, so nothing is evaluated at all while
+	tracing is off."""
+	def __init__(self, level, capacity=TRACE_CAPACITY):
 		self.level = level
 		self.enabled = True
-	def log(self, level, who, message):
+		self.records = deque(maxlen=capacity)
+		self.dropped = 0 # records pushed out of the ring
+	def log(self, level, who, message, *args):
 		if not self.enabled: return
-		text = f"[L{level} / {who}] {message}"
-		self.textlog += text+"\n"
+		records = self.records
+		if len(records) == records.maxlen:
+			self.dropped += 1
+		record = (level, who, message, args)
+		records.append(record)
 		if self.level >= level:
-			print(text)
+			print(format_record(record))
+
+	def last(self, amount=None) -> list:
+		"""The last `amount` records (all of them by default), oldest first."""
+		records = list(self.records)
+		if amount is not None and amount < len(records):
+			records = records[len(records)-amount:]
+		return records
+
+	def tail(self, amount=None) -> list:
+		return [format_record(record) for record in self.last(amount)]
+
+	@property
+	def textlog(self) -> str:
+		return "".join(line+"\n" for line in self.tail())
+
+	def clear(self):
+		self.records.clear()
+		self.dropped = 0
+
+	def export(self, path, binary=False, amount=None) -> int:
+		"""Writes the last `amount` records to path, as text lines or as a binary
+		trace (TRACE_MAGIC, then level, who and text per record). Returns the
+		amount of records written."""
+		records = self.last(amount)
+		if not binary:
+			with open(path, 'w', encoding='utf-8') as file:
+				file.writelines(format_record(record)+"\n" for record in records)
+			return len(records)
+		with open(path, 'wb') as file:
+			file.write(TRACE_MAGIC)
+			for record in records:
+				who = record[1].encode()
+				text = format_message(record).encode()
+				file.write(_trace_record.pack(record[0], len(who), len(text)) + who + text)
+		return len(records)
+
+def read_trace(path):
+	"""Yields (level, who, text) from a binary trace written by Logger.export."""
+	with open(path, 'rb') as file:
+		if file.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+			raise ValueError(f"{path} is not a trace file")
+		while True:
+			header = file.read(_trace_record.size)
+			if len(header) < _trace_record.size: return
+			level, who_length, text_length = _trace_record.unpack(header)
+			yield level, file.read(who_length).decode(), file.read(text_length).decode()
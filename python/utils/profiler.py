@@ -0,0 +1,116 @@
+from collections import Counter
+
+HISTOGRAM_BUCKETS = 24 # bucket n counts timings of [2**(n-1), 2**n) ns, the last one everything above
+
+class OpcodeStats:
+    __slots__ = ("count", "total", "min", "max", "buckets")
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+
+    def add(self, took: float) -> None:
+        self.count += 1
+        self.total += took
+        if took < self.min: self.min = took
+        if took > self.max: self.max = took
+        self.buckets[min(int(took * 1e9).bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+
+    def percentile(self, fraction: float) -> float:
+        """Upper bound of the histogram bucket holding the given fraction of calls, in seconds."""
+        wanted = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= wanted:
+                return min((1 << bucket) / 1e9, self.max)
+        return self.max
+
+def hex_symbol(address: int) -> str:
+    return f"{address:08x}"
+
+class Profiler:
+    """Constant-memory profiler for CPU.run.
+
+    Per-opcode timings are folded into OpcodeStats as they come in (record).
+    Independently, every `sample_interval` retired instructions the guest PC
+    and return address are sampled (sample, scheduled through CPU.hooks);
+    reports resolve them to names with `resolve`, a function of address,
+    which defaults to plain hex. Samples are weighted by the instructions
+    retired since the previous one."""
+    def __init__(self, timing=True, sample_interval=0):
+        self.timing = timing
+        self.sample_interval = sample_interval
+        self.last_sample = 0
+        self.opcodes = {}         # name -> OpcodeStats
+        self.samples = Counter()  # (pc, ra) -> retired instructions
+        self.resolve = hex_symbol
+
+    def record(self, name: str, took: float) -> None:
+        stats = self.opcodes.get(name)
+        if stats is None:
+            stats = self.opcodes[name] = OpcodeStats()
+        stats.add(took)
+
+    def sample(self, cpu) -> None:
+        self.samples[(cpu.registers["pc"], cpu.integer_registers[1])] += cpu.instret - self.last_sample
+        self.last_sample = cpu.instret
+
+    def rebase(self, instret: int) -> None:
+        """Continues sampling from instret, e.g. after the CPU state was restored."""
+        self.last_sample = instret
+
+    def reset(self) -> None:
+        self.opcodes.clear()
+        self.samples.clear()
+
+    def opcode_report(self) -> list:
+        lines = [f"{'opcode':10} {'ncalls':>10} {'total ms':>10} {'avg us':>8} {'min us':>8} {'p50 us':>8} {'p99 us':>8} {'max us':>8}"]
+        for name, stats in sorted(self.opcodes.items(), key=lambda item: -item[1].total):
+            lines.append(f"{name:10} {stats.count:10} {stats.total * 1e3:10.2f} {stats.total / stats.count * 1e6:8.3f} "
+                         f"{stats.min * 1e6:8.3f} {stats.percentile(0.5) * 1e6:8.3f} {stats.percentile(0.99) * 1e6:8.3f} {stats.max * 1e6:8.3f}")
+        return lines
+
+    def _by_symbol(self, key) -> Counter:
+        names = {}
+        totals = Counter()
+        for sample, weight in self.samples.items():
+            addresses = key(sample)
+            for address in addresses:
+                if address not in names:
+                    names[address] = self.resolve(address)
+            totals[tuple(names[address] for address in addresses)] += weight
+        return totals
+
+    def flat_report(self, top=None) -> list:
+        """Guest time per symbol of the sampled PC, most expensive first."""
+        totals = self._by_symbol(lambda sample: (sample[0],))
+        overall = sum(totals.values()) or 1
+        lines = [f"{'%':>6} {'instructions':>12}  symbol"]
+        for (symbol,), weight in totals.most_common(top):
+            lines.append(f"{weight * 100 / overall:6.2f} {weight:12}  {symbol}")
+        return lines
+
+    def folded_report(self) -> list:
+        """caller;callee weight lines for flamegraph tools. Without a shadow call
+        stack the caller is taken from ra, so frames are only two deep."""
+        totals = self._by_symbol(lambda sample: (sample[1], sample[0]))
+        return [f"{caller};{callee} {weight}" for (caller, callee), weight in totals.most_common()]
+
+    def write(self, prefix: str) -> list:
+        """Writes the reports next to each other as prefix + profile_*.txt and
+        profile.folded, returns the file names."""
+        reports = {
+            f"{prefix}profile_opcodes.txt": self.opcode_report() if self.opcodes else [],
+            f"{prefix}profile_flat.txt": self.flat_report() if self.samples else [],
+            f"{prefix}profile.folded": self.folded_report() if self.samples else [],
+        }
+        written = []
+        for filename, lines in reports.items():
+            if not lines: continue
+            with open(filename, 'w', encoding='utf-8') as file:
+                file.writelines(line+"\n" for line in lines)
+            written.append(filename)
+        return written
@@ -0,0 +1,78 @@
+import json
+import struct
+import zlib
+
+# Snapshot file layout: SNAPSHOT_MAGIC followed by one zlib stream holding
+#   u32 header length, JSON header (CPU state, device state, device map)
+#   u32 address, u32 length, data   for every RAM page that changed
+#   u32 0, u32 0                    end marker
+# Pages are stored relative to the images placed with AddressBus.map_image, so
+# restoring needs a machine that has been through the same loader first.
+
+SNAPSHOT_MAGIC = b"RVSNAP1\n"
+SNAPSHOT_PAGE_SIZE = 4096
+
+_record = struct.Struct("<II")
+
+def _baseline_page(bus, address, size):
+    """Page content right after loading: the mapped images, zeroes elsewhere."""
+    page = bytearray(size)
+    for image_address, image in bus.images:
+        lo = max(address, image_address)
+        hi = min(address + size, image_address + len(image))
+        if lo < hi:
+            page[lo-address:hi-address] = image[lo-image_address:hi-image_address]
+    return page
+
+def save(path, cpu, bus, level=6) -> int:
+    """Writes the machine state to path, returns the amount of pages stored."""
+    header = json.dumps({
+        "cpu": cpu.get_state(),
+        "devices": {str(i): device.get_state() for i, (start, end, device) in enumerate(bus.devices)
+                    if hasattr(device, "get_state")},
+        "device_map": bus.device_map(),
+    }).encode()
+    compressor = zlib.compressobj(level)
+    pages = 0
+    with open(path, "wb") as file:
+        file.write(SNAPSHOT_MAGIC)
+        file.write(compressor.compress(struct.pack("<I", len(header)) + header))
+        for start, end, device in bus.devices:
+            if not hasattr(device, "map_image"): continue # only RAM
+            # every page written since loading, whether or not the device
+            # still holds it; all others match the baseline
+            for offset in device.touched_pages():
+                size = min(SNAPSHOT_PAGE_SIZE, device.size - offset)
+                data = device.read(offset, size)
+                if data == _baseline_page(bus, start + offset, size): continue
+                file.write(compressor.compress(_record.pack(start + offset, size) + data))
+                pages += 1
+        file.write(compressor.compress(_record.pack(0, 0)))
+        file.write(compressor.flush())
+    return pages
+
+def restore(path, cpu, bus) -> int:
+    """Loads a snapshot written by save into a freshly loaded machine, returns
+    the amount of pages restored."""
+    with open(path, "rb") as file:
+        if file.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a snapshot file")
+        data = memoryview(zlib.decompress(file.read()))
+    (length,) = struct.unpack_from("<I", data, 0)
+    header = json.loads(bytes(data[4:4+length]))
+    if header["device_map"] != bus.device_map():
+        raise ValueError(f"Snapshot was taken with a different device map: {header['device_map']}")
+
+    cpu.set_state(header["cpu"])
+    for i, state in header["devices"].items():
+        bus.devices[int(i)][2].set_state(state)
+    position = 4 + length
+    pages = 0
+    while True:
+        address, size = _record.unpack_from(data, position)
+        position += _record.size
+        if size == 0: break
+        bus.load_bytes(address, data[position:position+size])
+        position += size
+        pages += 1
+    return pages
@@ -0,0 +1,125 @@
+from bisect import bisect_right
+from collections import namedtuple
+
+SYMBOL_CACHE_SIZE = 1 << 16 # PCs remembered by SymbolIndex.lookup before the cache starts over
+
+# (section, first marker, end marker) as emitted by the kernel linker script
+SECTIONS = (
+    (".text",   "_start",         "_etext"),
+    (".init",   "__init_begin",   "__init_end"),
+    (".rodata", "__start_rodata", "__end_rodata"),
+    (".data",   "_data",          "_edata"),
+    (".bss",    "__bss_start",    "__bss_stop"),
+)
+IMAGE_END = "_end"
+
+Symbol = namedtuple("Symbol", "address size type name section")
+
+def parse_map_file(file_content) -> list:
+    """(address, type, name) for every line of `nm` output, in file order."""
+    entries = []
+    for line in file_content.splitlines():
+        parts = line.split()
+        if len(parts) == 3:
+            address, type, name = parts
+            entries.append((int(address, 16), type, name))
+    return entries
+
+class SymbolIndex:
+    """Address to symbol lookup for a kernel.map.
+
+    Symbols are kept sorted by address and searched with bisect. A symbol
+    covers everything up to the next symbol or the end of its section,
+    whichever comes first; addresses in between sections still resolve to the
+    symbol before them, like the linker map suggests, while addresses before
+    the first section or past `_end` are outside of the kernel and resolve to
+    None. Absolute (type A) symbols are not addresses and are left out.
+
+    lookup remembers the range of the last symbol it returned and caches
+    results per PC, so calling it on every executed instruction is cheap."""
+    def __init__(self, entries):
+        self.by_name = {}
+        markers = {}
+        located = []
+        for address, type, name in entries:
+            self.by_name[name] = address
+            if type in "Aa": continue
+            markers[name] = address
+            located.append((address, type, name))
+        located.sort(key=lambda entry: entry[0]) # stable, aliases stay in file order
+
+        self.sections = []
+        for section, first, last in SECTIONS:
+            if first in markers and last in markers:
+                self.sections.append((markers[first], markers[last], section))
+        self.sections.sort()
+        self.section_starts = [start for start, end, section in self.sections]
+        self.start = located[0][0] if located else 0
+        self.end = markers.get(IMAGE_END, located[-1][0] + 1 if located else 0)
+
+        # aliases at one address collapse into the last one listed
+        symbols = []
+        for i, (address, type, name) in enumerate(located):
+            if i + 1 < len(located) and located[i + 1][0] == address: continue
+            symbols.append((address, type, name))
+        self.symbols = []
+        for i, (address, type, name) in enumerate(symbols):
+            section = self.section_of(address)
+            end = symbols[i + 1][0] if i + 1 < len(symbols) else self.end
+            if section is not None:
+                end = min(end, section[1])
+            self.symbols.append(Symbol(address, max(end - address, 0), type, name, section[2] if section else None))
+        self.addresses = [symbol.address for symbol in self.symbols]
+
+        self.cache = {}
+        self.last_start, self.last_end, self.last = 0, 0, None
+
+    @classmethod
+    def from_map_file(cls, path):
+        with open(path, 'r') as file:
+            return cls(parse_map_file(file.read()))
+
+    def section_of(self, address: int):
+        """(start, end, name) of the section holding address, or None."""
+        i = bisect_right(self.section_starts, address) - 1
+        if i >= 0 and address < self.sections[i][1]:
+            return self.sections[i]
+        return None
+
+    def contains(self, address: int) -> bool:
+        return self.start <= address < self.end
+
+    def lookup(self, address: int):
+        """The Symbol containing address, None if it is outside of the kernel."""
+        if self.last_start <= address < self.last_end:
+            return self.last
+        symbol = self.cache.get(address, False)
+        if symbol is False:
+            symbol = None
+            if self.contains(address):
+                i = bisect_right(self.addresses, address) - 1
+                if i >= 0: symbol = self.symbols[i]
+            if len(self.cache) >= SYMBOL_CACHE_SIZE:
+                self.cache.clear()
+            self.cache[address] = symbol
+        if symbol is not None and symbol.address <= address < symbol.address + symbol.size:
+            self.last_start, self.last_end, self.last = symbol.address, symbol.address + symbol.size, symbol
+        return symbol
+
+    def name(self, address: int) -> str:
+        """Symbol name for reports, or the address marked as outside of the kernel."""
+        symbol = self.lookup(address)
+        if symbol is None:
+            return f"{address:08x} (outside of the kernel)"
+        return symbol.name
+
+    def describe(self, address: int) -> str:
+        """`name+offset [section]`, for crash reports."""
+        symbol = self.lookup(address)
+        if symbol is None:
+            return f"{address:08x} (outside of the kernel)"
+        section = f" [{symbol.section}]" if symbol.section else ""
+        return f"{symbol.name}+{address - symbol.address:#x}{section}"
+
+    def address_of(self, name: str):
+        return self.by_name.get(name)